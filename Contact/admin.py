@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# No models to register for Contact app
+from .models import ContactSubmission
+
+
+@admin.register(ContactSubmission)
+class ContactSubmissionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'phone', 'subject', 'status', 'created_at', 'notified_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['name', 'phone', 'subject', 'message']
+    readonly_fields = ['fingerprint', 'digest_id', 'ip_address', 'created_at', 'notified_at']
+    date_hierarchy = 'created_at'
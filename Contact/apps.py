@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ContactConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Contact'
+
+    def ready(self):
+        from django.conf import settings
+        from django.core.signals import request_started
+        from .submissions import DIGEST_RECEIVER_UID, schedule_digest_on_first_request
+
+        if settings.CONTACT_DIGEST_MINUTES:
+            request_started.connect(schedule_digest_on_first_request, dispatch_uid=DIGEST_RECEIVER_UID)
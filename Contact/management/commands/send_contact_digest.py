@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from Contact.submissions import send_digest
+
+
+class Command(BaseCommand):
+    help = (
+        "Forward pending contact form submissions as one WhatsApp message, e.g. from a cron job "
+        "or after a restart dropped the digest timer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry', action='store_true',
+            help="also resend failed submissions and ones left 'sending' or 'queued' by a stopped worker",
+        )
+        parser.add_argument(
+            '--wait', type=float, default=120,
+            help='seconds to wait for a message held in the outbound queue before exiting',
+        )
+
+    def handle(self, *args, **options):
+        sent = send_digest(retry=options['retry'], wait=options['wait'])
+        self.stdout.write(self.style.SUCCESS(f"Forwarded {sent} contact submissions"))
@@ -1,3 +1,39 @@
 from django.db import models
 
-# No models needed for Contact app - we're just forwarding to WhatsApp
+
+class ContactSubmission(models.Model):
+    """
+    A contact form submission and whether it was forwarded to WhatsApp
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        # In the worker's outbound queue (Graph API down or slow), not sent yet
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    phone = models.CharField(max_length=20)
+    subject = models.CharField(max_length=300)
+    message = models.TextField()
+    ip_address = models.GenericIPAddressField(blank=True, null=True)
+    # sha256 of the phone and normalized message (see Contact/submissions.py)
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Set when a digest claims the submission, so two workers never send it twice
+    digest_id = models.UUIDField(blank=True, null=True, db_index=True)
+    # When it was last claimed for sending; a retry only takes over stale claims
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.phone}) - {self.subject}"
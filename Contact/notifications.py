@@ -0,0 +1,157 @@
+"""
+Forward contact form submissions to our WhatsApp number
+
+``send_whatsapp_message`` is used by the sync view and
+``asend_whatsapp_message`` by the async (ASGI) view. Both go through the
+outbound scheduler in the transactional lane. A message still waiting in the
+scheduler's queue (Graph API outage or slow) is returned as ``Queued``: it
+only lives in this process's memory, so it isn't sent yet.
+"""
+
+import logging
+import os
+
+from bbdBackend.graph import graph_url
+from bbdBackend.outbound import MessageQueued, asend_message, send_message
+
+logger = logging.getLogger(__name__)
+
+
+class Queued:
+    """
+    Result of a send left in the outbound queue; ``future`` resolves to the
+    Graph API response once it goes out
+    """
+    __slots__ = ('future',)
+
+    def __init__(self, future):
+        self.future = future
+
+
+def build_contact_request(contact_data):
+    """
+    Build the Graph API url, headers and template payload for a submission
+
+    Returns None when WhatsApp credentials are not configured.
+    """
+    # Get WhatsApp credentials from environment
+    whatsapp_token = os.getenv('WHATSAPP_ACCESS_TOKEN')
+    phone_number_id = os.getenv('WHATSAPP_PHONE_NUMBER_ID')
+    recipient_number = os.getenv('WHATSAPP_RECIPIENT_NUMBER')  # Your receiving number
+    template_name = 'contact_query'
+    
+    if not all([whatsapp_token, phone_number_id, recipient_number]):
+        logger.error("WhatsApp credentials not configured in environment variables")
+        return None
+    
+    # WhatsApp Cloud API endpoint
+    url = graph_url(f"v21.0/{phone_number_id}/messages")
+    
+    headers = {
+        "Authorization": f"Bearer {whatsapp_token}",
+        "Content-Type": "application/json"
+    }
+    
+    # Ensure recipient number is in international format (without +)
+    # e.g., 919876543210 for India
+    recipient = recipient_number.replace('+', '').replace('-', '').replace(' ', '')
+    
+    # Construct template message payload (body only, 4 parameters)
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": recipient,
+        "type": "template",
+        "template": {
+            "name": template_name,
+            "language": {
+                "code": "en_GB"
+            },
+            "components": [
+                {
+                    "type": "header",
+                    "parameters": [
+                        {
+                            "type": "text",
+                            "parameter_name": "subject",
+                            "text": contact_data['subject']
+                        }
+                    ]
+                },
+                {
+                    "type": "body",
+                    "parameters": [
+                        {
+                            "type": "text",
+                            "parameter_name": "name",
+                            "text": contact_data['name']
+                        },
+                        {
+                            "type": "text",
+                            "parameter_name": "phone",
+                            "text": contact_data['phone']
+                        },
+                        {
+                            "type": "text",
+                            "parameter_name": "message",
+                            "text": contact_data['message']
+                        }
+                    ]
+                }
+            ]
+        }
+    }
+    return {'url': url, 'json': payload, 'headers': headers, 'phone_number_id': phone_number_id}
+
+
+def handle_contact_response(response):
+    if response.status_code == 200:
+        logger.info(f"WhatsApp message sent successfully: {response.json()}")
+        return True
+    else:
+        logger.error(f"WhatsApp API error: {response.status_code} - {response.text}")
+        return False
+
+
+def send_whatsapp_message(contact_data):
+    """
+    Send contact form data via WhatsApp Business API using template
+
+    Returns True if sent, False if it failed, or ``Queued``.
+    """
+    try:
+        request_args = build_contact_request(contact_data)
+        if request_args is None:
+            return False
+        
+        # Send request
+        response = send_message(request_args, app='Contact')
+        return handle_contact_response(response)
+    
+    except MessageQueued as e:
+        logger.warning("WhatsApp API unavailable or slow; contact message stays queued")
+        return Queued(e.future)
+            
+    except Exception as e:
+        logger.error(f"Exception while sending WhatsApp message: {str(e)}")
+        return False
+
+
+async def asend_whatsapp_message(contact_data):
+    """
+    Async version of ``send_whatsapp_message`` for the ASGI view
+    """
+    try:
+        request_args = build_contact_request(contact_data)
+        if request_args is None:
+            return False
+        
+        response = await asend_message(request_args, app='Contact')
+        return handle_contact_response(response)
+    
+    except MessageQueued as e:
+        logger.warning("WhatsApp API unavailable or slow; contact message stays queued")
+        return Queued(e.future)
+            
+    except Exception as e:
+        logger.error(f"Exception while sending WhatsApp message: {str(e)}")
+        return False
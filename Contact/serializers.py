@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
 
+from bbdBackend.phone import NATIONAL_LENGTH, to_e164
+
 
 class ContactSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=200, required=True)
@@ -8,7 +11,12 @@ class ContactSerializer(serializers.Serializer):
     message = serializers.CharField(required=True)
 
     def validate_phone(self, value):
-        """Validate phone number format (10 digits)"""
-        if not value.isdigit() or len(value) != 10:
-            raise serializers.ValidationError("Phone number must be exactly 10 digits.")
+        """
+        Validate phone number format: a 10-digit number of our country,
+        optionally written with the country code or spacing (+91 98765 43210)
+        """
+        phone_e164 = to_e164(value)
+        country = f'+{settings.PHONE_DEFAULT_COUNTRY_CODE}'
+        if phone_e164 is None or not phone_e164.startswith(country) or len(phone_e164) != len(country) + NATIONAL_LENGTH:
+            raise serializers.ValidationError("Phone number must be 10 digits, e.g. 9876543210.")
         return value
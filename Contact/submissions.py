@@ -0,0 +1,275 @@
+"""
+Persistence, duplicate suppression and digests for contact submissions
+
+Every accepted submission is saved as a ``ContactSubmission``. A submission
+with the same phone number and normalized message as one saved in the last
+``CONTACT_DUPLICATE_WINDOW`` seconds (and not failed) is dropped, so
+double-clicks and bot bursts don't reach WhatsApp. The check looks up the
+indexed ``fingerprint`` column, so it holds across workers.
+
+With ``CONTACT_DIGEST_MINUTES`` set, the view only saves the submission and
+a timer in the worker forwards everything pending as one WhatsApp message
+that many minutes after the oldest one. The timer dies with the worker
+(machine auto-stop, worker recycling), so each worker re-arms it from the
+database on its first request, sending straight away what is overdue.
+``manage.py send_contact_digest`` on a schedule covers a machine that gets
+no requests at all.
+
+Rows being sent ('sending', 'queued') carry ``claimed_at``. Only claims
+older than ``CLAIM_TIMEOUT`` are taken over by a retry, so a digest still
+in a live worker's outbound queue isn't sent twice.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models import Q
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from bbdBackend.phone import to_e164
+
+from .models import ContactSubmission
+from .notifications import Queued, asend_whatsapp_message, handle_contact_response, send_whatsapp_message
+
+logger = logging.getLogger(__name__)
+
+# Template parameters are limited in length and can't contain newlines
+PARAMETER_LENGTH = 1000
+
+DIGEST_RECEIVER_UID = 'contact-digest-first-request'
+
+# Longer than a message can wait in the outbound queue's retries
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def fingerprint(phone, message):
+    """
+    sha256 of the canonical phone number and the message's words, ignoring
+    case, punctuation and spacing
+    """
+    digits = to_e164(phone) or re.sub(r'\D', '', phone)
+    words = ' '.join(re.findall(r'\w+', message.casefold()))
+    return hashlib.sha256(f'{digits}\n{words}'.encode()).hexdigest()
+
+
+def _recent_duplicates(value):
+    since = timezone.now() - timedelta(seconds=settings.CONTACT_DUPLICATE_WINDOW)
+    return ContactSubmission.objects.filter(fingerprint=value, created_at__gte=since).exclude(status='failed')
+
+
+def is_duplicate(value):
+    """
+    True if a submission with this fingerprint was saved within the
+    duplicate window and hasn't failed
+    """
+    if not settings.CONTACT_DUPLICATE_WINDOW:
+        return False
+    return _recent_duplicates(value).exists()
+
+
+async def ais_duplicate(value):
+    if not settings.CONTACT_DUPLICATE_WINDOW:
+        return False
+    return await _recent_duplicates(value).aexists()
+
+
+def new_submission(contact_data, ip_address=None):
+    """
+    Build an unsaved ``ContactSubmission`` from validated serializer data
+
+    Without a digest the view forwards it straight away, so it is saved
+    already claimed and no digest picks it up meanwhile.
+    """
+    forwarded = not settings.CONTACT_DIGEST_MINUTES
+    return ContactSubmission(
+        name=contact_data['name'],
+        phone=contact_data['phone'],
+        subject=contact_data['subject'],
+        message=contact_data['message'],
+        ip_address=ip_address,
+        fingerprint=fingerprint(contact_data['phone'], contact_data['message']),
+        status='sending' if forwarded else 'pending',
+        claimed_at=timezone.now() if forwarded else None,
+    )
+
+
+def record_outcome(submissions, result):
+    """
+    Store the result of ``send_whatsapp_message`` on ``submissions`` (a
+    queryset); returns False if the send failed
+
+    A queued message is stored as 'queued' and set to 'sent' or 'failed'
+    from the sending thread once the outbound queue delivers it. Failed
+    submissions no longer count as duplicates, so they can be resent.
+    """
+    if isinstance(result, Queued):
+        submissions.update(status='queued', claimed_at=timezone.now())
+        _complete_when_sent(submissions, result.future)
+        return True
+    if result:
+        submissions.update(status='sent', notified_at=timezone.now())
+    else:
+        submissions.update(status='failed')
+    return result
+
+
+def _complete_when_sent(submissions, future):
+    caller = threading.get_ident()
+
+    def on_done(future):
+        try:
+            record_outcome(submissions.filter(status='queued'), _sent(future))
+        finally:
+            # Connections are per thread; don't leave the sender's open
+            if threading.get_ident() != caller:
+                connections.close_all()
+
+    future.add_done_callback(on_done)
+
+
+def _sent(future, timeout=None):
+    try:
+        return handle_contact_response(future.result(timeout=timeout))
+    except FutureTimeoutError:
+        raise
+    except Exception as e:
+        logger.error(f"Queued contact message failed: {e}")
+        return False
+
+
+def forward_submission(submission, contact_data):
+    """
+    Send one submission straight away and save the outcome; returns False
+    if it failed (True if sent or queued)
+    """
+    result = send_whatsapp_message(contact_data)
+    return record_outcome(ContactSubmission.objects.filter(pk=submission.pk), result)
+
+
+async def aforward_submission(submission, contact_data):
+    """
+    Async version of ``forward_submission`` for the ASGI view
+    """
+    result = await asend_whatsapp_message(contact_data)
+    return await sync_to_async(record_outcome)(ContactSubmission.objects.filter(pk=submission.pk), result)
+
+
+def schedule_digest():
+    """
+    Make sure this worker forwards the pending submissions: at once if the
+    oldest has waited ``CONTACT_DIGEST_MINUTES``, else when it will have
+
+    Does nothing (and no query) while this worker's timer is running.
+    """
+    global _timer
+    with _timer_lock:
+        if _timer is not None and _timer.is_alive():
+            return
+        oldest = (
+            ContactSubmission.objects.filter(status='pending').order_by('created_at')
+            .values_list('created_at', flat=True).first()
+        )
+        if oldest is None:
+            return
+        waited = (timezone.now() - oldest).total_seconds()
+        _timer = threading.Timer(max(0, settings.CONTACT_DIGEST_MINUTES * 60 - waited), _send_digest_in_background)
+        _timer.daemon = True
+        _timer.start()
+
+
+def schedule_digest_on_first_request(sender, **kwargs):
+    """
+    ``request_started`` receiver re-arming the digest in a fresh worker,
+    then disconnecting itself
+    """
+    request_started.disconnect(dispatch_uid=DIGEST_RECEIVER_UID)
+    try:
+        schedule_digest()
+    except Exception:
+        logger.exception('Scheduling the contact digest failed')
+
+
+def _send_digest_in_background():
+    try:
+        send_digest()
+    except Exception:
+        logger.exception('Sending the contact digest failed')
+    finally:
+        # Connections are per thread; don't leave this one open
+        connections.close_all()
+
+
+def _parameter(text):
+    text = ' '.join(text.split())
+    return text if len(text) <= PARAMETER_LENGTH else text[:PARAMETER_LENGTH - 1] + '…'
+
+
+def digest_contact_data(submissions):
+    """
+    Contact data for the ``contact_query`` template summarizing several
+    submissions (a single submission is sent as it is)
+    """
+    if len(submissions) == 1:
+        submission = submissions[0]
+        return {
+            'name': submission.name, 'phone': submission.phone,
+            'subject': submission.subject, 'message': submission.message,
+        }
+    return {
+        'subject': _parameter(f'{len(submissions)} contact form submissions'),
+        'name': _parameter(', '.join(dict.fromkeys(submission.name for submission in submissions))),
+        'phone': _parameter(', '.join(dict.fromkeys(submission.phone for submission in submissions))),
+        'message': _parameter(' | '.join(
+            f'{submission.name} ({submission.phone}): {submission.subject} - {submission.message}'
+            for submission in submissions
+        )),
+    }
+
+
+def send_digest(retry=False, wait=None):
+    """
+    Claim every pending submission and forward them as one WhatsApp message
+
+    ``retry`` also picks up failed submissions and ones a worker that
+    stopped left 'sending' or 'queued' (claimed over ``CLAIM_TIMEOUT``
+    ago). A process about to exit (the management command) passes
+    ``wait``, the seconds to wait for a queued message to go out. Returns
+    the number of submissions sent or queued.
+    """
+    now = timezone.now()
+    unsent = Q(status='pending')
+    if retry:
+        unsent |= Q(status='failed') | Q(status__in=['sending', 'queued'], claimed_at__lt=now - CLAIM_TIMEOUT)
+    digest_id = uuid.uuid4()
+    # One UPDATE claims the rows, so concurrent digests never share one
+    claimed = ContactSubmission.objects.filter(unsent).update(status='sending', digest_id=digest_id, claimed_at=now)
+    if not claimed:
+        return 0
+
+    submissions = list(ContactSubmission.objects.filter(digest_id=digest_id).order_by('created_at', 'id'))
+    batch = ContactSubmission.objects.filter(digest_id=digest_id)
+    result = send_whatsapp_message(digest_contact_data(submissions))
+    if isinstance(result, Queued) and wait:
+        try:
+            result = _sent(result.future, timeout=wait)
+        except FutureTimeoutError:
+            logger.warning(f'Contact digest {digest_id}: still queued after {wait}s')
+    if not record_outcome(batch, result):
+        logger.error(f'Contact digest {digest_id}: sending {len(submissions)} submissions failed')
+        return 0
+
+    state = 'queued' if isinstance(result, Queued) else 'forwarded'
+    logger.info(f'Contact digest {digest_id}: {state} {len(submissions)} submissions')
+    return len(submissions)
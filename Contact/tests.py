@@ -1,3 +1,267 @@
-from django.test import TestCase
+import json
+import os
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django_ratelimit.exceptions import Ratelimited
+
+from bbdBackend.outbound import MessageQueued
+
+from . import submissions
+from .models import ContactSubmission
+from .views import AsyncContactSubmitView
+
+WHATSAPP_ENV = {
+    'WHATSAPP_ACCESS_TOKEN': 'test-token',
+    'WHATSAPP_PHONE_NUMBER_ID': '123456',
+    'WHATSAPP_RECIPIENT_NUMBER': '919876543210',
+}
+
+CONTACT_PAYLOAD = {
+    'name': 'Asha',
+    'phone': '9876543210',
+    'subject': 'Pickup',
+    'message': 'Please collect two sarees tomorrow.',
+}
+
+
+@override_settings(RATELIMIT_ENABLE=False)
+@mock.patch.dict(os.environ, WHATSAPP_ENV)
+@mock.patch('bbdBackend.graph.requests.request')
+class ContactSubmitQueryCountTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def submit(self, **changes):
+        return self.client.post(reverse('contact-submit'), {**CONTACT_PAYLOAD, **changes}, content_type='application/json')
+
+    def test_submission_is_saved_and_forwarded(self, graph_mock):
+        graph_mock.return_value = mock.Mock(status_code=200, text='{}', json=lambda: {})
+        # Duplicate check, INSERT, then UPDATE with the outcome
+        with self.assertNumQueries(3):
+            response = self.submit()
+        self.assertEqual(response.status_code, 200)
+        graph_mock.assert_called_once()
+        self.assertEqual(ContactSubmission.objects.get().status, 'sent')
+
+    def test_graph_failure_returns_500(self, graph_mock):
+        graph_mock.return_value = mock.Mock(status_code=503, text='unavailable')
+        response = self.submit()
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(ContactSubmission.objects.get().status, 'failed')
+
+        # A failed submission can be sent again straight away
+        graph_mock.return_value = mock.Mock(status_code=200, text='{}', json=lambda: {})
+        self.assertEqual(self.submit().status_code, 200)
+        self.assertEqual(graph_mock.call_count, 2)
+
+    def test_phone_must_be_a_national_number(self, graph_mock):
+        graph_mock.return_value = mock.Mock(status_code=200, text='{}', json=lambda: {})
+        for phone in ('+91 98765 43210', '09876543210', '919876543210'):
+            with self.subTest(phone=phone):
+                # Otherwise suppressed as a duplicate of the previous one
+                ContactSubmission.objects.all().delete()
+                self.assertEqual(self.submit(phone=phone).status_code, 200)
+        for phone in ('98765', '+44 20 7946 0958', '12345678901234'):
+            with self.subTest(phone=phone):
+                self.assertEqual(self.submit(phone=phone).status_code, 400)
+
+    def test_near_duplicates_are_suppressed(self, graph_mock):
+        graph_mock.return_value = mock.Mock(status_code=200, text='{}', json=lambda: {})
+        self.submit()
+        # Only the duplicate check
+        with self.assertNumQueries(1):
+            response = self.submit(message='  please collect TWO sarees tomorrow ')
+        self.assertEqual(response.status_code, 200)
+        self.submit(message='Please collect three sarees tomorrow.')
+
+        self.assertEqual(ContactSubmission.objects.count(), 2)
+        self.assertEqual(graph_mock.call_count, 2)
+
+    def test_queued_submission_is_sent_when_the_queue_delivers(self, graph_mock):
+        future = Future()
+        with mock.patch('Contact.notifications.send_message', side_effect=MessageQueued(future)):
+            self.assertEqual(self.submit().status_code, 200)
+        submission = ContactSubmission.objects.get()
+        self.assertEqual(submission.status, 'queued')
+        self.assertIsNone(submission.notified_at)
+
+        future.set_result(mock.Mock(status_code=200, text='{}', json=lambda: {}))
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'sent')
+        self.assertIsNotNone(submission.notified_at)
+
+    def test_queued_submission_that_fails_can_be_resent(self, graph_mock):
+        future = Future()
+        with mock.patch('Contact.notifications.send_message', side_effect=MessageQueued(future)):
+            self.submit()
+        future.set_exception(ConnectionError('reset'))
+        self.assertEqual(ContactSubmission.objects.get().status, 'failed')
+
+        graph_mock.return_value = mock.Mock(status_code=200, text='{}', json=lambda: {})
+        self.submit()
+        graph_mock.assert_called_once()
+
+    @override_settings(CONTACT_DIGEST_MINUTES=5)
+    @mock.patch('Contact.views.schedule_digest')
+    def test_digest_collapses_submissions(self, schedule_mock, graph_mock):
+        graph_mock.return_value = mock.Mock(status_code=200, text='{}', json=lambda: {})
+        with self.assertNumQueries(2):
+            self.assertEqual(self.submit().status_code, 200)
+        self.submit(name='Ravi', phone='9123456780', message='Is the shop open on Sunday?')
+        graph_mock.assert_not_called()
+        self.assertEqual(schedule_mock.call_count, 2)
+
+        out = StringIO()
+        call_command('send_contact_digest', stdout=out)
+        self.assertIn('Forwarded 2', out.getvalue())
+        graph_mock.assert_called_once()
+        parameters = graph_mock.call_args.kwargs['json']['template']['components'][1]['parameters']
+        self.assertEqual(parameters[0]['text'], 'Asha, Ravi')
+        self.assertIn('Ravi (9123456780): Pickup - Is the shop open on Sunday?', parameters[2]['text'])
+        self.assertEqual(set(ContactSubmission.objects.values_list('status', flat=True)), {'sent'})
+
+        # Nothing left to send
+        call_command('send_contact_digest', stdout=StringIO())
+        graph_mock.assert_called_once()
+
+    @override_settings(CONTACT_DIGEST_MINUTES=5)
+    @mock.patch('Contact.views.schedule_digest')
+    def test_digest_command_waits_for_queued_message(self, schedule_mock, graph_mock):
+        self.submit()
+        future = Future()
+        future.set_result(mock.Mock(status_code=200, text='{}', json=lambda: {}))
+        with mock.patch('Contact.notifications.send_message', side_effect=MessageQueued(future)):
+            call_command('send_contact_digest', '--wait', '1', stdout=StringIO())
+        self.assertEqual(ContactSubmission.objects.get().status, 'sent')
+
+        # Without a result in time the rows stay queued, for --retry
+        self.submit(message='Another question')
+        with mock.patch('Contact.notifications.send_message', side_effect=MessageQueued(Future())):
+            call_command('send_contact_digest', '--wait', '0.01', stdout=StringIO())
+        self.assertEqual(ContactSubmission.objects.filter(status='queued').count(), 1)
+
+    @override_settings(CONTACT_DIGEST_MINUTES=5)
+    @mock.patch('Contact.views.schedule_digest')
+    def test_retry_only_takes_over_stale_claims(self, schedule_mock, graph_mock):
+        graph_mock.return_value = mock.Mock(status_code=200, text='{}', json=lambda: {})
+        for message in ('In the outbound queue', 'Claimed by a worker that stopped', 'Sending right now'):
+            self.submit(message=message)
+        ContactSubmission.objects.filter(message='In the outbound queue').update(
+            status='queued', claimed_at=timezone.now(),
+        )
+        ContactSubmission.objects.filter(message='Claimed by a worker that stopped').update(
+            status='sending', claimed_at=timezone.now() - submissions.CLAIM_TIMEOUT - timedelta(seconds=1),
+        )
+        ContactSubmission.objects.filter(message='Sending right now').update(status='sending', claimed_at=timezone.now())
+
+        call_command('send_contact_digest', '--retry', stdout=StringIO())
+
+        graph_mock.assert_called_once()
+        parameters = graph_mock.call_args.kwargs['json']['template']['components'][1]['parameters']
+        self.assertIn('Claimed by a worker that stopped', [parameter['text'] for parameter in parameters])
+        self.assertEqual(
+            sorted(ContactSubmission.objects.values_list('status', flat=True)), ['queued', 'sending', 'sent'],
+        )
+
+    def test_duplicates_are_found_in_the_database(self, graph_mock):
+        # Saved by another worker, whose cache this one doesn't share
+        ContactSubmission.objects.create(
+            **CONTACT_PAYLOAD, status='sent', fingerprint=submissions.fingerprint('9876543210', CONTACT_PAYLOAD['message']),
+        )
+        self.assertEqual(self.submit().status_code, 200)
+        self.assertEqual(ContactSubmission.objects.count(), 1)
+        graph_mock.assert_not_called()
+
+
+@override_settings(CONTACT_DIGEST_MINUTES=5)
+@mock.patch.object(submissions, '_timer', None)
+@mock.patch.object(submissions.threading, 'Timer')
+class DigestSchedulingTests(TestCase):
+    """
+    The digest timer is re-armed from the database, so a worker that
+    stopped doesn't leave submissions pending
+    """
+
+    def pending(self, minutes_ago):
+        submission = ContactSubmission.objects.create(name='Asha', phone='9876543210', subject='s', message='m')
+        ContactSubmission.objects.filter(pk=submission.pk).update(
+            created_at=timezone.now() - timedelta(minutes=minutes_ago)
+        )
+
+    def test_nothing_pending(self, timer_mock):
+        submissions.schedule_digest()
+        timer_mock.assert_not_called()
+
+    def test_waits_for_the_rest_of_the_interval(self, timer_mock):
+        self.pending(minutes_ago=2)
+        submissions.schedule_digest()
+        delay = timer_mock.call_args.args[0]
+        self.assertTrue(170 < delay <= 180, delay)
+
+    def test_overdue_submissions_are_sent_at_once(self, timer_mock):
+        self.pending(minutes_ago=60)
+        self.pending(minutes_ago=1)
+        submissions.schedule_digest()
+        self.assertEqual(timer_mock.call_args.args[0], 0)
+
+    def test_first_request_rearms_then_disconnects(self, timer_mock):
+        self.pending(minutes_ago=60)
+        request_started.connect(
+            submissions.schedule_digest_on_first_request, dispatch_uid=submissions.DIGEST_RECEIVER_UID
+        )
+        self.client.get(reverse('ready'))
+        self.client.get(reverse('ready'))
+        timer_mock.assert_called_once()
+        self.assertFalse(request_started.disconnect(dispatch_uid=submissions.DIGEST_RECEIVER_UID))
+
+
+@override_settings(RATELIMIT_ENABLE=False)
+@mock.patch.dict(os.environ, WHATSAPP_ENV)
+@mock.patch('bbdBackend.graph.requests.request')
+class AsyncContactSubmitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_submission_is_saved_once(self, graph_mock):
+        graph_mock.return_value = mock.Mock(status_code=200, text='{}', json=lambda: {})
+        for _ in range(2):
+            request = AsyncRequestFactory().post(
+                reverse('contact-submit'), json.dumps(CONTACT_PAYLOAD), content_type='application/json'
+            )
+            response = await AsyncContactSubmitView.as_view()(request)
+            self.assertEqual(response.status_code, 200)
+
+        submission = await ContactSubmission.objects.aget()
+        self.assertEqual(submission.status, 'sent')
+        graph_mock.assert_called_once()
+
+    @override_settings(RATELIMIT_ENABLE=True)
+    async def test_rate_limit_is_checked_off_the_event_loop(self, graph_mock):
+        checked_on = []
+
+        def limited(**kwargs):
+            checked_on.append(threading.get_ident())
+            return True
+
+        request = AsyncRequestFactory().post(
+            reverse('contact-submit'), json.dumps(CONTACT_PAYLOAD), content_type='application/json'
+        )
+        with mock.patch('bbdBackend.ratelimits.is_ratelimited', side_effect=limited):
+            with self.assertRaises(Ratelimited):
+                await AsyncContactSubmitView.as_view()(request)
+
+        self.assertNotIn(threading.get_ident(), checked_on)
+        self.assertFalse(await ContactSubmission.objects.aexists())
+        graph_mock.assert_not_called()
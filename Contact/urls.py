@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.urls import path
-from .views import ContactSubmitView
+from .views import ContactSubmitView, AsyncContactSubmitView
 
 urlpatterns = [
-    path('submit/', ContactSubmitView.as_view(), name='contact-submit'),
+    path(
+        'submit/', (AsyncContactSubmitView if settings.ASYNC_VIEWS else ContactSubmitView).as_view(),
+        name='contact-submit',
+    ),
 ]
@@ -1,20 +1,49 @@
+from asgiref.sync import sync_to_async
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from .serializers import ContactSerializer
+from .submissions import (
+    aforward_submission, ais_duplicate, forward_submission, is_duplicate, new_submission, schedule_digest,
+)
+from django.conf import settings
 from django_ratelimit.decorators import ratelimit
+from bbdBackend.ratelimits import aratelimit
 from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.http import JsonResponse
 import logging
-import requests
-import os
+import json
 
 logger = logging.getLogger(__name__)
 
+SUCCESS_RESPONSE = {
+    'code': 200,
+    'message': 'Contact form submitted successfully!'
+}
+FAILURE_RESPONSE = {
+    'code': 500,
+    'error': 'Failed to send message. Please try again or contact us directly.'
+}
+
+
+def _validation_failed(serializer):
+    logger.error(f"Validation errors: {serializer.errors}")
+    return {
+        'code': 400,
+        'error': 'Validation failed',
+        'details': serializer.errors
+    }
+
 
 @method_decorator(ratelimit(key='ip', rate='10/h', block=True), name='dispatch')
 class ContactSubmitView(APIView):
     """
     API endpoint to handle contact form submissions and forward via WhatsApp
+
+    Submissions are saved first; duplicates within the window are accepted
+    but neither saved nor forwarded (see Contact/submissions.py).
     """
     
     def post(self, request):
@@ -24,113 +53,68 @@ class ContactSubmitView(APIView):
         # Validate incoming data
         serializer = ContactSerializer(data=request.data)
         if not serializer.is_valid():
-            logger.error(f"Validation errors: {serializer.errors}")
-            return Response({
-                'code': 400,
-                'error': 'Validation failed',
-                'details': serializer.errors
-            }, status=status.HTTP_400_BAD_REQUEST)
+            return Response(_validation_failed(serializer), status=status.HTTP_400_BAD_REQUEST)
 
         # Extract validated data
         contact_data = serializer.validated_data
+        submission = new_submission(contact_data, ip)
+        if is_duplicate(submission.fingerprint):
+            logger.info(f"Duplicate contact submission from {ip} suppressed")
+            return Response(SUCCESS_RESPONSE, status=status.HTTP_200_OK)
+        submission.save()
+
+        # Digest mode: this worker's timer forwards the pending submissions together
+        if settings.CONTACT_DIGEST_MINUTES:
+            schedule_digest()
+            return Response(SUCCESS_RESPONSE, status=status.HTTP_200_OK)
         
         # Send WhatsApp message
-        whatsapp_success = self.send_whatsapp_message(contact_data)
+        whatsapp_success = forward_submission(submission, contact_data)
         
         if whatsapp_success:
             logger.info(f"Contact form submitted successfully from {ip}")
-            return Response({
-                'code': 200,
-                'message': 'Contact form submitted successfully!'
-            }, status=status.HTTP_200_OK)
+            return Response(SUCCESS_RESPONSE, status=status.HTTP_200_OK)
         else:
             logger.error(f"Failed to send WhatsApp message for submission from {ip}")
-            return Response({
-                'code': 500,
-                'error': 'Failed to send message. Please try again or contact us directly.'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-    def send_whatsapp_message(self, contact_data):
-        """
-        Send contact form data via WhatsApp Business API using template
-        """
+            return Response(FAILURE_RESPONSE, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(aratelimit(key='ip', rate='10/h', block=True), name='dispatch')
+class AsyncContactSubmitView(View):
+    """
+    ASGI version of ContactSubmitView: the Graph API call doesn't hold a thread
+    """
+    
+    async def post(self, request):
+        ip = request.META.get('REMOTE_ADDR')
         try:
-            # Get WhatsApp credentials from environment
-            whatsapp_token = os.getenv('WHATSAPP_ACCESS_TOKEN')
-            phone_number_id = os.getenv('WHATSAPP_PHONE_NUMBER_ID')
-            recipient_number = os.getenv('WHATSAPP_RECIPIENT_NUMBER')  # Your receiving number
-            template_name = 'contact_query'
-            
-            if not all([whatsapp_token, phone_number_id, recipient_number]):
-                logger.error("WhatsApp credentials not configured in environment variables")
-                return False
-            
-            # WhatsApp Cloud API endpoint
-            url = f"https://graph.facebook.com/v21.0/{phone_number_id}/messages"
-            
-            headers = {
-                "Authorization": f"Bearer {whatsapp_token}",
-                "Content-Type": "application/json"
-            }
-            
-            # Ensure recipient number is in international format (without +)
-            # e.g., 919876543210 for India
-            recipient = recipient_number.replace('+', '').replace('-', '').replace(' ', '')
-            
-            # Construct template message payload (body only, 4 parameters)
-            payload = {
-                "messaging_product": "whatsapp",
-                "to": recipient,
-                "type": "template",
-                "template": {
-                    "name": template_name,
-                    "language": {
-                        "code": "en_GB"
-                    },
-                    "components": [
-                        {
-                            "type": "header",
-                            "parameters": [
-                                {
-                                    "type": "text",
-                                    "parameter_name": "subject",
-                                    "text": contact_data['subject']
-                                }
-                            ]
-                        },
-                        {
-                            "type": "body",
-                            "parameters": [
-                                {
-                                    "type": "text",
-                                    "parameter_name": "name",
-                                    "text": contact_data['name']
-                                },
-                                {
-                                    "type": "text",
-                                    "parameter_name": "phone",
-                                    "text": contact_data['phone']
-                                },
-                                {
-                                    "type": "text",
-                                    "parameter_name": "message",
-                                    "text": contact_data['message']
-                                }
-                            ]
-                        }
-                    ]
-                }
-            }
-            # Send request
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                logger.info(f"WhatsApp message sent successfully: {response.json()}")
-                return True
-            else:
-                logger.error(f"WhatsApp API error: {response.status_code} - {response.text}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Exception while sending WhatsApp message: {str(e)}")
-            return False
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'code': 400, 'error': 'Invalid JSON'}, status=400)
+        logger.info(f"POST /api/contact/ from {ip} — Data: {data}")
+
+        # The serializer has no database validators, so it is safe on the event loop
+        serializer = ContactSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(_validation_failed(serializer), status=400)
+
+        contact_data = serializer.validated_data
+        submission = new_submission(contact_data, ip)
+        if await ais_duplicate(submission.fingerprint):
+            logger.info(f"Duplicate contact submission from {ip} suppressed")
+            return JsonResponse(SUCCESS_RESPONSE, status=200)
+        await submission.asave()
+
+        if settings.CONTACT_DIGEST_MINUTES:
+            await sync_to_async(schedule_digest)()
+            return JsonResponse(SUCCESS_RESPONSE, status=200)
+
+        whatsapp_success = await aforward_submission(submission, contact_data)
+        
+        if whatsapp_success:
+            logger.info(f"Contact form submitted successfully from {ip}")
+            return JsonResponse(SUCCESS_RESPONSE, status=200)
+        else:
+            logger.error(f"Failed to send WhatsApp message for submission from {ip}")
+            return JsonResponse(FAILURE_RESPONSE, status=500)
@@ -0,0 +1,57 @@
+from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
+
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'query_duration_ms', 'user']
+    list_filter = ['method', 'status_code', 'view_name']
+    search_fields = ['path', 'view_name']
+    date_hierarchy = 'created_at'
+    fields = [
+        'created_at', 'user', 'method', 'path', 'view_name', 'status_code', 'duration_ms',
+        'query_count', 'query_duration_ms', 'download', 'stats_report', 'query_table',
+    ]
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/download/', self.admin_site.admin_view(self.download_view),
+                name='bbdBackend_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    def download_view(self, request, pk):
+        """The raw cProfile data, for snakeviz or ``python -m pstats``"""
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        response = HttpResponse(bytes(profile.profile_data), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="request-profile-{profile.pk}.prof"'
+        return response
+
+    def download(self, obj):
+        return format_html('<a href="{}">.prof file</a>', reverse('admin:bbdBackend_requestprofile_download', args=[obj.pk]))
+    download.short_description = 'cProfile data'
+
+    def stats_report(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto">{}</pre>', obj.stats)
+    stats_report.short_description = 'Profile (cumulative)'
+
+    def query_table(self, obj):
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+            ((query['duration_ms'], query['alias'], query['sql']) for query in obj.queries),
+        )
+        return format_html('<table><tr><th>ms</th><th>alias</th><th>SQL</th></tr>{}</table>', rows)
+    query_table.short_description = 'Queries'
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "bbdBackend.settings")
+# Serve the native async views (webhook, media proxy, bill/contact senders)
+os.environ.setdefault("ASYNC_VIEWS", "True")
 
 application = get_asgi_application()
@@ -0,0 +1,30 @@
+"""
+Bearer-token checks shared by the token-protected endpoints
+"""
+
+import hmac
+
+
+def bearer_token_matches(request, token):
+    """True if ``token`` is set and the request sends it as a bearer token"""
+    if not token:
+        return False
+    supplied = request.META.get('HTTP_AUTHORIZATION', '')
+    return hmac.compare_digest(supplied, f'Bearer {token}')
+
+
+def token_denial(request, token):
+    """
+    Status code to refuse a request to an endpoint guarded by ``token``, or
+    None to let it through
+
+    Staff sessions and requests sending the token are allowed. Without a
+    configured token the endpoint is closed to everyone else (403) rather
+    than open, so a default deploy doesn't expose it.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return None
+    if bearer_token_matches(request, token):
+        return None
+    return 401 if token else 403
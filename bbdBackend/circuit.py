@@ -0,0 +1,111 @@
+"""
+Circuit breaker for calls to an unreliable upstream.
+
+Closed, it records the outcome of every call over the last
+``GRAPH_CIRCUIT_WINDOW`` seconds. Once at least ``GRAPH_CIRCUIT_MIN_CALLS``
+were made and ``GRAPH_CIRCUIT_ERROR_RATE`` of them failed (an exception, a
+5xx, or slower than ``GRAPH_CIRCUIT_SLOW_CALL`` seconds) it opens: callers
+fail fast for ``GRAPH_CIRCUIT_OPEN_SECONDS``. Then it lets one probe
+through (half-open); a good probe closes it, a bad one opens it again.
+
+State is per process, so each gunicorn worker trips on its own traffic.
+"""
+
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .metrics import GRAPH_CIRCUIT_STATE, GRAPH_CIRCUIT_TRANSITIONS
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        return self._state
+
+    def _set_state(self, state):
+        if state == self._state:
+            return
+        self._state = state
+        GRAPH_CIRCUIT_STATE.set(STATE_VALUES[state], circuit=self.name)
+        GRAPH_CIRCUIT_TRANSITIONS.inc(circuit=self.name, state=state)
+
+    def retry_in(self):
+        """Seconds until a call would be allowed (0 if one is allowed now)"""
+        with self._lock:
+            if self._state == CLOSED or not settings.GRAPH_CIRCUIT_ENABLE:
+                return 0.0
+            if self._state == OPEN:
+                return max(0.0, self._opened_at + settings.GRAPH_CIRCUIT_OPEN_SECONDS - time.monotonic())
+            # Half-open: wait for the probe's result
+            return settings.GRAPH_CIRCUIT_OPEN_SECONDS if self._probe_in_flight else 0.0
+
+    def allow(self):
+        """
+        True if a call may go ahead; in the half-open state only one caller
+        (the probe) gets True until its outcome is recorded
+        """
+        if not settings.GRAPH_CIRCUIT_ENABLE:
+            return True
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() < self._opened_at + settings.GRAPH_CIRCUIT_OPEN_SECONDS:
+                    return False
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record(self, ok, duration):
+        """Record the outcome of an allowed call"""
+        failed = not ok or duration > settings.GRAPH_CIRCUIT_SLOW_CALL
+        now = time.monotonic()
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probe_in_flight = False
+                if failed:
+                    self._open(now)
+                else:
+                    self._calls.clear()
+                    self._set_state(CLOSED)
+                return
+            if self._state == OPEN:
+                # A call that started before the circuit opened
+                return
+
+            self._calls.append((now, failed))
+            while self._calls and self._calls[0][0] < now - settings.GRAPH_CIRCUIT_WINDOW:
+                self._calls.popleft()
+            if len(self._calls) >= settings.GRAPH_CIRCUIT_MIN_CALLS:
+                failures = sum(failed for _, failed in self._calls)
+                if failures / len(self._calls) >= settings.GRAPH_CIRCUIT_ERROR_RATE:
+                    self._open(now)
+
+    def _open(self, now):
+        self._opened_at = now
+        self._calls.clear()
+        self._set_state(OPEN)
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._probe_in_flight = False
+            self._set_state(CLOSED)
@@ -0,0 +1,98 @@
+"""
+One customer's slips, WhatsApp conversation and recent messages together
+
+``customer_profile`` joins the apps on ``phone_e164`` with a fixed four
+queries (conversation, open slips with their latest notification, their
+items, latest messages) and caches the result per number for
+``CUSTOMER_CACHE_TTL`` seconds. Bill creation, notification outcomes and
+webhook ingestion call ``invalidate_customers`` once their transaction
+commits, so the counter never sees a stale profile from this worker; other
+workers only see the invalidation if ``CACHE_URL`` is a shared cache.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.utils import timezone
+
+from bbdBackend.phone import phone_q
+from bills.models import items, slip, slip_notification
+from whatsapp.models import WhatsAppConversation, WhatsAppMessage
+
+LATEST_MESSAGES = 10
+MESSAGE_FIELDS = ['message_id', 'message_type', 'text_body', 'media_url', 'media_caption', 'status', 'timestamp']
+
+
+def _cache_key(phone_e164):
+    return f'customer:{phone_e164}'
+
+
+def invalidate_customers(phone_numbers):
+    """
+    Drop the cached profiles of these E.164 numbers after the current
+    transaction commits
+    """
+    keys = [_cache_key(phone) for phone in set(phone_numbers) if phone]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def customer_profile(phone_e164):
+    """
+    JSON-ready profile of a customer, from the cache when possible
+    """
+    key = _cache_key(phone_e164)
+    profile = cache.get(key)
+    if profile is None:
+        profile = build_profile(phone_e164)
+        cache.set(key, profile, settings.CUSTOMER_CACHE_TTL)
+    return profile
+
+
+def build_profile(phone_e164):
+    # Rows not backfilled yet (phone_e164 NULL) match on their raw number
+    conversation = WhatsAppConversation.objects.filter(phone_q(phone_e164, raw_field='phone_number')).first()
+
+    # Slips have no status column: a slip is open until its due date has passed
+    latest_notification = slip_notification.objects.filter(slip=OuterRef('pk')).order_by('-created_at', '-id')
+    open_slips = (
+        slip.objects.filter(phone_q(phone_e164, raw_field='phone'), due_date__gte=timezone.localdate())
+        .annotate(
+            delivery_status=Subquery(latest_notification.values('status')[:1]),
+            delivery_status_at=Subquery(latest_notification.values('status_at')[:1]),
+        )
+        .prefetch_related(Prefetch('items', queryset=items.objects.order_by('id')))
+        .order_by('due_date', 'slip_no')
+    )
+    messages = (
+        WhatsAppMessage.objects.filter(phone_q(phone_e164, raw_field='from_number'))
+        .order_by('-timestamp', '-id').values(*MESSAGE_FIELDS)[:LATEST_MESSAGES]
+    )
+
+    return {
+        'phone': phone_e164,
+        'name': conversation.contact_name if conversation else None,
+        'unread_count': conversation.unread_count if conversation else 0,
+        'last_message_at': conversation.last_message_at if conversation else None,
+        'open_slips': [
+            {
+                'slip_no': bill.slip_no,
+                'date': bill.date,
+                'due_date': bill.due_date,
+                'amount': bill.amount,
+                'items': [
+                    {
+                        'item_name': item.item_name,
+                        'service': item.service,
+                        'quantity': item.quantity,
+                        'price_per_unit': str(item.price_per_unit),
+                    }
+                    for item in bill.items.all()
+                ],
+                'notification': {'status': bill.delivery_status, 'status_at': bill.delivery_status_at},
+            }
+            for bill in open_slips
+        ],
+        'latest_messages': list(messages),
+    }
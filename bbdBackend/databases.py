@@ -0,0 +1,51 @@
+"""
+``DATABASES`` entries for each connection mode (``DB_POOL_MODE``)
+
+- persistent (default): each worker thread keeps its connection for 10
+  minutes and checks it with a query before reusing it
+- pool: Django's psycopg 3 connection pool, ``DB_POOL_MIN_SIZE`` to
+  ``DB_POOL_MAX_SIZE`` connections per worker process shared by its
+  threads; a request waits up to ``DB_POOL_TIMEOUT`` seconds for one
+- pgbouncer: a connection per request to a PgBouncer in transaction pooling
+  mode, which does the pooling; server-side cursors are disabled since
+  they don't survive transaction pooling
+
+PostgreSQL URLs use ``bbdBackend.postgresql``, which times every connect or
+checkout into ``db_connection_wait_seconds``.
+"""
+
+import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
+
+MODES = ('persistent', 'pool', 'pgbouncer')
+
+
+def database_config(url, mode='persistent', pool_min_size=2, pool_max_size=4, pool_timeout=10.0):
+    """
+    Return the settings dict of one database for ``mode``
+    """
+    if mode not in MODES:
+        raise ImproperlyConfigured(f"DB_POOL_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+
+    config = dj_database_url.parse(url)
+    postgres = config['ENGINE'] == 'django.db.backends.postgresql'
+    if postgres:
+        config['ENGINE'] = 'bbdBackend.postgresql'
+
+    if mode == 'persistent':
+        config.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+        return config
+    if not postgres:
+        raise ImproperlyConfigured(f"DB_POOL_MODE={mode} needs a PostgreSQL DATABASE_URL")
+
+    # Connections go back to the pool (or PgBouncer) at the end of each request
+    config.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False)
+    if mode == 'pool':
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': pool_min_size,
+            'max_size': pool_max_size,
+            'timeout': pool_timeout,
+        }
+    else:
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return config
@@ -0,0 +1,147 @@
+"""
+Streaming CSV / NDJSON exports of messages, conversations and bills.
+
+Rows are read with ``.values_list().iterator(chunk_size=...)`` (a server-side
+cursor on PostgreSQL) and encoded one block of ``chunk_size`` rows at a time,
+so memory stays constant however many rows are exported. Used by
+``/api/export/<dataset>/`` and ``manage.py export_data``.
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from bills.models import items
+from whatsapp.models import WhatsAppConversation, WhatsAppMessage
+
+from .phone import phone_q
+
+DEFAULT_CHUNK_SIZE = 2000
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Dataset:
+    """
+    What an export reads: the columns, and which ones the date-range and
+    phone filters apply to. The phone filter matches ``e164_field``, and
+    ``phone_field`` (the raw number) only on rows not backfilled yet.
+    """
+
+    def __init__(self, model, fields, date_field, phone_field, e164_field, ordering=('id',), date_is_datetime=True):
+        self.model = model
+        self.fields = fields
+        self.date_field = date_field
+        self.phone_field = phone_field
+        self.e164_field = e164_field
+        self.ordering = ordering
+        self.date_is_datetime = date_is_datetime
+
+    def queryset(self, start=None, end=None, phone=None):
+        """
+        ``start`` and ``end`` are inclusive dates; ``phone`` is a number in
+        any format (an invalid one matches nothing)
+        """
+        rows = self.model.objects.order_by(*self.ordering)
+        if start:
+            rows = rows.filter(**{f'{self.date_field}__gte': self._day_start(start)})
+        if end:
+            if self.date_is_datetime:
+                rows = rows.filter(**{f'{self.date_field}__lt': self._day_start(end + timedelta(days=1))})
+            else:
+                rows = rows.filter(**{f'{self.date_field}__lte': end})
+        if phone:
+            match = phone_q(phone, self.e164_field, self.phone_field)
+            rows = rows.filter(match) if match is not None else rows.none()
+        return rows.values_list(*self.fields)
+
+    def _day_start(self, day):
+        if self.date_is_datetime:
+            return timezone.make_aware(datetime.combine(day, time.min))
+        return day
+
+
+DATASETS = {
+    # raw_payload is left out: it's the bulk of each row and isn't needed for reporting
+    'messages': Dataset(
+        WhatsAppMessage,
+        ['id', 'message_id', 'from_number', 'from_name', 'message_type', 'text_body', 'media_id',
+         'media_mime_type', 'media_caption', 'latitude', 'longitude', 'timestamp', 'status'],
+        date_field='timestamp', phone_field='from_number', e164_field='phone_e164',
+    ),
+    'conversations': Dataset(
+        WhatsAppConversation,
+        ['id', 'phone_number', 'contact_name', 'last_message_at', 'message_count', 'unread_count',
+         'customer_email', 'created_at'],
+        date_field='last_message_at', phone_field='phone_number', e164_field='phone_e164',
+    ),
+    # One row per bill item, with its slip's columns repeated
+    'bills': Dataset(
+        items,
+        ['slip__slip_no', 'slip__date', 'slip__due_date', 'slip__phone', 'slip__address', 'slip__amount',
+         'item_name', 'service', 'quantity', 'price_per_unit'],
+        date_field='slip__date', phone_field='slip__phone', e164_field='slip__phone_e164',
+        ordering=('slip_id', 'id'), date_is_datetime=False,
+    ),
+}
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def export_blocks(dataset, fmt, start=None, end=None, phone=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the export as bytes, one block per ``chunk_size`` rows
+    """
+    spec = DATASETS[dataset]
+    columns = [field.replace('slip__', 'slip_') for field in spec.fields]
+    rows = spec.queryset(start, end, phone).iterator(chunk_size=chunk_size)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+
+    count = 0
+    for row in rows:
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, map(_json_value, row))), ensure_ascii=False))
+            buffer.write('\n')
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def aexport_blocks(blocks):
+    """
+    Async wrapper for ASGI: Django would otherwise buffer a sync iterator
+    completely before sending it
+
+    Each block is produced in the thread that owns the database connection.
+    """
+    blocks = iter(blocks)
+    next_block = sync_to_async(next, thread_sensitive=True)
+    while True:
+        block = await next_block(blocks, None)
+        if block is None:
+            return
+        yield block
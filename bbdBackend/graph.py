@@ -0,0 +1,127 @@
+"""
+Shared helpers for outbound calls to the Meta Graph API.
+
+All three apps go through ``graph_request`` (or ``agraph_request`` from async
+views) so latency and status codes are recorded the same way regardless of
+which view made the call. Both share one circuit breaker: while the Graph API
+is failing they raise ``GraphUnavailable`` at once instead of waiting for
+the timeout.
+"""
+
+import asyncio
+import time
+import weakref
+
+from django.conf import settings
+
+from .circuit import CircuitBreaker
+from .metrics import GRAPH_LATENCY, GRAPH_RESPONSES
+
+circuit = CircuitBreaker('graph_api')
+
+# One pooled AsyncClient per event loop; a client can't be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def __getattr__(name):
+    # requests (~50ms to import) is loaded on the first outbound call rather
+    # than at boot; module attribute access still works for tests and mocks
+    if name == 'requests':
+        import requests
+        return requests
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class GraphUnavailable(Exception):
+    """
+    Raised without calling the Graph API while the circuit is open
+
+    ``retry_in`` is the number of seconds until the next probe.
+    """
+
+    def __init__(self, retry_in):
+        super().__init__(f'Graph API unavailable, retrying in {retry_in:.0f}s')
+        self.retry_in = retry_in
+
+
+def _check_circuit(app, endpoint):
+    if not circuit.allow():
+        GRAPH_RESPONSES.inc(app=app, endpoint=endpoint, status='circuit_open')
+        raise GraphUnavailable(circuit.retry_in())
+
+
+def graph_url(path):
+    """
+    Build a Graph API URL, e.g. ``graph_url('v22.0/<phone_number_id>/messages')``
+
+    The host comes from ``GRAPH_API_BASE_URL`` so outbound calls can be
+    pointed at a local simulator.
+    """
+    return f"{settings.GRAPH_API_BASE_URL.rstrip('/')}/{path.lstrip('/')}"
+
+
+def graph_request(method, url, *, app, endpoint, **kwargs):
+    """
+    Perform a Graph API call and record its latency and status code.
+
+    ``app`` and ``endpoint`` are metric labels, e.g. ``app='bills'``,
+    ``endpoint='messages'``. Exceptions are recorded with status ``error``
+    and re-raised. Calls time out after ``GRAPH_API_TIMEOUT`` seconds unless
+    a ``timeout`` is passed.
+    """
+    import requests
+
+    _check_circuit(app, endpoint)
+    kwargs.setdefault('timeout', settings.GRAPH_API_TIMEOUT)
+    status_label = 'error'
+    start = time.perf_counter()
+    try:
+        response = requests.request(method, url, **kwargs)
+        status_label = str(response.status_code)
+        return response
+    finally:
+        duration = time.perf_counter() - start
+        circuit.record(status_label != 'error' and not status_label.startswith('5'), duration)
+        GRAPH_LATENCY.observe(duration, app=app, endpoint=endpoint)
+        GRAPH_RESPONSES.inc(app=app, endpoint=endpoint, status=status_label)
+
+
+def get_async_client():
+    """
+    Return the pooled ``httpx.AsyncClient`` for the running event loop
+    """
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=settings.GRAPH_API_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.GRAPH_API_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GRAPH_API_MAX_CONNECTIONS,
+            ),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def agraph_request(method, url, *, app, endpoint, **kwargs):
+    """
+    Async counterpart of ``graph_request`` using a pooled ``httpx.AsyncClient``.
+
+    Returns an ``httpx.Response``; like ``requests`` it exposes
+    ``status_code``, ``json()``, ``text`` and ``content``.
+    """
+    _check_circuit(app, endpoint)
+    status_label = 'error'
+    start = time.perf_counter()
+    try:
+        response = await get_async_client().request(method, url, **kwargs)
+        status_label = str(response.status_code)
+        return response
+    finally:
+        duration = time.perf_counter() - start
+        circuit.record(status_label != 'error' and not status_label.startswith('5'), duration)
+        GRAPH_LATENCY.observe(duration, app=app, endpoint=endpoint)
+        GRAPH_RESPONSES.inc(app=app, endpoint=endpoint, status=status_label)
@@ -0,0 +1,196 @@
+"""
+Local stand-in for the Graph API endpoints the backend calls.
+
+Point the backend at it with ``GRAPH_API_BASE_URL=http://127.0.0.1:8900``::
+
+    python -m bbdBackend.graph_simulator --port 8900 --latency 0.2
+
+Endpoints:
+- ``POST /<version>/<phone_number_id>/messages``: accepts any send
+- ``GET /<version>/<media_id>``: media metadata pointing at the download URL
+- ``GET /media-download/<media_id>``: media bytes
+- ``POST /simulator/faults``: change the injected faults while it runs, e.g.
+  ``{"error_rate": 1.0}`` to fail every call or ``{"latency": 10}`` to stall
+- ``GET /simulator/stats``: calls answered so far, by endpoint and outcome
+
+Faults apply to every Graph API endpoint, after the configured latency:
+``--rate-limit-rate`` is the share of calls throttled with a 429 (Graph
+error 130429, ``Retry-After: --retry-after``) and ``--error-rate`` the share
+of the rest answered with ``--error-status``.
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SimulatorConfig:
+    FAULTS = ('latency', 'error_rate', 'error_status', 'rate_limit_rate', 'retry_after')
+
+    def __init__(self, latency=0.0, media_size=64 * 1024, error_rate=0.0, error_status=503,
+                 rate_limit_rate=0.0, retry_after=1.0):
+        self.latency = latency
+        self.media_size = media_size
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+
+
+class GraphSimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    _ids = itertools.count(1)
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def log_message(self, format, *args):
+        # Quiet by default; load tests generate thousands of requests
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _count(self, endpoint, outcome):
+        with self.server.stats_lock:
+            self.server.stats[f'{endpoint}:{outcome}'] += 1
+
+    def _inject_fault(self, endpoint):
+        """Apply the configured latency; send an error and return True for failed calls"""
+        time.sleep(self.config.latency)
+        if self.config.rate_limit_rate and random.random() < self.config.rate_limit_rate:
+            self._count(endpoint, 'rate_limited')
+            data = json.dumps({
+                'error': {'message': '(#130429) Rate limit hit', 'type': 'OAuthException', 'code': 130429},
+            }).encode()
+            self.send_response(429)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('Retry-After', str(self.config.retry_after))
+            self.end_headers()
+            self.wfile.write(data)
+            return True
+        if self.config.error_rate and random.random() < self.config.error_rate:
+            self._count(endpoint, 'error')
+            self._send_json(self.config.error_status, {
+                'error': {'message': 'Simulated failure', 'type': 'OAuthException', 'code': 2},
+            })
+            return True
+        self._count(endpoint, 'ok')
+        return False
+
+    def _send_stats(self):
+        with self.server.stats_lock:
+            stats = dict(sorted(self.server.stats.items()))
+        self._send_json(200, stats)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+
+        if self.path.rstrip('/') == '/simulator/faults':
+            for name in SimulatorConfig.FAULTS:
+                if name in body:
+                    setattr(self.config, name, type(getattr(self.config, name))(body[name]))
+            return self._send_json(200, {name: getattr(self.config, name) for name in SimulatorConfig.FAULTS})
+
+        if not self.path.rstrip('/').endswith('/messages'):
+            return self._send_json(404, {'error': {'message': 'Unknown path'}})
+        if self._inject_fault('messages'):
+            return
+        self._send_json(200, {
+            'messaging_product': 'whatsapp',
+            'contacts': [{'input': body.get('to'), 'wa_id': body.get('to')}],
+            'messages': [{'id': f'wamid.SIM{next(self._ids)}'}],
+        })
+
+    def do_GET(self):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if parts == ['simulator', 'stats']:
+            return self._send_stats()
+
+        if len(parts) == 2 and parts[0] == 'media-download':
+            if self._inject_fault('media_download'):
+                return
+            data = b'\0' * self.config.media_size
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        if len(parts) == 2:
+            if self._inject_fault('media_metadata'):
+                return
+            media_id = parts[1]
+            return self._send_json(200, {
+                'messaging_product': 'whatsapp',
+                'id': media_id,
+                'url': f'{self._base_url()}/media-download/{media_id}',
+                'mime_type': 'image/jpeg',
+                'file_size': self.config.media_size,
+            })
+
+        self._send_json(404, {'error': {'message': 'Unknown path'}})
+
+
+def _make_server(host, port, config):
+    server = ThreadingHTTPServer((host, port), GraphSimulatorHandler)
+    server.config = config
+    server.stats = collections.Counter()
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def start_simulator(host='127.0.0.1', port=0, **options):
+    """
+    Start the simulator in a background thread and return the server
+
+    ``server.base_url`` is the value to use for ``GRAPH_API_BASE_URL``;
+    call ``server.shutdown()`` when done.
+    """
+    server = _make_server(host, port, SimulatorConfig(**options))
+    server.daemon_threads = True
+    server.base_url = f'http://{host}:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--media-size', type=int, default=64 * 1024, help='bytes returned per media download')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of calls that fail (0-1)')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status of failed calls')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of calls throttled with a 429 (0-1)')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429s')
+    args = parser.parse_args()
+
+    server = _make_server(args.host, args.port, SimulatorConfig(
+        latency=args.latency, media_size=args.media_size, error_rate=args.error_rate, error_status=args.error_status,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+    ))
+    print(f'Graph API simulator listening on http://{args.host}:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
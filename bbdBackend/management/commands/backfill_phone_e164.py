@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from bbdBackend.phone import to_e164
+from bills.models import slip
+from whatsapp.models import WhatsAppConversation, WhatsAppMessage
+
+# model, source field, whether the source already includes the country code
+TARGETS = {
+    'slips': (slip, 'phone', False),
+    'messages': (WhatsAppMessage, 'from_number', True),
+    'conversations': (WhatsAppConversation, 'phone_number', True),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill phone_e164 on slips, WhatsApp messages and conversations saved before the column existed, "
+        "in bounded id-range batches. Rows written meanwhile get it on save, so it can run while serving."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help=f"any of {', '.join(TARGETS)} (default: all)")
+        parser.add_argument('--batch-size', type=int, default=2000, help='ids per batch')
+        parser.add_argument('--sleep', type=float, default=0, help='seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        unknown = set(options['tables']) - set(TARGETS)
+        if unknown:
+            raise CommandError(f"Unknown tables: {', '.join(sorted(unknown))}")
+
+        started = time.perf_counter()
+        for table in options['tables'] or TARGETS:
+            model, source, international = TARGETS[table]
+            updated = invalid = 0
+            max_id = model.objects.filter(phone_e164__isnull=True).aggregate(max_id=Max('id'))['max_id'] or 0
+
+            for low in range(0, max_id, options['batch_size']):
+                high = min(low + options['batch_size'], max_id)
+                rows = list(
+                    model.objects.filter(id__gt=low, id__lte=high, phone_e164__isnull=True).only('id', source)
+                )
+                for row in rows:
+                    row.phone_e164 = to_e164(getattr(row, source), international=international)
+                valid = [row for row in rows if row.phone_e164]
+                model.objects.bulk_update(valid, ['phone_e164'])
+                updated += len(valid)
+                invalid += len(rows) - len(valid)
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+
+            self.stdout.write(f"{table}: {updated} updated, {invalid} without a valid number")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled phone_e164 in {time.perf_counter() - started:.1f}s"))
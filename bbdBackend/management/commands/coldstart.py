@@ -0,0 +1,110 @@
+import hashlib
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.utils import OperationalError
+
+STATIC_FINGERPRINT_FILE = '.static-fingerprint'
+
+
+def pending_migrations():
+    """
+    Return migrations present on disk but not recorded as applied
+
+    Only file names are compared, so no migration module is imported; one
+    query reads the django_migrations table.
+    """
+    on_disk = set()
+    for app_config in apps.get_app_configs():
+        migrations_dir = os.path.join(app_config.path, 'migrations')
+        if not os.path.isdir(migrations_dir):
+            continue
+        for filename in os.listdir(migrations_dir):
+            name, ext = os.path.splitext(filename)
+            if ext == '.py' and name[:1].isdigit():
+                on_disk.add((app_config.label, name))
+
+    recorder = MigrationRecorder(connection)
+    if not recorder.has_table():
+        return on_disk
+    return on_disk - set(recorder.applied_migrations())
+
+
+def static_fingerprint():
+    """
+    Hash the paths and contents of every file collectstatic would copy
+    """
+    digest = hashlib.sha256()
+    entries = []
+    for finder in get_finders():
+        for path, storage in finder.list(['CVS', '.*', '*~']):
+            entries.append((path, storage.path(path)))
+    for path, full_path in sorted(entries):
+        digest.update(path.encode())
+        with open(full_path, 'rb') as fh:
+            digest.update(hashlib.sha256(fh.read()).digest())
+    return digest.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Prepare the app for serving in a single process: wait for the database, "
+        "then run migrate and collectstatic only if something changed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wait-timeout', type=float, default=60, help='seconds to wait for the database')
+        parser.add_argument('--skip-db', action='store_true', help='only check static files (used at image build)')
+        parser.add_argument('--force', action='store_true', help='always run migrate and collectstatic')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        if not options['skip_db']:
+            self._wait_for_database(options['wait_timeout'])
+            pending = pending_migrations()
+            if pending or options['force']:
+                self.stdout.write(f"Running migrations ({len(pending)} pending)...")
+                call_command('migrate', interactive=False, verbosity=options['verbosity'])
+            else:
+                self.stdout.write("Migrations up to date, skipping migrate")
+
+        self._collect_static(options['force'])
+        self.stdout.write(f"Ready to serve after {time.perf_counter() - started:.2f}s")
+
+    def _wait_for_database(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                connection.ensure_connection()
+                return
+            except OperationalError:
+                if time.monotonic() >= deadline:
+                    raise CommandError(f"Database not reachable after {timeout:.0f}s")
+                self.stdout.write("Database not ready, waiting...")
+                time.sleep(1)
+
+    def _collect_static(self, force):
+        stamp_path = os.path.join(settings.STATIC_ROOT, STATIC_FINGERPRINT_FILE)
+        fingerprint = static_fingerprint()
+        try:
+            with open(stamp_path) as fh:
+                unchanged = fh.read().strip() == fingerprint
+        except OSError:
+            unchanged = False
+
+        if unchanged and not force:
+            self.stdout.write("Static files unchanged, skipping collectstatic")
+            return
+
+        self.stdout.write("Collecting static files...")
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(stamp_path, 'w') as fh:
+            fh.write(fingerprint)
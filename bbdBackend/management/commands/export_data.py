@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from bbdBackend.exports import DATASETS, DEFAULT_CHUNK_SIZE, FORMATS, export_blocks
+
+
+class Command(BaseCommand):
+    help = "Stream messages, conversations or bills as CSV or NDJSON in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--from', dest='start', type=date.fromisoformat, help='first day (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', type=date.fromisoformat, help='last day (YYYY-MM-DD)')
+        parser.add_argument('--phone', help='only one customer')
+        parser.add_argument('--output', '-o', help='file to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        blocks = export_blocks(
+            options['dataset'], options['format'],
+            start=options['start'], end=options['end'], phone=options['phone'],
+            chunk_size=options['chunk_size'],
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as fh:
+                for block in blocks:
+                    fh.write(block)
+        else:
+            for block in blocks:
+                self.stdout.write(block.decode(), ending='')
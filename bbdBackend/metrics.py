@@ -0,0 +1,311 @@
+"""
+Lightweight Prometheus-style metrics built on the standard library.
+
+Every process keeps its samples in memory and periodically flushes them to
+``METRICS_DIR/metrics-<pid>.json``. The ``/metrics`` view merges all files in
+that directory, so the numbers cover every gunicorn worker. When
+``METRICS_DIR`` is empty only the serving process is reported.
+
+Gunicorn's ``child_exit`` hook deletes the file of a worker that exited
+(``remove_process_metrics``). Gauges are current values, so files of
+processes no longer running are left out of them even before that.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    """
+    Holds counters and histograms for the current process
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._last_flush = 0.0
+        atexit.register(self.flush)
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def inc(self, name, labels, amount):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, buckets, labels, value):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            sample = self._histograms.get(key)
+            if sample is None:
+                # One slot per bucket plus +Inf, then sum and count
+                sample = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+            sample[bisect_left(buckets, value)] += 1
+            sample[-2] += value
+            sample[-1] += 1
+
+    def set(self, name, labels, value):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._gauges[key] = value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(sample)] for (name, labels), sample in self._histograms.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self._gauges.items()],
+            }
+
+    def maybe_flush(self):
+        """Flush to disk at most once per ``METRICS_FLUSH_INTERVAL`` seconds"""
+        if time.monotonic() - self._last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            self.flush()
+
+    def flush(self):
+        metrics_dir = getattr(settings, 'METRICS_DIR', '')
+        self._last_flush = time.monotonic()
+        if not metrics_dir:
+            return
+        os.makedirs(metrics_dir, exist_ok=True)
+        path = os.path.join(metrics_dir, f'metrics-{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """
+        Merge the samples of every process into a single snapshot
+        """
+        metrics_dir = getattr(settings, 'METRICS_DIR', '')
+        if not metrics_dir:
+            snapshots = [(True, self.snapshot())]
+        else:
+            self.flush()
+            snapshots = []
+            for filename in os.listdir(metrics_dir):
+                pid = filename[len('metrics-'):-len('.json')]
+                if not (filename.startswith('metrics-') and filename.endswith('.json') and pid.isdigit()):
+                    continue
+                try:
+                    with open(os.path.join(metrics_dir, filename)) as fh:
+                        snapshots.append((_process_alive(int(pid)), json.load(fh)))
+                except (OSError, ValueError):
+                    continue
+
+        counters = {}
+        histograms = {}
+        gauges = {}
+        for alive, snap in snapshots:
+            for name, labels, value in snap['counters']:
+                key = (name, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, sample in snap['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                if key in histograms:
+                    histograms[key] = [a + b for a, b in zip(histograms[key], sample)]
+                else:
+                    histograms[key] = list(sample)
+            if not alive:
+                continue
+            for name, labels, value in snap.get('gauges', []):
+                key = (name, tuple(map(tuple, labels)))
+                metric = self._metrics.get(name)
+                if key not in gauges:
+                    gauges[key] = value
+                elif metric is not None and metric.merge == 'sum':
+                    gauges[key] += value
+                else:
+                    gauges[key] = max(gauges[key], value)
+        return counters, histograms, gauges
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        counters, histograms, gauges = self.collect()
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            if metric.kind in ('counter', 'gauge'):
+                samples = counters if metric.kind == 'counter' else gauges
+                for (name, labels), value in sorted(samples.items()):
+                    if name == metric.name:
+                        lines.append(f'{name}{_format_labels(labels)} {value}')
+            else:
+                for (name, labels), sample in sorted(histograms.items()):
+                    if name != metric.name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(metric.buckets) + ['+Inf'], sample[:-2]):
+                        cumulative += count
+                        le = labels + (('le', str(bound)),)
+                        lines.append(f'{name}_bucket{_format_labels(le)} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {sample[-2]}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {sample[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, owned by another user
+        return True
+    return True
+
+
+def remove_process_metrics(pid):
+    """
+    Delete the metrics file of a process that exited (gunicorn ``child_exit``)
+    """
+    metrics_dir = getattr(settings, 'METRICS_DIR', '')
+    if not metrics_dir:
+        return
+    try:
+        os.remove(os.path.join(metrics_dir, f'metrics-{pid}.json'))
+    except FileNotFoundError:
+        pass
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, registry, name, documentation):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        self.registry.inc(self.name, labels, amount)
+
+
+class Gauge:
+    """
+    ``merge`` combines the workers' values: 'max' (e.g. the worst circuit
+    state) or 'sum' (e.g. connections held by every worker's pool)
+    """
+    kind = 'gauge'
+
+    def __init__(self, registry, name, documentation, merge='max'):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.merge = merge
+        registry.register(self)
+
+    def set(self, value, **labels):
+        self.registry.set(self.name, labels, value)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        self.registry.observe(self.name, self.buckets, labels, value)
+
+
+registry = Registry()
+
+# HTTP
+REQUEST_LATENCY = Histogram(
+    registry, 'http_request_duration_seconds',
+    'Request latency by URL name, method and status',
+)
+REQUEST_DB_QUERIES = Histogram(
+    registry, 'http_request_db_queries',
+    'Database queries executed per request',
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    registry, 'http_request_db_duration_seconds',
+    'Time spent in database queries per request',
+)
+
+# Database connections (see bbdBackend/postgresql)
+DB_CONNECTION_WAIT = Histogram(
+    registry, 'db_connection_wait_seconds',
+    'Time to get a database connection (opened, or checked out of the pool) by alias and pool mode; '
+    'the _count is the number of checkouts',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    registry, 'db_pool_connections',
+    'Connections held by the pool by alias and state (open, idle, waiting clients), summed over workers',
+    merge='sum',
+)
+
+# Outbound Graph API calls
+GRAPH_LATENCY = Histogram(
+    registry, 'graph_api_request_duration_seconds',
+    'Graph API call latency by calling app and endpoint',
+)
+GRAPH_RESPONSES = Counter(
+    registry, 'graph_api_responses_total',
+    'Graph API responses by calling app, endpoint and status code',
+)
+GRAPH_CIRCUIT_STATE = Gauge(
+    registry, 'graph_api_circuit_state',
+    'Graph API circuit breaker state: 0 closed, 1 half-open, 2 open (worst across workers)',
+)
+GRAPH_CIRCUIT_TRANSITIONS = Counter(
+    registry, 'graph_api_circuit_transitions_total',
+    'Graph API circuit breaker state changes by new state',
+)
+OUTBOUND_QUEUE_WAIT = Histogram(
+    registry, 'whatsapp_outbound_queue_wait_seconds',
+    'Time outbound messages waited in the send scheduler by calling app',
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0),
+)
+OUTBOUND_RATE_LIMITED = Counter(
+    registry, 'whatsapp_outbound_rate_limited_total',
+    'Outbound messages retried after a Graph API rate limit, by app and error code',
+)
+
+# WhatsApp
+WEBHOOK_EVENTS = Counter(
+    registry, 'whatsapp_webhook_events_total',
+    'Webhook events processed by kind and type',
+)
+MEDIA_PROXY_REQUESTS = Counter(
+    registry, 'whatsapp_media_proxy_requests_total',
+    'Media proxy requests by cache result',
+)
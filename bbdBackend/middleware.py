@@ -0,0 +1,93 @@
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import REQUEST_DB_DURATION, REQUEST_DB_QUERIES, REQUEST_LATENCY, registry
+
+# The timer of the request being served. Connections are per thread and the
+# async views run their queries in sync_to_async threads, but those threads
+# run in a copy of the request's context, so they find the same timer.
+_request_timer = ContextVar('request_query_timer', default=None)
+
+
+class _QueryTimer:
+    """
+    Query count and total duration of one request
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def _time_query(execute, sql, params, many, context):
+    timer = _request_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.count += 1
+        timer.duration += time.perf_counter() - start
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver adding the execute wrapper to every new
+    connection, whichever thread opens it
+    """
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+class MetricsMiddleware:
+    """
+    Record latency and database usage per URL name
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = _QueryTimer()
+        token = _request_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timer.reset(token)
+        self._record(request, response, timer, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        timer = _QueryTimer()
+        token = _request_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_timer.reset(token)
+        self._record(request, response, timer, time.perf_counter() - start)
+        return response
+
+    def _record(self, request, response, timer, duration):
+        view = self._view_name(request)
+        REQUEST_LATENCY.observe(duration, view=view, method=request.method, status=response.status_code)
+        REQUEST_DB_QUERIES.observe(timer.count, view=view)
+        REQUEST_DB_DURATION.observe(timer.duration, view=view)
+        registry.maybe_flush()
+
+    @staticmethod
+    def _view_name(request):
+        # Unresolved paths share one label to keep cardinality bounded
+        match = getattr(request, 'resolver_match', None)
+        return match.view_name if match is not None else '<unresolved>'
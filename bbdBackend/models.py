@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import models
+
+
+class RequestProfile(models.Model):
+    """
+    A cProfile and SQL capture of one request, triggered by staff (see
+    bbdBackend/profiling.py)
+    """
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, blank=True, null=True, on_delete=models.SET_NULL)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_duration_ms = models.FloatField()
+    # [{"alias", "sql", "duration_ms", "many"}, ...] in execution order
+    queries = models.JSONField(default=list)
+    # pstats report sorted by cumulative time
+    stats = models.TextField()
+    # marshalled pstats data, downloadable as a .prof file for snakeviz etc.
+    profile_data = models.BinaryField()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
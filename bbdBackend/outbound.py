@@ -0,0 +1,305 @@
+"""
+Rate-aware scheduler for outbound WhatsApp messages.
+
+Every send goes through one dispatcher per process. Jobs wait in one queue
+per sending phone number, in priority order (bill notifications and contact
+forwards ahead of broadcast campaigns). The dispatcher hands the best job
+of any number with a token in its bucket (``WHATSAPP_SEND_RATE`` messages
+per second) to a pool of ``WHATSAPP_SEND_CONCURRENCY`` threads, so a
+throttled number never holds up another, and a job only takes its token
+when it is sent, so a bill notification overtakes broadcast messages that
+are waiting for one. A rate-limited response pauses that number's bucket
+and the job is queued again after ``Retry-After`` (or an exponential
+backoff), up to ``WHATSAPP_SEND_MAX_RETRIES`` times.
+
+While the Graph API circuit breaker is open the dispatcher holds the queue
+instead of failing the sends, and ``send_message`` returns at once by
+raising ``MessageQueued``: the message goes out once the circuit closes.
+
+The limits are per process, so with several gunicorn workers keep
+``WHATSAPP_SEND_RATE`` x workers under the number's Graph API throughput.
+The threads start on the first send, so gunicorn's preloading master
+doesn't start any.
+
+The queue lives in memory: messages still queued when the worker exits are
+never sent. Callers record them as 'queued' in the database (slip
+notifications, contact submissions, broadcast recipients left 'sending'),
+so they stay visible, and ``send_contact_digest --retry`` and
+``send_broadcasts`` resend the latter two.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+
+from .circuit import CLOSED
+from .graph import GraphUnavailable, circuit, graph_request
+from .metrics import OUTBOUND_QUEUE_WAIT, OUTBOUND_RATE_LIMITED
+
+# Priority lanes; lower is sent first
+TRANSACTIONAL = 0
+BULK = 1
+
+# Graph API throughput errors. 131056 is the per-recipient pair limit, so it
+# only delays that message instead of pausing the whole number.
+RATE_LIMIT_CODES = {4, 80007, 130429, 131056}
+PAIR_RATE_LIMIT = 131056
+MAX_BACKOFF = 60
+
+
+class MessageQueued(Exception):
+    """
+    The message wasn't sent in time (the Graph API is unavailable or the
+    queue is long) but stays queued; ``future`` resolves once it is sent
+    """
+
+    def __init__(self, future):
+        super().__init__('Message queued for sending')
+        self.future = future
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` sends per second with bursts of up to ``capacity``
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        # Pushed into the future while the bucket is paused
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return how many seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            self._tokens -= 1
+            return max(0.0, self._updated - now) + max(0.0, -self._tokens / self.rate)
+
+    def try_take(self):
+        """
+        Take a token and return 0 if one is available now, else return the
+        seconds until one is without taking it
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated:
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+            wait = max(0.0, self._updated - now) + max(0.0, (1 - self._tokens) / self.rate)
+            if wait > 0:
+                return wait
+            self._tokens -= 1
+            return 0.0
+
+    def pause(self, seconds):
+        """Hold all sends for ``seconds``, then restart from an empty bucket"""
+        with self._lock:
+            self._updated = max(self._updated, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0)
+
+
+def rate_limit_code(response):
+    """
+    Return the Graph API error code if the response is a throughput error,
+    else None
+    """
+    if response.status_code == 429:
+        return 429
+    if response.status_code < 400:
+        return None
+    try:
+        error = response.json().get('error') or {}
+        code = int(error.get('code'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return code if code in RATE_LIMIT_CODES else None
+
+
+def retry_delay(response, attempt):
+    """Seconds to wait before retry ``attempt`` (0-based)"""
+    try:
+        return min(float(response.headers['Retry-After']), MAX_BACKOFF)
+    except (KeyError, TypeError, ValueError):
+        return min(2 ** attempt, MAX_BACKOFF)
+
+
+class OutboundJob:
+    def __init__(self, request_args, app, priority):
+        self.request_args = request_args
+        self.app = app
+        self.priority = priority
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+        self.future = Future()
+
+
+class OutboundScheduler:
+    """
+    Priority queue of sends drained at each phone number's rate
+
+    ``submit`` returns a ``concurrent.futures.Future`` resolving to the
+    Graph API response.
+    """
+
+    def __init__(self, rate, concurrency, max_retries):
+        self.rate = rate
+        self.max_retries = max_retries
+        # phone_number_id -> heap of (priority, sequence, job)
+        self._pending = {}
+        self._pending_changed = threading.Condition()
+        self._sequence = itertools.count()
+        self._buckets = {}
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='outbound-send')
+        threading.Thread(target=self._dispatch, name='outbound-dispatch', daemon=True).start()
+
+    def submit(self, request_args, *, app, priority=TRANSACTIONAL):
+        """
+        Queue a message; ``request_args`` is the dict built by the
+        notification modules (url, json, headers, phone_number_id)
+        """
+        job = OutboundJob(request_args, app, priority)
+        self._enqueue(job)
+        return job.future
+
+    def pending(self):
+        """Number of jobs waiting to be dispatched"""
+        with self._pending_changed:
+            return sum(len(jobs) for jobs in self._pending.values())
+
+    def _enqueue(self, job):
+        with self._pending_changed:
+            # The sequence number keeps each lane first in, first out
+            jobs = self._pending.setdefault(job.request_args['phone_number_id'], [])
+            heapq.heappush(jobs, (job.priority, next(self._sequence), job))
+            self._pending_changed.notify()
+
+    def _bucket(self, phone_number_id):
+        bucket = self._buckets.get(phone_number_id)
+        if bucket is None:
+            bucket = self._buckets.setdefault(phone_number_id, TokenBucket(self.rate, self.rate))
+        return bucket
+
+    def _next_job(self):
+        """
+        Wait for the best job of any number whose bucket has a token, and
+        take it with the token
+        """
+        with self._pending_changed:
+            while True:
+                wait = None
+                for phone_number_id, jobs in sorted(self._pending.items(), key=lambda item: item[1][0][:2]):
+                    number_wait = self._bucket(phone_number_id).try_take()
+                    if not number_wait:
+                        _, _, job = heapq.heappop(jobs)
+                        if not jobs:
+                            del self._pending[phone_number_id]
+                        return job
+                    wait = number_wait if wait is None else min(wait, number_wait)
+                # Woken early by a new job, which may be for a ready number
+                self._pending_changed.wait(wait)
+
+    def _dispatch(self):
+        while True:
+            # Hold the queue while the circuit is open rather than failing every send
+            while (wait := circuit.retry_in()):
+                time.sleep(min(wait, 1.0))
+            self._slots.acquire()
+            job = self._next_job()
+            OUTBOUND_QUEUE_WAIT.observe(time.monotonic() - job.queued_at, app=job.app)
+            self._executor.submit(self._send, job)
+
+    def _send(self, job):
+        args = job.request_args
+        try:
+            response = graph_request(
+                'POST', args['url'], app=job.app, endpoint='messages', json=args['json'], headers=args['headers']
+            )
+        except GraphUnavailable as e:
+            # The circuit opened while this job was dispatched; it isn't a failed attempt
+            self._retry_later(job, e.retry_in or 1.0)
+            return
+        except Exception as e:
+            job.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        code = rate_limit_code(response)
+        if code is None or job.attempts >= self.max_retries:
+            job.future.set_result(response)
+            return
+
+        delay = retry_delay(response, job.attempts)
+        OUTBOUND_RATE_LIMITED.inc(app=job.app, code=code)
+        if code != PAIR_RATE_LIMIT:
+            self._bucket(args['phone_number_id']).pause(delay)
+        job.attempts += 1
+        self._retry_later(job, delay)
+
+    def _retry_later(self, job, delay):
+        timer = threading.Timer(delay, self._enqueue, [job])
+        timer.daemon = True
+        timer.start()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return this process's scheduler, starting it on first use"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = OutboundScheduler(
+                settings.WHATSAPP_SEND_RATE, settings.WHATSAPP_SEND_CONCURRENCY, settings.WHATSAPP_SEND_MAX_RETRIES
+            )
+        return _scheduler
+
+
+def send_message(request_args, *, app, priority=TRANSACTIONAL, timeout=None):
+    """
+    Queue a message and wait for its Graph API response
+
+    Raises ``MessageQueued`` straight away while the circuit isn't closed,
+    or after ``timeout`` seconds (default ``WHATSAPP_SEND_TIMEOUT``); the
+    message stays queued and is still sent.
+    """
+    future = get_scheduler().submit(request_args, app=app, priority=priority)
+    if circuit.state != CLOSED:
+        raise MessageQueued(future)
+    try:
+        return future.result(timeout=timeout or settings.WHATSAPP_SEND_TIMEOUT)
+    except TimeoutError:
+        if future.done():
+            raise
+        raise MessageQueued(future) from None
+
+
+async def asend_message(request_args, *, app, priority=TRANSACTIONAL, timeout=None):
+    """
+    Async version of ``send_message``; the event loop isn't blocked while waiting
+    """
+    future = get_scheduler().submit(request_args, app=app, priority=priority)
+    if circuit.state != CLOSED:
+        raise MessageQueued(future)
+    try:
+        return await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(future)), timeout or settings.WHATSAPP_SEND_TIMEOUT
+        )
+    except TimeoutError:
+        if future.done():
+            raise
+        raise MessageQueued(future) from None
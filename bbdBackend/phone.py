@@ -0,0 +1,76 @@
+"""
+Canonical phone numbers shared by the bills, Contact and whatsapp apps
+
+Slips store the 10-digit number typed at the counter, the contact form
+accepts the same, and WhatsApp sends ``wa_id``s like 919876543210. Each of
+those models also keeps ``phone_e164`` (+919876543210), written through
+``to_e164``, so one customer's rows match with an indexed equality lookup.
+Rows saved before the column existed are filled in by
+``manage.py backfill_phone_e164``.
+"""
+
+import re
+
+from django.conf import settings
+from django.db.models import Q
+
+# Length of a national number without trunk prefix (India)
+NATIONAL_LENGTH = 10
+
+
+def to_e164(number, international=False):
+    """
+    Return ``number`` as E.164 (``+<country code><number>``), or None if it
+    isn't a plausible phone number
+
+    National numbers (10 digits, optionally with a leading 0) get
+    ``PHONE_DEFAULT_COUNTRY_CODE``. A number starting with + or 00, or any
+    number when ``international`` is true (WhatsApp ids), already includes
+    its country code.
+    """
+    if number is None:
+        return None
+    text = str(number).strip()
+    digits = re.sub(r'\D', '', text)
+    if text.startswith('00'):
+        digits = digits[2:]
+        international = True
+    elif text.startswith('+'):
+        international = True
+
+    if not international:
+        if len(digits) == NATIONAL_LENGTH + 1 and digits.startswith('0'):
+            digits = digits[1:]
+        if len(digits) == NATIONAL_LENGTH:
+            digits = settings.PHONE_DEFAULT_COUNTRY_CODE + digits
+
+    if not 8 <= len(digits) <= 15 or digits.startswith('0'):
+        return None
+    return f'+{digits}'
+
+
+def whatsapp_id(e164):
+    """The Graph API's ``to`` format for an E.164 number (digits only)"""
+    return e164.lstrip('+')
+
+
+def phone_q(number, e164_field='phone_e164', raw_field=None):
+    """
+    Q matching rows of one customer given ``number`` in any format, or None
+    if it isn't a valid number
+
+    Rows not backfilled yet (``phone_e164`` still NULL) match on ``raw_field``
+    in the forms numbers are stored in: as given, as a WhatsApp id, and as a
+    national number.
+    """
+    e164 = to_e164(number)
+    if e164 is None:
+        return None
+    q = Q(**{e164_field: e164})
+    if raw_field:
+        raw_forms = {str(number).strip(), whatsapp_id(e164)}
+        country = f'+{settings.PHONE_DEFAULT_COUNTRY_CODE}'
+        if e164.startswith(country) and len(e164) == len(country) + NATIONAL_LENGTH:
+            raw_forms.add(e164[len(country):])
+        q |= Q(**{f'{e164_field}__isnull': True, f'{raw_field}__in': sorted(raw_forms)})
+    return q
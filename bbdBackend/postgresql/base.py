@@ -0,0 +1,32 @@
+"""
+PostgreSQL backend that records how long getting a connection takes
+
+Used as ``ENGINE`` for PostgreSQL URLs by ``bbdBackend.databases``. Django
+calls ``get_new_connection`` whenever a request needs a connection it
+doesn't hold: a fresh connect in the persistent and pgbouncer modes, a pool
+checkout in pool mode. Both are timed into ``db_connection_wait_seconds``,
+and in pool mode the pool's size is reported after each checkout.
+"""
+
+import time
+
+from django.conf import settings
+from django.db.backends.postgresql import base
+
+from bbdBackend.metrics import DB_CONNECTION_WAIT, DB_POOL_CONNECTIONS
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        start = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        DB_CONNECTION_WAIT.observe(time.perf_counter() - start, alias=self.alias, mode=settings.DB_POOL_MODE)
+
+        pool = self.pool
+        if pool is not None:
+            stats = pool.get_stats()
+            DB_POOL_CONNECTIONS.set(stats.get('pool_size', 0), alias=self.alias, state='open')
+            DB_POOL_CONNECTIONS.set(stats.get('pool_available', 0), alias=self.alias, state='idle')
+            DB_POOL_CONNECTIONS.set(stats.get('requests_waiting', 0), alias=self.alias, state='waiting')
+        return connection
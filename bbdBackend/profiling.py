@@ -0,0 +1,213 @@
+"""
+Per-request profiling for staff
+
+Add ``?_profile`` (or the header ``X-Profile: store``) to any request made
+as a staff user, or with ``PROFILING_TOKEN`` in ``X-Profile-Token``, and
+``ProfilingMiddleware`` runs it under cProfile while recording every SQL
+query with its duration:
+
+- ``store`` (default): the capture is saved as a ``RequestProfile``, viewed
+  in the admin (with the raw ``.prof`` for snakeviz); the response carries
+  ``X-Profile-Id``. Only the latest ``PROFILING_KEEP`` are kept.
+- ``download`` (``?_profile=download``): the response is replaced by a JSON
+  attachment with the request summary, the queries and the pstats report.
+
+Requests that don't ask for a profile pay a substring check on the query
+string and one header lookup; nothing is wrapped. One request per process
+is profiled at a time, others are served normally with ``X-Profile: busy``.
+Under the asgi profile the profiler sees the event loop thread, so work
+done in ``sync_to_async`` threads (and their queries) is not captured.
+"""
+
+import cProfile
+import hmac
+import io
+import marshal
+import pstats
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.utils import timezone
+
+from .models import RequestProfile
+
+TRIGGER_PARAM = '_profile'
+MODES = ('store', 'download')
+# Functions listed in the pstats report
+STATS_LINES = 60
+
+_lock = threading.Lock()
+
+
+def requested_mode(request):
+    """
+    'store' or 'download' if the request asks to be profiled, else None
+    """
+    value = request.META.get('HTTP_X_PROFILE')
+    if value is None:
+        if TRIGGER_PARAM not in request.META.get('QUERY_STRING', ''):
+            return None
+        value = request.GET.get(TRIGGER_PARAM)
+        if value is None:
+            return None
+    value = value.lower()
+    if value in MODES:
+        return value
+    return 'store' if value in ('', '1', 'true') else None
+
+
+def _allowed(request):
+    token = settings.PROFILING_TOKEN
+    if token and hmac.compare_digest(request.META.get('HTTP_X_PROFILE_TOKEN', ''), token):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_staff)
+
+
+class _QueryRecorder:
+    """
+    Database execute wrapper recording each query and its duration
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                'many': many,
+            })
+
+
+class Capture:
+    """
+    cProfile plus SQL recording around a block
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.recorder = _QueryRecorder()
+        self.duration = 0.0
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self.recorder))
+        self._start = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.duration = time.perf_counter() - self._start
+        self._stack.close()
+
+    @property
+    def queries(self):
+        return self.recorder.queries
+
+    def report(self):
+        output = io.StringIO()
+        pstats.Stats(self.profiler, stream=output).sort_stats('cumulative').print_stats(STATS_LINES)
+        return output.getvalue()
+
+    def profile_data(self):
+        # What cProfile.Profile.dump_stats writes, loadable with pstats.Stats(path)
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
+
+
+def _summary(request, response, capture):
+    match = getattr(request, 'resolver_match', None)
+    return {
+        'method': request.method,
+        'path': request.get_full_path()[:500],
+        'view_name': match.view_name if match is not None else '',
+        'status_code': response.status_code,
+        'duration_ms': round(capture.duration * 1000, 3),
+        'query_count': len(capture.queries),
+        'query_duration_ms': round(sum(query['duration_ms'] for query in capture.queries), 3),
+    }
+
+
+def _finish(request, response, capture, mode):
+    summary = _summary(request, response, capture)
+    if mode == 'download':
+        artifact = JsonResponse({**summary, 'queries': capture.queries, 'stats': capture.report()})
+        name = summary['view_name'].replace(':', '-') or 'request'
+        artifact['Content-Disposition'] = f'attachment; filename="profile-{name}-{timezone.now():%Y%m%d%H%M%S}.json"'
+        return artifact
+
+    user = getattr(request, 'user', None)
+    profile = RequestProfile.objects.create(
+        **summary,
+        user=user if user is not None and user.is_authenticated else None,
+        queries=capture.queries,
+        stats=capture.report(),
+        profile_data=capture.profile_data(),
+    )
+    stale = RequestProfile.objects.values_list('pk', flat=True)[settings.PROFILING_KEEP:]
+    RequestProfile.objects.filter(pk__in=list(stale)).delete()
+    response['X-Profile-Id'] = str(profile.pk)
+    return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests that staff ask for; see the module docstring
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = requested_mode(request)
+        if mode is None or not _allowed(request):
+            return self.get_response(request)
+        if not _lock.acquire(blocking=False):
+            return self._busy(self.get_response(request))
+        try:
+            with Capture() as capture:
+                response = self.get_response(request)
+        finally:
+            _lock.release()
+        return _finish(request, response, capture, mode)
+
+    async def __acall__(self, request):
+        mode = requested_mode(request)
+        if mode is None or not await sync_to_async(_allowed)(request):
+            return await self.get_response(request)
+        if not _lock.acquire(blocking=False):
+            return self._busy(await self.get_response(request))
+        try:
+            with Capture() as capture:
+                response = await self.get_response(request)
+        finally:
+            _lock.release()
+        return await sync_to_async(_finish)(request, response, capture, mode)
+
+    @staticmethod
+    def _busy(response):
+        response['X-Profile'] = 'busy'
+        return response
@@ -0,0 +1,154 @@
+"""
+Read-replica routing for list, search and analytics reads
+
+With ``REPLICA_DATABASE_URL`` set, views wrapped in ``reads_from_replica``
+(and admin changelists using ``ReplicaChangeListMixin``) read from the
+``replica`` alias; everything else, and every write, uses ``default``.
+Reads fall back to the primary when:
+
+- no replica is configured
+- the request has written, or isn't a GET/HEAD/OPTIONS (read-your-writes)
+- the client wrote within ``REPLICA_PIN_SECONDS`` (``ReplicaPinMiddleware``
+  sets a cookie covering replication lag)
+- a transaction is open on the primary
+"""
+
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+PIN_COOKIE = 'bbd_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _ReadState:
+    __slots__ = ('replica', 'pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.replica = False
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('replica_read_state', default=None)
+
+
+@contextmanager
+def replica_reads():
+    """
+    Let reads in this block go to the replica (unless pinned to the primary)
+    """
+    state = _state.get()
+    token = None
+    if state is None:
+        # Outside a request, e.g. a management command
+        state = _ReadState()
+        token = _state.set(state)
+    previous, state.replica = state.replica, True
+    try:
+        yield state
+    finally:
+        state.replica = previous
+        if token is not None:
+            _state.reset(token)
+
+
+def reads_from_replica(view):
+    """
+    Decorator for views (or view methods) that only read
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaChangeListMixin:
+    """
+    ModelAdmin mixin serving the changelist (list, search, filters) from the replica
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        with replica_reads():
+            response = super().changelist_view(request, extra_context)
+            # The result list is only queried when the template renders
+            if hasattr(response, 'render'):
+                response.render()
+        return response
+
+
+class ReplicaRouter:
+    """
+    Sends reads inside ``replica_reads`` to the replica and notes writes
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica or state.pinned or state.wrote:
+            return None
+        if REPLICA not in settings.DATABASES or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica is a copy of the primary
+        return True
+
+
+class ReplicaPinMiddleware:
+    """
+    Keep a client on the primary after it writes, for ``REPLICA_PIN_SECONDS``
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(state, response)
+
+    @staticmethod
+    def _start(request):
+        pinned = request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES
+        state = _ReadState(pinned=pinned)
+        return state, _state.set(state)
+
+    @staticmethod
+    def _finish(state, response):
+        if state.wrote and REPLICA in settings.DATABASES and settings.REPLICA_PIN_SECONDS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                secure=True, httponly=True, samesite='None',
+            )
+        return response
@@ -6,8 +6,10 @@ Generated by 'django-admin startproject' using Django 5.1.2.
 
 from pathlib import Path
 import os
+import tempfile
 import environ
-import dj_database_url
+
+from bbdBackend.databases import database_config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,11 +43,14 @@ INSTALLED_APPS = [
     "bills",
     "Contact",
     "whatsapp",  # WhatsApp webhook integration
+    "bbdBackend",  # Operations: metrics, boot and maintenance commands
     "rest_framework",
     "corsheaders",
 ]
 
 MIDDLEWARE = [
+    "bbdBackend.middleware.MetricsMiddleware",
+    "bbdBackend.replicas.ReplicaPinMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -54,6 +59,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # After authentication: only staff can trigger it
+    "bbdBackend.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "bbdBackend.urls"
@@ -76,13 +83,45 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "bbdBackend.wsgi.application"
 
+# How connections are held: persistent, pool (psycopg 3 pool) or pgbouncer;
+# see bbdBackend/databases.py
+DB_POOL_MODE = env("DB_POOL_MODE", default="persistent")
+DB_POOL_MIN_SIZE = env.int("DB_POOL_MIN_SIZE", default=2)
+DB_POOL_MAX_SIZE = env.int("DB_POOL_MAX_SIZE", default=4)
+# Seconds a request waits for a pooled connection before failing
+DB_POOL_TIMEOUT = env.float("DB_POOL_TIMEOUT", default=10.0)
+
 DATABASES = {
-    'default': dj_database_url.config(
-        default=env('DATABASE_URL'),
-        conn_max_age=600,
-        conn_health_checks=True,
+    'default': database_config(
+        env('DATABASE_URL'), DB_POOL_MODE,
+        pool_min_size=DB_POOL_MIN_SIZE, pool_max_size=DB_POOL_MAX_SIZE, pool_timeout=DB_POOL_TIMEOUT,
     )
 }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # In-memory SQLite test databases lock whole tables across threads; a file
+    # lets the concurrency tests write from several connections
+    DATABASES['default']['TEST'] = {'NAME': os.path.join(tempfile.gettempdir(), 'bbdbackend-test.sqlite3')}
+
+# Optional read replica for list, search and analytics reads; see
+# bbdBackend/replicas.py
+REPLICA_DATABASE_URL = env("REPLICA_DATABASE_URL", default="")
+if REPLICA_DATABASE_URL:
+    DATABASES['replica'] = database_config(
+        REPLICA_DATABASE_URL, DB_POOL_MODE,
+        pool_min_size=DB_POOL_MIN_SIZE, pool_max_size=DB_POOL_MAX_SIZE, pool_timeout=DB_POOL_TIMEOUT,
+    )
+    if DATABASES['replica']['ENGINE'] == 'django.db.backends.sqlite3':
+        # A second SQLite file, so tests can tell which database answered
+        DATABASES['replica']['TEST'] = {'NAME': os.path.join(tempfile.gettempdir(), 'bbdbackend-test-replica.sqlite3')}
+    else:
+        DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['bbdBackend.replicas.ReplicaRouter']
+# Seconds a client keeps reading from the primary after a write (replication lag)
+REPLICA_PIN_SECONDS = env.int("REPLICA_PIN_SECONDS", default=5)
+
+# Per-process memory by default; point CACHE_URL at a shared cache (e.g.
+# filecache:///tmp/bbd-cache or redis://...) so workers see each other's keys
+CACHES = {'default': env.cache_url_config(env('CACHE_URL', default='') or 'locmemcache://')}
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -108,7 +147,7 @@ USE_TZ = True
 
 # Static files
 STATIC_URL = "/static/"
-STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+STATIC_ROOT = env("STATIC_ROOT", default=os.path.join(BASE_DIR, "staticfiles"))
 
 # Media files (user uploaded content like WhatsApp images)
 MEDIA_URL = "/media/"
@@ -119,6 +158,87 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 CORS_ALLOWED_ORIGINS = env.list("CORS_ALLOWED_ORIGINS", default=[])
 
+# Outbound Graph API calls
+GRAPH_API_BASE_URL = env("GRAPH_API_BASE_URL", default="https://graph.facebook.com")
+GRAPH_API_TIMEOUT = env.float("GRAPH_API_TIMEOUT", default=10.0)
+# Connection pool size of the async client used by the ASGI views
+GRAPH_API_MAX_CONNECTIONS = env.int("GRAPH_API_MAX_CONNECTIONS", default=20)
+
+# Circuit breaker around Graph API calls (see bbdBackend/circuit.py): opens
+# when ERROR_RATE of at least MIN_CALLS calls in WINDOW seconds failed or took
+# longer than SLOW_CALL seconds, and fails fast for OPEN_SECONDS before probing
+GRAPH_CIRCUIT_ENABLE = env.bool("GRAPH_CIRCUIT_ENABLE", default=True)
+GRAPH_CIRCUIT_WINDOW = env.float("GRAPH_CIRCUIT_WINDOW", default=30.0)
+GRAPH_CIRCUIT_MIN_CALLS = env.int("GRAPH_CIRCUIT_MIN_CALLS", default=10)
+GRAPH_CIRCUIT_ERROR_RATE = env.float("GRAPH_CIRCUIT_ERROR_RATE", default=0.5)
+GRAPH_CIRCUIT_SLOW_CALL = env.float("GRAPH_CIRCUIT_SLOW_CALL", default=5.0)
+GRAPH_CIRCUIT_OPEN_SECONDS = env.float("GRAPH_CIRCUIT_OPEN_SECONDS", default=30.0)
+
+# Serve the async views (set automatically by bbdBackend.asgi)
+ASYNC_VIEWS = env.bool("ASYNC_VIEWS", default=False)
+
+# Metrics (served at /metrics)
+# METRICS_DIR is shared by all gunicorn workers; leave empty for single-process setups
+METRICS_DIR = env("METRICS_DIR", default="")
+METRICS_FLUSH_INTERVAL = env.float("METRICS_FLUSH_INTERVAL", default=5.0)
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# Per-request profiling (?_profile), see bbdBackend/profiling.py
+PROFILING_ENABLE = env.bool("PROFILING_ENABLE", default=True)
+# Lets non-staff clients (curl, load tests) profile with X-Profile-Token
+PROFILING_TOKEN = env("PROFILING_TOKEN", default="")
+# Stored profiles kept; older ones are deleted
+PROFILING_KEEP = env.int("PROFILING_KEEP", default=200)
+
+# Bearer token required by /api/export/<dataset>/ (staff only when empty)
+EXPORT_TOKEN = env("EXPORT_TOKEN", default="")
+
+# django-ratelimit; disabled for local load tests
+RATELIMIT_ENABLE = env.bool("RATELIMIT_ENABLE", default=True)
+
+# Slip numbers reserved per process at a time (see bills/slip_numbers.py)
+SLIP_NUMBER_BLOCK_SIZE = env.int("SLIP_NUMBER_BLOCK_SIZE", default=20)
+
+# Download incoming WhatsApp media in the background before the Graph API
+# URLs expire (see whatsapp/media_cache.py)
+WHATSAPP_MEDIA_PREFETCH = env.bool("WHATSAPP_MEDIA_PREFETCH", default=True)
+WHATSAPP_MEDIA_PREFETCH_WORKERS = env.int("WHATSAPP_MEDIA_PREFETCH_WORKERS", default=2)
+# How long a resolved media download URL is reused; Meta's expire after 5 minutes
+WHATSAPP_MEDIA_URL_TTL = env.int("WHATSAPP_MEDIA_URL_TTL", default=240)
+# Lock files that stop gunicorn workers on one machine fetching the same media twice
+WHATSAPP_MEDIA_LOCK_DIR = env("WHATSAPP_MEDIA_LOCK_DIR", default=os.path.join(tempfile.gettempdir(), 'bbd-media-locks'))
+
+# Outbound message scheduler (see bbdBackend/outbound.py). The rate is per
+# worker process and phone number: keep rate x workers under Meta's limit.
+WHATSAPP_SEND_RATE = env.float("WHATSAPP_SEND_RATE", default=20.0)
+WHATSAPP_SEND_CONCURRENCY = env.int("WHATSAPP_SEND_CONCURRENCY", default=4)
+WHATSAPP_SEND_MAX_RETRIES = env.int("WHATSAPP_SEND_MAX_RETRIES", default=5)
+# How long a bill or contact request waits for its message before answering;
+# it holds a sync worker meanwhile, so keep it short
+WHATSAPP_SEND_TIMEOUT = env.float("WHATSAPP_SEND_TIMEOUT", default=10.0)
+# Bearer token required by /api/whatsapp/broadcasts/ (staff only when empty)
+BROADCAST_TOKEN = env("BROADCAST_TOKEN", default="")
+
+# Country code given to 10-digit national numbers (see bbdBackend/phone.py)
+PHONE_DEFAULT_COUNTRY_CODE = env("PHONE_DEFAULT_COUNTRY_CODE", default="91")
+
+# Seconds a /api/customers/<phone>/ profile is cached (see bbdBackend/customers.py)
+CUSTOMER_CACHE_TTL = env.int("CUSTOMER_CACHE_TTL", default=300)
+
+# Contact form (see Contact/submissions.py): repeats of a submission within
+# the window are dropped, and a non-zero digest interval forwards pending
+# submissions as one WhatsApp message that many minutes after the oldest
+CONTACT_DUPLICATE_WINDOW = env.int("CONTACT_DUPLICATE_WINDOW", default=600)
+CONTACT_DIGEST_MINUTES = env.int("CONTACT_DIGEST_MINUTES", default=0)
+
+# Messages and statuses older than this are moved to WhatsAppArchiveChunk
+# by ``manage.py archive_whatsapp_history``
+WHATSAPP_ARCHIVE_AFTER_DAYS = env.int("WHATSAPP_ARCHIVE_AFTER_DAYS", default=180)
+
+# Statuses older than this are pruned to the terminal one per message by
+# ``manage.py prune_message_statuses``
+WHATSAPP_STATUS_RETENTION_DAYS = env.int("WHATSAPP_STATUS_RETENTION_DAYS", default=30)
+
 # Logging configuration
 LOGGING = {
     "version": 1,
@@ -0,0 +1,133 @@
+"""
+Request coalescing: concurrent calls for the same key share one execution.
+
+``SingleFlight`` covers threads (sync workers), ``AsyncSingleFlight`` covers
+coroutines on one event loop (ASGI workers), and ``file_lock`` /
+``afile_lock`` extend the exclusion across gunicorn worker processes on the
+same machine. Where ``fcntl`` is unavailable (Windows) the file locks are
+no-ops and only in-process coalescing applies.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    ``do(key, fn)`` runs ``fn`` once per key at a time; callers arriving
+    while it runs wait for and share its result (or exception)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Return (result, shared) where shared is True for waiting callers"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """
+    Async counterpart of ``SingleFlight``; calls are tracked per event loop
+    """
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, afn):
+        """Return (result, shared) where shared is True for waiting callers"""
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+        future = calls.get(key)
+        if future is not None:
+            # shield: a cancelled follower must not cancel the leader's fetch
+            return await asyncio.shield(future), True
+
+        future = calls[key] = loop.create_future()
+        try:
+            result = await afn()
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unshared failure isn't logged as unhandled
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del calls[key]
+
+
+def _lock_path(lock_dir, name):
+    os.makedirs(lock_dir, exist_ok=True)
+    return os.path.join(lock_dir, f'{name}.lock')
+
+
+@contextmanager
+def file_lock(lock_dir, name):
+    """Hold an exclusive lock on ``<lock_dir>/<name>.lock``, blocking until free"""
+    if fcntl is None:
+        yield
+        return
+    with open(_lock_path(lock_dir, name), 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+@asynccontextmanager
+async def afile_lock(lock_dir, name, poll_interval=0.05):
+    """``file_lock`` that waits by polling so the event loop isn't blocked"""
+    if fcntl is None:
+        yield
+        return
+    with open(_lock_path(lock_dir, name), 'a') as fh:
+        while True:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
@@ -0,0 +1,100 @@
+"""
+Additive upserts for incrementally maintained summary tables
+
+``upsert_increment`` writes many rows with one INSERT ... ON CONFLICT DO
+UPDATE that adds to the existing counters instead of overwriting them, so
+concurrent writers never lose increments. Works on PostgreSQL and SQLite.
+
+Rebuilds replace the rows of a range of days at a time: ``day_batches``
+splits the days into ranges and ``lock_for_rebuild`` holds off incremental
+writers while one range is deleted and recomputed in a short transaction.
+A writer that already added its rows has committed them, so they are
+recomputed; one that hasn't waits, and its rows are still invisible to the
+recompute. Each row is counted once and writers only wait for one range.
+"""
+
+from django.db import connection
+
+
+def upsert_increment(model, rows, unique_fields, add_fields=(), min_fields=(), max_fields=()):
+    """
+    Insert ``rows`` (dicts of field name -> value) into ``model``'s table
+
+    On conflict with ``unique_fields`` the ``add_fields`` are summed, and
+    ``min_fields`` / ``max_fields`` keep the smaller / larger value.
+    """
+    if not rows:
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    least, greatest = ('LEAST', 'GREATEST') if connection.vendor == 'postgresql' else ('MIN', 'MAX')
+
+    params = []
+    for row in rows:
+        params.extend(field.get_db_prep_save(row[field.name], connection) for field in fields)
+
+    def column(name):
+        return qn(model._meta.get_field(name).column)
+
+    updates = [f"{column(name)} = {table}.{column(name)} + EXCLUDED.{column(name)}" for name in add_fields]
+    updates += [f"{column(name)} = {least}({table}.{column(name)}, EXCLUDED.{column(name)})" for name in min_fields]
+    updates += [f"{column(name)} = {greatest}({table}.{column(name)}, EXCLUDED.{column(name)})" for name in max_fields]
+
+    row_placeholder = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    sql = (
+        f"INSERT INTO {table} ({', '.join(qn(field.column) for field in fields)}) "
+        f"VALUES {', '.join([row_placeholder] * len(rows))} "
+        f"ON CONFLICT ({', '.join(column(name) for name in unique_fields)}) "
+        f"DO UPDATE SET {', '.join(updates)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def lock_for_rebuild(*models):
+    """
+    Block incremental writes to ``models``' tables until the current
+    transaction ends (PostgreSQL; SQLite has a single writer already)
+    """
+    if connection.vendor != 'postgresql':
+        return
+    tables = ', '.join(connection.ops.quote_name(model._meta.db_table) for model in models)
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE")
+
+
+def day_batches(day_counts, batch_size):
+    """
+    Split ascending (day, row count) pairs into contiguous ranges of about
+    ``batch_size`` rows, never splitting a day
+
+    Returns (after, through) pairs for ``after < day <= through``; the first
+    range is open below and the last open above (None), so together they
+    cover every day, including ones with no rows yet.
+    """
+    ends = []
+    pending = 0
+    for day, count in day_counts:
+        pending += count
+        if pending >= batch_size:
+            ends.append(day)
+            pending = 0
+    if pending or not ends:
+        ends.append(None)
+    else:
+        ends[-1] = None
+    return list(zip([None] + ends[:-1], ends))
+
+
+def day_range_filter(field, after, through):
+    """
+    Filter kwargs selecting ``after < field <= through`` (None: unbounded)
+    """
+    bounds = {}
+    if after is not None:
+        bounds[f'{field}__gt'] = after
+    if through is not None:
+        bounds[f'{field}__lte'] = through
+    return bounds
@@ -21,8 +21,14 @@ from django.shortcuts import redirect
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .views import customer_view, export_view, metrics_view, ready_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
+    path('ready', ready_view, name='ready'),
+    path('api/export/<str:dataset>/', export_view, name='export'),
+    path('api/customers/<str:phone>/', customer_view, name='customer'),
     path('api/bills/', include('bills.urls')),
     path('api/contact/', include('Contact.urls')),
     path('api/whatsapp/', include('whatsapp.urls')),  # WhatsApp webhook endpoints
@@ -0,0 +1,92 @@
+from datetime import date
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .auth import bearer_token_matches, token_denial
+from .customers import customer_profile
+from .exports import DATASETS, FORMATS, aexport_blocks, export_blocks
+from .metrics import registry
+from .phone import to_e164
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint merging the metrics of every worker process
+
+    If ``METRICS_TOKEN`` is set the scraper must send it as a bearer token.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and not bearer_token_matches(request, token):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def export_view(request, dataset):
+    """
+    Stream a dataset as CSV or NDJSON in constant memory
+
+    Query params:
+    - format: csv (default) or ndjson
+    - from / to: Inclusive date range (YYYY-MM-DD)
+    - phone: Only one customer, in any format (9876543210, +919876543210)
+
+    The client must send ``EXPORT_TOKEN`` as a bearer token or be logged in
+    as staff; with no token configured only staff can export.
+    """
+    denied = token_denial(request, getattr(settings, 'EXPORT_TOKEN', ''))
+    if denied:
+        error = 'Unauthorized' if denied == 401 else 'Exports are disabled until EXPORT_TOKEN is set'
+        return JsonResponse({'error': error}, status=denied)
+    if dataset not in DATASETS:
+        return JsonResponse({'error': f"dataset must be one of {', '.join(DATASETS)}"}, status=404)
+
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': f"format must be one of {', '.join(FORMATS)}"}, status=400)
+    try:
+        start = date.fromisoformat(request.GET['from']) if 'from' in request.GET else None
+        end = date.fromisoformat(request.GET['to']) if 'to' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date'}, status=400)
+    phone = request.GET.get('phone')
+    if phone and to_e164(phone) is None:
+        return JsonResponse({'error': 'Invalid phone'}, status=400)
+
+    blocks = export_blocks(dataset, fmt, start=start, end=end, phone=phone)
+    if settings.ASYNC_VIEWS:
+        blocks = aexport_blocks(blocks)
+    response = StreamingHttpResponse(blocks, content_type=FORMATS[fmt])
+    filename = f"{dataset}-{timezone.localdate():%Y%m%d}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def customer_view(request, phone):
+    """
+    A customer's open slips, unread count and latest WhatsApp messages
+
+    Usage: /api/customers/<phone>/ with the phone in any format, e.g.
+    9876543210 or +919876543210. Cached per number (see customers.py).
+    """
+    phone_e164 = to_e164(phone)
+    if phone_e164 is None:
+        return JsonResponse({'error': 'Invalid phone'}, status=400)
+    return JsonResponse(customer_profile(phone_e164))
+
+
+def ready_view(request):
+    """
+    Readiness probe: answers without touching DRF, sessions or the database
+
+    ``?db=1`` additionally checks that a database connection can be opened.
+    """
+    if request.GET.get('db'):
+        try:
+            connection.ensure_connection()
+        except Exception:
+            return JsonResponse({'status': 'unavailable', 'database': False}, status=503)
+    return JsonResponse({'status': 'ready'})
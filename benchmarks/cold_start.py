@@ -0,0 +1,82 @@
+"""
+Measure time-to-first-response of a cold boot through entrypoint.sh.
+
+Compares the original boot sequence (FAST_BOOT=0: check loop, migrate,
+collectstatic as separate processes) with the fast boot path (FAST_BOOT=1:
+one ``manage.py coldstart``). The database is migrated once beforehand, as it
+is on a scale-to-zero machine waking up. Run from the repository root::
+
+    python benchmarks/cold_start.py --runs 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def first_response(url, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.02)
+    raise RuntimeError(f'{url} did not answer within {timeout}s')
+
+
+def boot_once(env, path):
+    port = free_port()
+    env = dict(env, PORT=str(port))
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        ['sh', 'entrypoint.sh', 'gunicorn', '--log-level', 'warning'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        first_response(f'http://127.0.0.1:{port}{path}')
+        return time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--path', default='/ready', help='first request to wait for')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            SECRET_KEY=os.environ.get('SECRET_KEY', 'bench-secret'),
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}",
+            STATIC_ROOT=os.path.join(tmp, 'static'),
+            DEBUG='False',
+        )
+        # Warm state: migrations applied and static files collected once
+        subprocess.run(['python', 'manage.py', 'coldstart'], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+
+        print(f"{'mode':<6} {'median (s)':>11} {'min (s)':>8} {'max (s)':>8}")
+        for mode, fast_boot in (('full', '0'), ('fast', '1')):
+            timings = [boot_once(dict(env, FAST_BOOT=fast_boot), args.path) for _ in range(args.runs)]
+            print(f'{mode:<6} {statistics.median(timings):>11.2f} {min(timings):>8.2f} {max(timings):>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Compare database connection modes under concurrent read traffic.
+
+Runs gunicorn once per DB_POOL_MODE (and server profile) against
+PostgreSQL, reads the slip list and a customer profile concurrently, then
+reports throughput and how long requests waited for a connection, from
+/metrics. Run from the repository root::
+
+    python benchmarks/db_pool_modes.py --database-url postgres://bbd@localhost/bbd \\
+        --pgbouncer-url postgres://bbd@localhost:6432/bbd --concurrency 64 --requests 2000
+
+The pgbouncer mode is skipped without ``--pgbouncer-url``.
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from media_proxy_concurrency import free_port, wait_until_ready  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHONE = '9876543210'
+PATHS = [f'/api/bills/slips/?phone={PHONE}', f'/api/customers/{PHONE}/']
+
+
+async def run_load(base_url, total, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(base_url + PATHS[i % len(PATHS)])
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'errors': errors,
+    }
+
+
+def connection_waits(base_url, token):
+    """Checkouts and their mean duration in ms, summed over every label"""
+    text = httpx.get(f'{base_url}/metrics', headers={'Authorization': f'Bearer {token}'}).text
+    total = sum(float(v) for v in re.findall(r'^db_connection_wait_seconds_sum\S* (\S+)$', text, re.M))
+    count = sum(float(v) for v in re.findall(r'^db_connection_wait_seconds_count\S* (\S+)$', text, re.M))
+    return int(count), (total / count * 1000 if count else 0.0)
+
+
+def bench_mode(mode, profile, args, database_url):
+    env = dict(
+        os.environ,
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'bench-secret'),
+        DATABASE_URL=database_url,
+        DB_POOL_MODE=mode,
+        DB_POOL_MAX_SIZE=str(args.pool_size),
+        SERVER_PROFILE=profile,
+        GUNICORN_THREADS=str(args.threads),
+        WEB_CONCURRENCY=str(args.workers),
+        METRICS_TOKEN='bench-metrics',
+        DEBUG='False',
+        RATELIMIT_ENABLE='False',
+        PORT=str(free_port()),
+    )
+    server = subprocess.Popen(['gunicorn', '--log-level', 'warning'], env=env, cwd=ROOT)
+    base_url = f"http://127.0.0.1:{env['PORT']}"
+    try:
+        wait_until_ready(base_url)
+        result = asyncio.run(run_load(base_url, args.requests, args.concurrency))
+        result['checkouts'], result['wait_ms'] = connection_waits(base_url, env['METRICS_TOKEN'])
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker in the gthread profile')
+    parser.add_argument('--pool-size', type=int, default=4, help='DB_POOL_MAX_SIZE')
+    parser.add_argument('--modes', default='persistent,pool,pgbouncer')
+    parser.add_argument('--profiles', default='sync,gthread')
+    parser.add_argument('--database-url', required=True, help='PostgreSQL URL')
+    parser.add_argument('--pgbouncer-url', default='', help='the same database through PgBouncer')
+    args = parser.parse_args()
+
+    env = dict(os.environ, SECRET_KEY='bench-secret', DATABASE_URL=args.database_url)
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v0'], env=env, cwd=ROOT, check=True)
+
+    print(f'{args.requests} requests, concurrency {args.concurrency}, {args.workers} workers')
+    print(f"{'mode':<11} {'profile':<8} {'req/s':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'errors':>7} "
+          f"{'checkouts':>10} {'wait (ms)':>10}")
+    for mode in args.modes.split(','):
+        database_url = args.pgbouncer_url if mode == 'pgbouncer' else args.database_url
+        if not database_url:
+            continue
+        for profile in args.profiles.split(','):
+            result = bench_mode(mode, profile, args, database_url)
+            print(f"{mode:<11} {profile:<8} {result['rps']:>8.1f} {result['p50']:>8.3f} {result['p95']:>8.3f} "
+                  f"{result['errors']:>7} {result['checkouts']:>10} {result['wait_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
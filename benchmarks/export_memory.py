@@ -0,0 +1,81 @@
+"""
+Check that exports run in constant memory.
+
+Seeds a temporary SQLite database with WhatsApp messages, then runs
+``manage.py export_data`` at growing row counts and reports each run's peak
+RSS. The peak should stay flat as the row count grows. Run from the
+repository root::
+
+    python benchmarks/export_memory.py --rows 100000,1000000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED = """
+from datetime import timedelta
+from django.utils import timezone
+from whatsapp.models import WhatsAppMessage
+
+start = WhatsAppMessage.objects.count()
+base = timezone.now() - timedelta(days=365)
+for low in range(start, {rows}, 10000):
+    WhatsAppMessage.objects.bulk_create([
+        WhatsAppMessage(
+            message_id=f'wamid.BENCH{{i}}', from_number=f'9198765{{i % 1000:05d}}', message_type='text',
+            text_body=f'Message body number {{i}} with a little padding text', timestamp=base + timedelta(seconds=i),
+        )
+        for i in range(low, min(low + 10000, {rows}))
+    ])
+"""
+
+
+def run_export(env, fmt, output):
+    """Return (seconds, peak RSS in MiB) of one export process"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, 'manage.py', 'export_data', 'messages', '--format', fmt, '-o', output],
+        env=env, cwd=ROOT,
+    )
+    # wait4 reports the rusage of this child only (ru_maxrss is in KiB on Linux)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+    return time.perf_counter() - started, usage.ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='100000,1000000', help='comma-separated row counts, ascending')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='ndjson')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            SECRET_KEY=os.environ.get('SECRET_KEY', 'bench-secret'),
+            DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}",
+        )
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v0'], env=env, cwd=ROOT, check=True)
+
+        print(f"{'rows':>9} {'seconds':>8} {'rows/s':>9} {'MiB out':>8} {'peak RSS MiB':>13}")
+        for rows in map(int, args.rows.split(',')):
+            subprocess.run(
+                [sys.executable, 'manage.py', 'shell', '-v0', '-c', SEED.format(rows=rows)],
+                env=env, cwd=ROOT, check=True,
+            )
+            output = os.path.join(tmp, f'export.{args.format}')
+            elapsed, peak = run_export(env, args.format, output)
+            size = os.path.getsize(output) / 1024 / 1024
+            print(f'{rows:>9} {elapsed:>8.1f} {rows / elapsed:>9.0f} {size:>8.1f} {peak:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
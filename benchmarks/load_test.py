@@ -0,0 +1,220 @@
+"""
+End-to-end load test against the local Graph API simulator.
+
+Starts the simulator (so no real WhatsApp message is sent) and gunicorn
+pointed at it, then drives a weighted mix of:
+
+- bills: POST /api/bills/create/ (sends the bill notification)
+- contact: POST /api/contact/submit/ (forwards to WhatsApp)
+- webhook: signed POST /api/whatsapp/webhook/ bursts of ``--burst`` messages
+- inbox: GET the conversations list and one customer's messages
+
+and reports throughput and latency percentiles per endpoint, plus the Graph
+API calls the simulator answered. Run from the repository root::
+
+    python benchmarks/load_test.py --requests 2000 --concurrency 32 --mix bills=2,contact=1,webhook=3,inbox=4 \\
+        --latency 0.1 --error-rate 0.02 --rate-limit-rate 0.05
+
+Uses a temporary SQLite file unless ``--database-url`` is given; SQLite
+serializes writes, so webhook bursts start failing with "database is
+locked" under load. Use PostgreSQL for meaningful numbers.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from media_proxy_concurrency import free_port, wait_until_ready  # noqa: E402
+from slip_allocation import bill_payload  # noqa: E402
+
+from bbdBackend.graph_simulator import start_simulator  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_SECRET = 'load-test-secret'
+CUSTOMERS = [f'98765{i:05d}' for i in range(200)]
+
+
+class Driver:
+    """Builds one request per scenario; ``endpoint`` is the label it is reported under"""
+
+    def __init__(self, rng, burst):
+        self.rng = rng
+        self.burst = burst
+        self.sequence = 0
+
+    def next_id(self):
+        self.sequence += 1
+        return self.sequence
+
+    def bills(self):
+        payload = dict(bill_payload(self.next_id()), phone=self.rng.choice(CUSTOMERS))
+        return 'bills', 'POST', '/api/bills/create/', {'json': payload}
+
+    def contact(self):
+        i = self.next_id()
+        payload = {
+            'name': f'Customer {i}', 'phone': self.rng.choice(CUSTOMERS),
+            'subject': 'Pickup', 'message': f'Please pick up order {i}',
+        }
+        return 'contact', 'POST', '/api/contact/submit/', {'json': payload}
+
+    def webhook(self):
+        messages, contacts = [], []
+        for _ in range(self.burst):
+            wa_id = '91' + self.rng.choice(CUSTOMERS)
+            messages.append({
+                'id': f'wamid.LOAD{self.next_id()}', 'from': wa_id, 'timestamp': str(int(time.time())),
+                'type': 'text', 'text': {'body': 'Is my order ready?'},
+            })
+            contacts.append({'wa_id': wa_id, 'profile': {'name': 'Load Test'}})
+        body = json.dumps({
+            'object': 'whatsapp_business_account',
+            'entry': [{'id': 'WABA', 'changes': [{'field': 'messages', 'value': {
+                'messaging_product': 'whatsapp', 'metadata': {'phone_number_id': 'LOADTEST'},
+                'messages': messages, 'contacts': contacts,
+            }}]}],
+        }).encode()
+        signature = 'sha256=' + hmac.new(APP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        headers = {'Content-Type': 'application/json', 'X-Hub-Signature-256': signature}
+        return 'webhook', 'POST', '/api/whatsapp/webhook/', {'content': body, 'headers': headers}
+
+    def inbox(self):
+        if self.rng.random() < 0.5:
+            return 'inbox:conversations', 'GET', '/api/whatsapp/conversations/', {}
+        return 'inbox:messages', 'GET', f'/api/whatsapp/messages/?phone={self.rng.choice(CUSTOMERS)}&limit=50', {}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('bills', 'contact', 'webhook', 'inbox'):
+            raise SystemExit(f'unknown scenario {name!r} in --mix')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def run_load(base_url, args):
+    rng = random.Random(args.seed)
+    driver = Driver(rng, args.burst)
+    mix = parse_mix(args.mix)
+    scenarios = rng.choices(list(mix), weights=list(mix.values()), k=args.requests)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def one(scenario):
+            endpoint, method, path, kwargs = getattr(driver, scenario)()
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, **kwargs)
+                    # The webhook answers 200 even when it fails, so Meta doesn't retry
+                    if response.status_code >= 400 or (
+                        endpoint == 'webhook' and response.json().get('status') != 'success'
+                    ):
+                        errors[endpoint] += 1
+                except httpx.HTTPError:
+                    errors[endpoint] += 1
+                latencies[endpoint].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(scenario) for scenario in scenarios))
+        elapsed = time.perf_counter() - start
+
+    return elapsed, latencies, errors
+
+
+def percentile(ordered, share):
+    return ordered[max(int(len(ordered) * share) - 1, 0)]
+
+
+def report(elapsed, latencies, errors):
+    total = sum(len(values) for values in latencies.values())
+    print(f'{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)')
+    print(f"{'endpoint':<22} {'count':>6} {'req/s':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'errors':>7}")
+    for endpoint in sorted(latencies):
+        ordered = sorted(latencies[endpoint])
+        print(f"{endpoint:<22} {len(ordered):>6} {len(ordered) / elapsed:>8.1f} {statistics.median(ordered):>8.3f} "
+              f"{percentile(ordered, 0.95):>8.3f} {percentile(ordered, 0.99):>8.3f} {errors[endpoint]:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--mix', default='bills=2,contact=1,webhook=3,inbox=4', help='scenario=weight,...')
+    parser.add_argument('--burst', type=int, default=10, help='messages per webhook call')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--profile', default='sync', help='SERVER_PROFILE')
+    parser.add_argument('--latency', type=float, default=0.1, help='simulated Graph API latency per call (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of Graph API calls that fail')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of Graph API calls throttled (429)')
+    parser.add_argument('--database-url', default='')
+    args = parser.parse_args()
+
+    simulator = start_simulator(latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate)
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'load.sqlite3')}"
+        env = dict(
+            os.environ,
+            SECRET_KEY=os.environ.get('SECRET_KEY', 'load-test-secret-key'),
+            DATABASE_URL=database_url,
+            DEBUG='False',
+            RATELIMIT_ENABLE='False',
+            SERVER_PROFILE=args.profile,
+            WEB_CONCURRENCY=str(args.workers),
+            PORT=str(free_port()),
+            # Every outbound call goes to the simulator
+            GRAPH_API_BASE_URL=simulator.base_url,
+            WHATSAPP_ACCESS_TOKEN='load-test-token',
+            WHATSAPP_PHONE_NUMBER_ID='LOADTEST',
+            WHATSAPP_RECIPIENT_NUMBER='919876543210',
+            WHATSAPP_APP_SECRET=APP_SECRET,
+            # Contact submissions are unique; don't let the digest hold them back
+            CONTACT_DIGEST_MINUTES='0',
+            METRICS_DIR=os.path.join(tmp, 'metrics'),
+        )
+        env.pop('ASYNC_VIEWS', None)
+        env.pop('REPLICA_DATABASE_URL', None)
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v0'], env=env, cwd=ROOT, check=True)
+
+        server = subprocess.Popen(['gunicorn', '--log-level', 'warning'], env=env, cwd=ROOT)
+        base_url = f"http://127.0.0.1:{env['PORT']}"
+        try:
+            wait_until_ready(base_url)
+            print(f'mix {args.mix}, concurrency {args.concurrency}, {args.workers} {args.profile} workers, '
+                  f'Graph API latency {args.latency}s, errors {args.error_rate:.0%}, 429s {args.rate_limit_rate:.0%}')
+            report(*asyncio.run(run_load(base_url, args)))
+            # Queued and retried sends are still draining; give them a moment
+            time.sleep(args.latency * 2 + 1)
+        finally:
+            server.terminate()
+            server.wait()
+
+    stats = httpx.get(f'{simulator.base_url}/simulator/stats').json()
+    print('Graph API calls: ' + ', '.join(f'{name} {count}' for name, count in stats.items()))
+    simulator.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Compare concurrent media-proxy throughput: sync gunicorn vs the ASGI stack.
+
+Starts the local Graph API simulator with a fixed upstream latency, then runs
+gunicorn once per SERVER_PROFILE and fires concurrent requests at
+/api/whatsapp/media/<id>/. Run from the repository root::
+
+    python benchmarks/media_proxy_concurrency.py --concurrency 50 --requests 500 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bbdBackend.graph_simulator import start_simulator  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f'{base_url}/api/bills/', timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f'server at {base_url} did not become ready')
+
+
+async def run_load(base_url, total, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(f'{base_url}/api/whatsapp/media/BENCH{i}/')
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'errors': errors,
+    }
+
+
+def bench_profile(profile, args, graph_base_url, db_path):
+    port = free_port()
+    env = dict(
+        os.environ,
+        SERVER_PROFILE=profile,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(args.workers),
+        GRAPH_API_BASE_URL=graph_base_url,
+        WHATSAPP_ACCESS_TOKEN='bench-token',
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'bench-secret'),
+        DATABASE_URL=f'sqlite:///{db_path}',
+        DEBUG='False',
+    )
+    # ASYNC_VIEWS is derived from the profile by bbdBackend.asgi
+    env.pop('ASYNC_VIEWS', None)
+    server = subprocess.Popen(
+        ['gunicorn', '--log-level', 'warning'], env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_until_ready(base_url)
+        return asyncio.run(run_load(base_url, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.2, help='simulated Graph API latency per call (s)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (production uses 2)')
+    parser.add_argument('--profiles', default='sync,asgi')
+    args = parser.parse_args()
+
+    simulator = start_simulator(latency=args.latency)
+    print(f'{args.requests} requests, concurrency {args.concurrency}, '
+          f'{args.workers} workers, upstream latency {args.latency}s x 2 calls')
+    print(f"{'profile':<8} {'req/s':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in args.profiles.split(','):
+            result = bench_profile(profile, args, simulator.base_url, os.path.join(tmp, 'bench.sqlite3'))
+            print(f"{profile:<8} {result['rps']:>8.1f} {result['p50']:>8.3f} {result['p95']:>8.3f} {result['errors']:>7}")
+    simulator.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Stress the slip number allocator with concurrent bill creations.
+
+Runs gunicorn with several workers against a fresh database, posts bills
+concurrently and checks that every slip number is unique. Compares a block
+size of 1 (one counter UPDATE per bill, the locking-read baseline) with the
+default block. Run from the repository root::
+
+    python benchmarks/slip_allocation.py --concurrency 32 --requests 1000
+
+Uses a temporary SQLite file unless ``--database-url`` points at PostgreSQL.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from media_proxy_concurrency import free_port, wait_until_ready  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def bill_payload(i):
+    return {
+        'date': '2025-10-01',
+        'due_date': '2025-10-05',
+        'address': f'{i} Main Road',
+        'phone': '9876543210',
+        'amount': 300,
+        'items': [
+            {'item_name': 'Shirt', 'service': 'Dry Clean', 'quantity': 2, 'price_per_unit': '150.00'},
+        ],
+    }
+
+
+async def run_load(base_url, total, concurrency):
+    latencies = []
+    numbers = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=60) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(f'{base_url}/api/bills/create/', json=bill_payload(i))
+                latencies.append(time.perf_counter() - start)
+                if response.status_code == 201:
+                    numbers.append(response.json()['slip_no'])
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'errors': errors,
+        'duplicates': len(numbers) - len(set(numbers)),
+    }
+
+
+def bench_block_size(block_size, args, database_url):
+    env = dict(
+        os.environ,
+        SECRET_KEY=os.environ.get('SECRET_KEY', 'bench-secret'),
+        DATABASE_URL=database_url,
+        DEBUG='False',
+        RATELIMIT_ENABLE='False',
+        SLIP_NUMBER_BLOCK_SIZE=str(block_size),
+        WEB_CONCURRENCY=str(args.workers),
+        PORT=str(free_port()),
+    )
+    # No credentials: bills are created without calling the Graph API
+    env.pop('WHATSAPP_ACCESS_TOKEN', None)
+    subprocess.run([sys.executable, 'manage.py', 'flush', '--noinput'], env=env, cwd=ROOT, check=True)
+
+    server = subprocess.Popen(['gunicorn', '--log-level', 'warning'], env=env, cwd=ROOT)
+    base_url = f"http://127.0.0.1:{env['PORT']}"
+    try:
+        wait_until_ready(base_url)
+        return asyncio.run(run_load(base_url, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--block-sizes', default='1,20')
+    parser.add_argument('--database-url', default='')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}"
+        env = dict(os.environ, SECRET_KEY='bench-secret', DATABASE_URL=database_url)
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v0'], env=env, cwd=ROOT, check=True)
+
+        print(f'{args.requests} bills, concurrency {args.concurrency}, {args.workers} workers')
+        print(f"{'block':>6} {'req/s':>8} {'p50 (s)':>8} {'p95 (s)':>8} {'errors':>7} {'dupes':>6}")
+        for block_size in map(int, args.block_sizes.split(',')):
+            result = bench_block_size(block_size, args, database_url)
+            print(f"{block_size:>6} {result['rps']:>8.1f} {result['p50']:>8.3f} {result['p95']:>8.3f} "
+                  f"{result['errors']:>7} {result['duplicates']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Parse cost per message and memory per batch of webhook parsing.
+
+Compares the previous inline extraction in ``_handle_messages`` (an if/elif
+chain building ``WhatsAppMessage`` instances directly) with
+``whatsapp.parsers``: ``__slots__`` records alone, and records converted to
+model instances for the bulk INSERT. No database is needed. Run from the
+repository root::
+
+    python benchmarks/webhook_parsing.py --batch 500 --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bbdBackend.settings')
+os.environ.setdefault('SECRET_KEY', 'bench-secret')
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+
+import django  # noqa: E402
+
+django.setup()
+
+from bbdBackend.phone import to_e164  # noqa: E402
+from whatsapp.models import WhatsAppMessage  # noqa: E402
+from whatsapp.parsers import parse_change  # noqa: E402
+
+BASE_TIMESTAMP = 1760000000
+CONTENT = [
+    ('text', {'body': 'Is my saree ready for pickup?'}),
+    ('image', {'id': 'MEDIA', 'mime_type': 'image/jpeg', 'caption': 'Stain on the collar'}),
+    ('location', {'latitude': 12.97, 'longitude': 77.59, 'name': 'Home', 'address': '1 Main Road'}),
+    ('interactive', {'type': 'button_reply', 'button_reply': {'id': 'yes', 'title': 'Yes'}}),
+    ('reaction', {'message_id': 'wamid.PREV', 'emoji': '👍'}),
+]
+
+
+def webhook_value(batch):
+    messages = []
+    for i in range(batch):
+        message_type, content = CONTENT[i % len(CONTENT)]
+        messages.append({
+            'id': f'wamid.BENCH{i}', 'from': f'9198765{i % 100:05d}', 'timestamp': str(BASE_TIMESTAMP + i),
+            'type': message_type, message_type: content,
+        })
+    contacts = [{'wa_id': f'9198765{i:05d}', 'profile': {'name': f'Customer {i}'}} for i in range(100)]
+    return {'messaging_product': 'whatsapp', 'metadata': {'phone_number_id': 'BENCH'},
+            'messages': messages, 'contacts': contacts}
+
+
+def legacy_models(value):
+    """The extraction ``_handle_messages`` did inline before whatsapp.parsers"""
+    contact_names = {contact.get('wa_id'): contact.get('profile', {}).get('name') for contact in value.get('contacts', [])}
+    new_messages = []
+    for message in value.get('messages', []):
+        message_id = message.get('id')
+        from_number = message.get('from')
+        timestamp = datetime.fromtimestamp(int(message.get('timestamp')), tz=dt_timezone.utc)
+        message_type = message.get('type')
+        text_body = media_id = media_mime_type = media_caption = None
+        latitude = longitude = location_name = location_address = context_message_id = None
+        if message_type == 'text':
+            text_body = message.get('text', {}).get('body')
+        elif message_type in ['image', 'video', 'audio', 'document']:
+            media_data = message.get(message_type, {})
+            media_id = media_data.get('id')
+            media_mime_type = media_data.get('mime_type')
+            media_caption = media_data.get('caption', '')
+        elif message_type == 'location':
+            location = message.get('location', {})
+            latitude = location.get('latitude')
+            longitude = location.get('longitude')
+            location_name = location.get('name')
+            location_address = location.get('address')
+        elif message_type == 'interactive':
+            interactive = message.get('interactive', {})
+            if interactive.get('type') == 'button_reply':
+                text_body = interactive.get('button_reply', {}).get('title')
+            elif interactive.get('type') == 'list_reply':
+                text_body = interactive.get('list_reply', {}).get('title')
+        if 'context' in message:
+            context_message_id = message.get('context', {}).get('id')
+        new_messages.append(WhatsAppMessage(
+            message_id=message_id, wamid=f'wamid.{message_id}', from_number=from_number,
+            phone_e164=to_e164(from_number, international=True), from_name=contact_names.get(from_number),
+            message_type=message_type, text_body=text_body, media_id=media_id, media_mime_type=media_mime_type,
+            media_url=f'/api/whatsapp/media/{media_id}/' if media_id else None, media_caption=media_caption,
+            latitude=latitude, longitude=longitude, location_name=location_name, location_address=location_address,
+            timestamp=timestamp, context_message_id=context_message_id, raw_payload=message,
+        ))
+    return new_messages
+
+
+def parsed_records(value):
+    return parse_change(value).messages
+
+
+def parsed_models(value):
+    return [record.to_model() for record in parse_change(value).messages]
+
+
+def measure(function, value, repeat):
+    best = min(_timed(function, value) for _ in range(repeat))
+    tracemalloc.start()
+    # The payload is already in memory; only count what parsing allocates
+    result = function(value)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, current
+
+
+def _timed(function, value):
+    start = time.perf_counter()
+    function(value)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch', type=int, default=500, help='messages per webhook change')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    value = webhook_value(args.batch)
+    print(f'{args.batch} messages per batch, best of {args.repeat}')
+    print(f"{'path':<24} {'us/message':>11} {'KiB/batch':>10} {'B/message':>10}")
+    for name, function in (
+        ('inline (previous)', legacy_models),
+        ('parser records', parsed_records),
+        ('parser + to_model', parsed_models),
+    ):
+        seconds, memory = measure(function, value, args.repeat)
+        print(f'{name:<24} {seconds / args.batch * 1e6:>11.2f} {memory / 1024:>10.1f} {memory / args.batch:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
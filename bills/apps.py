@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class BillsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "bills"
+
+    def ready(self):
+        from whatsapp.signals import statuses_received
+        from .delivery import update_delivery_status
+
+        statuses_received.connect(update_delivery_status, dispatch_uid='bills-delivery-status')
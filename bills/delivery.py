@@ -0,0 +1,126 @@
+"""
+Delivery tracking for bill notifications
+
+``record_notification`` stores the wamid of each bill notification (or
+``record_queued`` a placeholder filled in once a queued send goes out), and
+``update_delivery_status`` (connected to the webhook's ``statuses_received``
+signal) moves it through sent, delivered, read or failed in the same
+transaction that saves the status events.
+"""
+
+import threading
+
+from django.db import connections
+from django.db.models import OuterRef, Subquery
+
+from bbdBackend.customers import invalidate_customers
+
+from .models import slip, slip_notification
+
+# Statuses only move forward; a late "delivered" never replaces "read"
+STATUS_RANK = {'not_sent': 0, 'queued': 0, 'sent': 1, 'delivered': 2, 'read': 3, 'failed': 4}
+
+
+def record_notification(bill, response=None, error=''):
+    """
+    Store the outcome of sending a bill's notification
+
+    ``response`` is the Graph API response, or None if the call itself failed.
+    """
+    invalidate_customers([bill.phone_e164])
+    if response is not None and response.status_code == 200:
+        message_id = response.json()['messages'][0]['id']
+        return slip_notification.objects.create(slip=bill, message_id=message_id, status='sent')
+    if response is not None:
+        error = f'{response.status_code}: {response.text[:1000]}'
+    return slip_notification.objects.create(slip=bill, status='not_sent', error_message=error)
+
+
+def record_queued(bill, future):
+    """
+    Store a notification still waiting in the outbound queue
+
+    ``future`` is the queued send's; when it resolves the row gets the wamid
+    (or the error), from the sending thread.
+    """
+    notification = slip_notification.objects.create(slip=bill, status='queued')
+    caller = threading.get_ident()
+
+    def on_done(future):
+        try:
+            _complete_queued(notification.pk, future)
+            invalidate_customers([bill.phone_e164])
+        finally:
+            # Connections are per thread; don't leave the sender's open
+            if threading.get_ident() != caller:
+                connections.close_all()
+
+    future.add_done_callback(on_done)
+    return notification
+
+
+def _complete_queued(notification_id, future):
+    try:
+        response = future.result()
+    except Exception as e:
+        updates = {'status': 'not_sent', 'error_message': str(e) or type(e).__name__}
+    else:
+        if response.status_code == 200:
+            updates = {'status': 'sent', 'message_id': response.json()['messages'][0]['id']}
+        else:
+            updates = {'status': 'not_sent', 'error_message': f'{response.status_code}: {response.text[:1000]}'}
+    slip_notification.objects.filter(pk=notification_id, status='queued').update(**updates)
+
+
+def update_delivery_status(sender, statuses, **kwargs):
+    """
+    Apply webhook status events to the bill notifications they refer to
+
+    Two queries per payload at most: one lookup and one bulk UPDATE.
+    """
+    latest = {}
+    for status_row in statuses:
+        current = latest.get(status_row.message_id)
+        if current is None or STATUS_RANK.get(status_row.status, 0) >= STATUS_RANK.get(current.status, 0):
+            latest[status_row.message_id] = status_row
+
+    changed = []
+    for notification in slip_notification.objects.filter(message_id__in=latest).select_related('slip'):
+        status_row = latest[notification.message_id]
+        if STATUS_RANK.get(status_row.status, 0) < STATUS_RANK[notification.status]:
+            continue
+        notification.status = status_row.status
+        notification.status_at = status_row.timestamp
+        notification.error_code = status_row.error_code
+        notification.error_message = status_row.error_message
+        changed.append(notification)
+
+    if changed:
+        slip_notification.objects.bulk_update(changed, ['status', 'status_at', 'error_code', 'error_message'])
+        invalidate_customers([notification.slip.phone_e164 for notification in changed])
+
+
+def delivery_states(slip_numbers):
+    """
+    Latest notification of each slip, in one query
+
+    Returns ``{slip_no: {...}}``; slips without a notification have a None
+    status and unknown slip numbers are left out.
+    """
+    latest = slip_notification.objects.filter(slip=OuterRef('pk')).order_by('-created_at', '-id')
+    rows = slip.objects.filter(slip_no__in=slip_numbers).annotate(
+        delivery_status=Subquery(latest.values('status')[:1]),
+        message_id=Subquery(latest.values('message_id')[:1]),
+        status_at=Subquery(latest.values('status_at')[:1]),
+        error_message=Subquery(latest.values('error_message')[:1]),
+    ).values_list('slip_no', 'delivery_status', 'message_id', 'status_at', 'error_message')
+
+    return {
+        slip_no: {
+            'status': delivery_status,
+            'message_id': message_id,
+            'status_at': status_at,
+            'error': error_message,
+        }
+        for slip_no, delivery_status, message_id, status_at, error_message in rows
+    }
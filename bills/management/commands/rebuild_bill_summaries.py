@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+
+from bbdBackend.upserts import day_batches, day_range_filter, lock_for_rebuild
+from bills.models import daily_summary, item_summary, items, service_summary, slip
+from bills.summaries import add_to_summaries
+
+REVENUE = ExpressionWrapper(F('quantity') * F('price_per_unit'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily, service and item summaries from slips and items, a range of days "
+        "at a time. Each range is replaced in one short transaction, so bills can be created meanwhile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='slips per chunk (whole days)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        day_counts = slip.objects.values_list('date').annotate(count=Count('id')).order_by('date')
+        for after, through in day_batches(day_counts, options['chunk_size']):
+            # Bills created meanwhile wait on the lock and add themselves
+            # afterwards, so none is lost or counted twice
+            with transaction.atomic():
+                lock_for_rebuild(daily_summary, service_summary, item_summary)
+                self._rebuild_chunk(after, through)
+            self.stdout.write(f"  days {after or 'start'} - {through or 'end'} summarised")
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt bill summaries in {time.perf_counter() - started:.1f}s"))
+
+    def _rebuild_chunk(self, after, through):
+        # Delete first: on SQLite that takes the write lock before reading
+        for model in (daily_summary, service_summary, item_summary):
+            model.objects.filter(**day_range_filter('day', after, through)).delete()
+
+        chunk_slips = slip.objects.filter(**day_range_filter('date', after, through))
+        chunk_items = items.objects.filter(**day_range_filter('slip__date', after, through))
+        slip_counts = {
+            row['date']: row['slip_count']
+            for row in chunk_slips
+            .values('date').annotate(slip_count=Count('id')).order_by()
+        }
+        item_totals = {
+            row['slip__date']: row
+            for row in chunk_items.values('slip__date')
+            .annotate(total_quantity=Sum('quantity'), total_revenue=Sum(REVENUE)).order_by()
+        }
+
+        daily_rows = [
+            {
+                'day': day,
+                'slip_count': count,
+                'item_quantity': item_totals.get(day, {}).get('total_quantity') or 0,
+                'revenue': item_totals.get(day, {}).get('total_revenue') or 0,
+            }
+            for day, count in slip_counts.items()
+        ]
+        service_rows = [
+            {'day': row['slip__date'], 'service': row['service'], 'quantity': row['total_quantity'], 'revenue': row['total_revenue']}
+            for row in chunk_items.values('slip__date', 'service')
+            .annotate(total_quantity=Sum('quantity'), total_revenue=Sum(REVENUE)).order_by()
+        ]
+        item_rows = [
+            {'day': row['slip__date'], 'item_name': row['item_name'], 'quantity': row['total_quantity'], 'revenue': row['total_revenue']}
+            for row in chunk_items.values('slip__date', 'item_name')
+            .annotate(total_quantity=Sum('quantity'), total_revenue=Sum(REVENUE)).order_by()
+        ]
+        add_to_summaries(daily_rows, service_rows, item_rows)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0002_summaries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='slip',
+            index=models.Index(fields=['slip_no'], name='bills_slip_slip_no_b8574e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slip',
+            index=models.Index(fields=['phone', '-date'], name='bills_slip_phone_6bdd10_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slip',
+            index=models.Index(fields=['date'], name='bills_slip_date_a2b4c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slip',
+            index=models.Index(fields=['due_date'], name='bills_slip_due_dat_ed9eff_idx'),
+        ),
+    ]
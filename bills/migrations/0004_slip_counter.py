@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:48
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+# Conflicting slips listed in the error, at most
+LISTED_DUPLICATES = 50
+
+
+def check_duplicates_and_seed_counter(apps, schema_editor):
+    """
+    Start the counter above the highest slip_no
+
+    Issued numbers are on customers' paper slips and in WhatsApp messages,
+    so duplicates are never renumbered here: the migration stops with the
+    conflicting slips (the unique constraint in 0005 needs them resolved)
+    so they can be fixed by hand.
+    """
+    slip = apps.get_model('bills', 'slip')
+    slip_counter = apps.get_model('bills', 'slip_counter')
+
+    duplicates = list(
+        slip.objects.values('slip_no').annotate(copies=Count('id')).filter(copies__gt=1)
+        .order_by('slip_no').values_list('slip_no', flat=True)
+    )
+    if duplicates:
+        conflicting = slip.objects.filter(slip_no__in=duplicates[:LISTED_DUPLICATES]).order_by('slip_no', 'id')
+        lines = [f"  slip_no {bill.slip_no}: id {bill.pk}, {bill.date}, phone {bill.phone}" for bill in conflicting]
+        if len(duplicates) > LISTED_DUPLICATES:
+            lines.append(f"  ... and {len(duplicates) - LISTED_DUPLICATES} more duplicated numbers")
+        raise RuntimeError(
+            f"{len(duplicates)} slip numbers are used by more than one slip. Resolve them by hand "
+            "(e.g. in the admin) and run migrate again:\n" + "\n".join(lines)
+        )
+
+    next_value = (slip.objects.aggregate(highest=Max('slip_no'))['highest'] or 0) + 1
+    slip_counter.objects.update_or_create(id=1, defaults={'next_value': next_value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0003_slip_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='slip_counter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.BigIntegerField()),
+            ],
+        ),
+        migrations.RunPython(check_duplicates_and_seed_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0004_slip_counter'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='slip',
+            name='bills_slip_slip_no_b8574e_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='slip',
+            constraint=models.UniqueConstraint(fields=('slip_no',), name='unique_slip_no'),
+        ),
+    ]
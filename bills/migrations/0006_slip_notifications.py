@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0005_unique_slip_no'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='slip_notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message_id', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('status', models.CharField(choices=[('not_sent', 'Not sent'), ('sent', 'Sent'), ('delivered', 'Delivered'), ('read', 'Read'), ('failed', 'Failed')], max_length=20)),
+                ('error_code', models.CharField(blank=True, max_length=50, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('status_at', models.DateTimeField(blank=True, null=True)),
+                ('slip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='bills.slip')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['slip', '-created_at'], name='bills_slip__slip_id_b8409c_idx')],
+            },
+        ),
+    ]
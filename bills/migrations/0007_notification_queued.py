@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0006_slip_notifications'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='slip_notification',
+            name='status',
+            field=models.CharField(choices=[('not_sent', 'Not sent'), ('queued', 'Queued'), ('sent', 'Sent'), ('delivered', 'Delivered'), ('read', 'Read'), ('failed', 'Failed')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bills', '0007_notification_queued'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slip',
+            name='phone_e164',
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='slip',
+            index=models.Index(fields=['phone_e164', '-date'], name='bills_slip_phone_e_0d3591_idx'),
+        ),
+    ]
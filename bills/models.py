@@ -1,13 +1,33 @@
 from django.db import models
 
+from bbdBackend.phone import to_e164
+
 class slip(models.Model):
     slip_no = models.IntegerField()
     date = models.DateField()
     due_date = models.DateField()
     address = models.CharField(max_length=255)
     phone = models.CharField(max_length=10)
+    # Canonical form of ``phone``, shared with the whatsapp models (see bbdBackend/phone.py)
+    phone_e164 = models.CharField(max_length=16, blank=True, null=True)
     amount = models.IntegerField()
 
+    class Meta:
+        constraints = [
+            # Backstop for bills/slip_numbers.py
+            models.UniqueConstraint(fields=['slip_no'], name='unique_slip_no'),
+        ]
+        indexes = [
+            models.Index(fields=['phone', '-date']),
+            models.Index(fields=['phone_e164', '-date']),
+            models.Index(fields=['date']),
+            models.Index(fields=['due_date']),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.phone_e164 = to_e164(self.phone)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Slip {self.slip_no} - {self.phone}"
 
@@ -17,3 +37,97 @@ class items(models.Model):
     service = models.CharField(max_length=50)
     quantity = models.IntegerField()
     price_per_unit = models.DecimalField(max_digits=8, decimal_places=2)
+
+
+class slip_notification(models.Model):
+    """
+    WhatsApp message sent for a slip and its latest delivery status
+
+    Created by bills/notifications.py when the Graph API answers the send,
+    then moved forward by the webhook's status events (see bills/delivery.py).
+    """
+    STATUS_CHOICES = [
+        ('not_sent', 'Not sent'),
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('delivered', 'Delivered'),
+        ('read', 'Read'),
+        ('failed', 'Failed'),
+    ]
+
+    slip = models.ForeignKey(slip, related_name='notifications', on_delete=models.CASCADE)
+    # wamid returned by the Graph API; empty when the send was rejected
+    message_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    error_code = models.CharField(max_length=50, blank=True, null=True)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Timestamp of the latest status event applied
+    status_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['slip', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Slip {self.slip_id} notification - {self.status}"
+
+
+class slip_counter(models.Model):
+    """
+    Single row holding the next unreserved slip number
+    """
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"Next slip number: {self.next_value}"
+
+
+# Reporting summaries
+#
+# Maintained by BillSerializer.create in the same transaction as the bill,
+# so reports never aggregate the slip/items tables. Rebuild with
+# ``manage.py rebuild_bill_summaries``.
+
+class daily_summary(models.Model):
+    day = models.DateField(unique=True)
+    slip_count = models.IntegerField(default=0)
+    item_quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"{self.day}: {self.slip_count} slips, ₹{self.revenue}"
+
+class service_summary(models.Model):
+    day = models.DateField()
+    service = models.CharField(max_length=50)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-day', 'service']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'service'], name='unique_service_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.service}: {self.quantity}, ₹{self.revenue}"
+
+class item_summary(models.Model):
+    day = models.DateField()
+    item_name = models.CharField(max_length=50)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-day', 'item_name']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'item_name'], name='unique_item_summary'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.item_name}: {self.quantity}, ₹{self.revenue}"
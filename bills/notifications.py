@@ -0,0 +1,219 @@
+"""
+WhatsApp notifications sent to customers when a bill is created
+
+``send_whatsapp_notification`` is used by the sync views and
+``asend_whatsapp_notification`` by the async (ASGI) views; both build the
+same template payload and send it through the outbound scheduler in the
+transactional lane. The outcome is stored as a ``slip_notification`` so
+delivery statuses can be tied back to the slip.
+"""
+
+import json
+import logging
+import os
+import traceback
+
+from asgiref.sync import sync_to_async
+
+from bbdBackend.graph import graph_url
+from bbdBackend.outbound import MessageQueued, asend_message, send_message
+from bbdBackend.phone import to_e164, whatsapp_id
+
+from .delivery import record_notification, record_queued
+
+logger = logging.getLogger(__name__)
+
+
+def build_notification_request(bill):
+    """
+    Build the Graph API url, headers and template payload for a bill
+
+    Returns None when WhatsApp credentials are not configured and raises
+    ValueError if the bill's phone number isn't valid.
+    """
+    logger.info(f"🚀 Starting WhatsApp notification for bill {bill.slip_no}")
+
+    # Get WhatsApp credentials
+    whatsapp_token = os.getenv('WHATSAPP_ACCESS_TOKEN')
+    phone_number_id = os.getenv('WHATSAPP_PHONE_NUMBER_ID')
+    template_name = os.getenv('WHATSAPP_TEMPLATE_NAME', 'order_slip')  # Using order_slip template with button
+
+    logger.info(f"📋 Token present: {bool(whatsapp_token)}, Phone ID: {phone_number_id}, Template: {template_name}")
+
+    if not all([whatsapp_token, phone_number_id]):
+        logger.error("❌ WhatsApp credentials not configured in .env")
+        return None
+
+    # Calculate total amount
+    total_amount = bill.amount
+    logger.info(f"💰 Total amount calculated: ₹{total_amount}")
+
+    # Format items list for template
+    items_text = format_items_list(bill)
+    logger.info(f"✉️ Items formatted")
+
+    # Customer's phone number in the Graph API's format (country code, digits only)
+    customer_e164 = bill.phone_e164 or to_e164(bill.phone)
+    if customer_e164 is None:
+        raise ValueError(f"Invalid phone number {bill.phone!r}")
+    customer_phone = whatsapp_id(customer_e164)
+    logger.info(f"📱 Formatted phone for WhatsApp: {customer_phone}")
+
+    # WhatsApp API endpoint
+    url = graph_url(f"v22.0/{phone_number_id}/messages")
+    logger.info(f"🌐 API URL: {url}")
+
+    headers = {
+        "Authorization": f"Bearer {whatsapp_token}",
+        "Content-Type": "application/json"
+    }
+
+    # Build template payload with NAMED parameters
+    payload = {
+        "messaging_product": "whatsapp",
+        "to": customer_phone,
+        "type": "template",
+        "template": {
+            "name": template_name,
+            "language": {"code": "en"},
+            "components": [
+                {
+                    "type": "header",
+                    "parameters": [
+                        {
+                            "type": "text",
+                            "parameter_name": "order_id",
+                            "text": str(bill.slip_no)
+                        }
+                    ]
+                },
+                {
+                    "type": "body",
+                    "parameters": [
+                        {
+                            "type": "text",
+                            "parameter_name": "order_date",
+                            "text": bill.date.strftime('%d-%b-%Y')
+                        },
+                        {
+                            "type": "text",
+                            "parameter_name": "due_date",
+                            "text": bill.due_date.strftime('%d-%b-%Y')
+                        },
+                        {
+                            "type": "text",
+                            "parameter_name": "address",
+                            "text": str(bill.address) if bill.address else "N/A"
+                        },
+                        {
+                            "type": "text",
+                            "parameter_name": "order_items",
+                            "text": items_text if items_text else "No items"
+                        },
+                        {
+                            "type": "text",
+                            "parameter_name": "amount",
+                            "text": str(total_amount)
+                        }
+                    ]
+                }
+            ]
+        }
+    }
+    logger.info("📦 WhatsApp Payload: %s", json.dumps(payload, indent=2))
+    logger.info(f"📦 Payload ready. Sending template to: {customer_phone}")
+
+    return {'url': url, 'json': payload, 'headers': headers, 'phone_number_id': phone_number_id}
+
+
+def handle_notification_response(response):
+    """
+    Log the Graph API response and return True if the message was accepted
+    """
+    logger.info(f"📊 WhatsApp API Response Status: {response.status_code}")
+    logger.info(f"📊 WhatsApp API Response Body: {response.text}")
+
+    if response.status_code == 200:
+        logger.info(f"✅ WhatsApp sent successfully: {response.json()}")
+        return True
+    else:
+        logger.error(f"❌ WhatsApp API error: {response.status_code} - {response.text}")
+        return False
+
+
+def _record_outcome(bill, response=None, error=''):
+    try:
+        record_notification(bill, response, error)
+    except Exception as e:
+        logger.error(f"💥 Could not record notification for bill {bill.slip_no}: {str(e)}")
+
+
+def _record_queued(bill, future):
+    logger.warning(f"⏸️ WhatsApp API unavailable or slow; notification for bill {bill.slip_no} stays queued")
+    try:
+        record_queued(bill, future)
+    except Exception as e:
+        logger.error(f"💥 Could not record notification for bill {bill.slip_no}: {str(e)}")
+
+
+def send_whatsapp_notification(bill):
+    """
+    Send WhatsApp notification to customer when bill is created using template
+    """
+    try:
+        request_args = build_notification_request(bill)
+        if request_args is None:
+            return False
+
+        # Send request
+        logger.info("⏳ Calling WhatsApp API...")
+        response = send_message(request_args, app='bills')
+        _record_outcome(bill, response)
+        return handle_notification_response(response)
+
+    except MessageQueued as e:
+        _record_queued(bill, e.future)
+        return False
+
+    except Exception as e:
+        logger.error(f"💥 Exception sending WhatsApp: {str(e)}")
+        logger.error(f"Stack trace: {traceback.format_exc()}")
+        _record_outcome(bill, error=str(e) or type(e).__name__)
+        return False
+
+
+async def asend_whatsapp_notification(bill):
+    """
+    Async version of ``send_whatsapp_notification`` for the ASGI views
+    """
+    try:
+        # Formatting the items reads the database, which must happen off the event loop
+        request_args = await sync_to_async(build_notification_request)(bill)
+        if request_args is None:
+            return False
+
+        logger.info("⏳ Calling WhatsApp API...")
+        response = await asend_message(request_args, app='bills')
+        await sync_to_async(_record_outcome)(bill, response)
+        return handle_notification_response(response)
+
+    except MessageQueued as e:
+        await sync_to_async(_record_queued)(bill, e.future)
+        return False
+
+    except Exception as e:
+        logger.error(f"💥 Exception sending WhatsApp: {str(e)}")
+        logger.error(f"Stack trace: {traceback.format_exc()}")
+        await sync_to_async(_record_outcome)(bill, error=str(e) or type(e).__name__)
+        return False
+
+
+def format_items_list(bill):
+    """
+    Format items list for WhatsApp template parameter
+    """
+    items_text = ""
+    for index, item in enumerate(bill.items.all(), start=1):
+        items_text += f"{index}. {item.item_name} ({item.service}) — {item.quantity} × ₹{item.price_per_unit}\n"
+
+    return items_text.strip()
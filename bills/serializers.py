@@ -1,5 +1,10 @@
+from django.db import transaction
 from rest_framework import serializers
+
+from bbdBackend.customers import invalidate_customers
 from .models import slip, items
+from .slip_numbers import allocate_slip_number
+from .summaries import add_bill_to_summaries
 
 class BillItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,10 +17,21 @@ class BillSerializer(serializers.ModelSerializer):
     class Meta:
         model = slip
         fields = ['slip_no', 'date', 'due_date', 'address', 'phone', 'items', 'amount']
+        # Assigned by the server; a slip_no sent by the client is ignored
+        read_only_fields = ['slip_no']
 
     def create(self, validated_data):
+        # Allocated before the transaction so the counter row is never locked
+        # for the duration of a bill's INSERTs
+        validated_data['slip_no'] = allocate_slip_number()
+        return self._create_bill(validated_data)
+
+    @transaction.atomic
+    def _create_bill(self, validated_data):
         items_data = validated_data.pop('items')
         bill_slip = slip.objects.create(**validated_data)
-        for item in items_data:
-            items.objects.create(slip=bill_slip, **item)
+        # One INSERT for all items regardless of how many the bill has
+        bill_items = items.objects.bulk_create([items(slip=bill_slip, **item) for item in items_data])
+        add_bill_to_summaries(bill_slip, bill_items)
+        invalidate_customers([bill_slip.phone_e164])
         return bill_slip
@@ -0,0 +1,74 @@
+"""
+Server-side slip number allocation
+
+Each process reserves a block of ``SLIP_NUMBER_BLOCK_SIZE`` numbers from the
+``slip_counter`` row with a single ``UPDATE ... RETURNING`` and hands them out
+from memory, so the counter row is written once per block instead of once
+per bill and concurrent bill creations never queue on it. Numbers increase
+within a process; across processes they are unique but interleaved, and a
+block left unused when a worker exits becomes a gap. The unique constraint on
+``slip.slip_no`` is the backstop.
+"""
+
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+
+from .models import slip, slip_counter
+
+COUNTER_ID = 1
+
+_lock = threading.Lock()
+_next = 0
+_end = 0
+
+
+def allocate_slip_number():
+    """
+    Return a slip number no other caller has been or will be given
+    """
+    global _next, _end
+
+    # Inside an outer transaction the reservation could be rolled back and
+    # handed out again, so only take the one number needed
+    if connection.in_atomic_block:
+        start, _ = _reserve(1)
+        return start
+
+    with _lock:
+        if _next >= _end:
+            _next, _end = _reserve(settings.SLIP_NUMBER_BLOCK_SIZE)
+        number = _next
+        _next += 1
+        return number
+
+
+def reset():
+    """Drop the numbers reserved by this process (they become a gap)"""
+    global _next, _end
+    with _lock:
+        _next = _end = 0
+
+
+def _reserve(count):
+    """
+    Advance the counter by ``count`` and return the reserved ``[start, end)``
+    """
+    table = connection.ops.quote_name(slip_counter._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET next_value = next_value + %s WHERE id = %s RETURNING next_value',
+            [count, COUNTER_ID],
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        # Counter row missing (e.g. flushed database): seed it past existing slips
+        highest = slip.objects.aggregate(highest=Max('slip_no'))['highest'] or 0
+        slip_counter.objects.get_or_create(id=COUNTER_ID, defaults={'next_value': highest + 1})
+        return _reserve(count)
+
+    end = row[0]
+    return end - count, end
@@ -0,0 +1,60 @@
+"""
+Incremental maintenance of the bill reporting summaries
+"""
+
+from decimal import Decimal
+
+from bbdBackend.upserts import upsert_increment
+
+from .models import daily_summary, item_summary, service_summary
+
+
+def add_to_summaries(daily_rows, service_rows, item_rows):
+    """
+    Add rows to the three summary tables, one statement per table
+
+    daily_rows:   {'day', 'slip_count', 'item_quantity', 'revenue'}
+    service_rows: {'day', 'service', 'quantity', 'revenue'}
+    item_rows:    {'day', 'item_name', 'quantity', 'revenue'}
+    """
+    upsert_increment(
+        daily_summary, daily_rows, unique_fields=['day'],
+        add_fields=['slip_count', 'item_quantity', 'revenue'],
+    )
+    upsert_increment(
+        service_summary, service_rows, unique_fields=['day', 'service'],
+        add_fields=['quantity', 'revenue'],
+    )
+    upsert_increment(
+        item_summary, item_rows, unique_fields=['day', 'item_name'],
+        add_fields=['quantity', 'revenue'],
+    )
+
+
+def add_bill_to_summaries(bill, bill_items):
+    """
+    Count a newly created slip and its items in the summaries
+    """
+    services = {}
+    item_names = {}
+    total_quantity = 0
+    total_revenue = Decimal('0')
+    for item in bill_items:
+        revenue = item.quantity * Decimal(item.price_per_unit)
+        total_quantity += item.quantity
+        total_revenue += revenue
+        for totals, key in ((services, item.service), (item_names, item.item_name)):
+            quantity, amount = totals.get(key, (0, Decimal('0')))
+            totals[key] = (quantity + item.quantity, amount + revenue)
+
+    add_to_summaries(
+        [{'day': bill.date, 'slip_count': 1, 'item_quantity': total_quantity, 'revenue': total_revenue}],
+        [
+            {'day': bill.date, 'service': service, 'quantity': quantity, 'revenue': revenue}
+            for service, (quantity, revenue) in services.items()
+        ],
+        [
+            {'day': bill.date, 'item_name': item_name, 'quantity': quantity, 'revenue': revenue}
+            for item_name, (quantity, revenue) in item_names.items()
+        ],
+    )
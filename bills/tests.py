@@ -1,3 +1,395 @@
-from django.test import TestCase
+import itertools
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from bbdBackend.outbound import MessageQueued
+
+from . import slip_numbers
+from .models import daily_summary, item_summary, items, service_summary, slip, slip_counter, slip_notification
+
+WHATSAPP_ENV = {
+    'WHATSAPP_ACCESS_TOKEN': 'test-token',
+    'WHATSAPP_PHONE_NUMBER_ID': '123456',
+}
+
+
+_message_ids = itertools.count(1)
+
+
+def graph_response(status_code=200, body=None):
+    response = mock.Mock(status_code=status_code, text='{}')
+    response.json.return_value = body or {'messages': [{'id': f'wamid.TEST{next(_message_ids)}'}]}
+    return response
+
+
+def graph_responses(*args, **kwargs):
+    # A new wamid per call, as the Graph API returns
+    return graph_response()
+
+
+def bill_payload(item_count=1, slip_no=1001):
+    return {
+        'slip_no': slip_no,
+        'date': '2025-10-01',
+        'due_date': '2025-10-05',
+        'address': '12 Main Road',
+        'phone': '9876543210',
+        'amount': 150 * item_count,
+        'items': [
+            {'item_name': f'Shirt {i}', 'service': 'Dry Clean', 'quantity': 1, 'price_per_unit': '150.00'}
+            for i in range(item_count)
+        ],
+    }
+
+
+@override_settings(RATELIMIT_ENABLE=False)
+@mock.patch.dict(os.environ, WHATSAPP_ENV)
+@mock.patch('bbdBackend.graph.requests.request', side_effect=graph_responses)
+class BillCreateQueryCountTests(TestCase):
+    """
+    Pin the number of queries per bill so per-item queries can't creep back in
+    """
+
+    # slip number reservation (one per bill inside the test transaction, one
+    # per block in production), savepoint, slip INSERT, items INSERT, three
+    # summary upserts, release savepoint, items SELECT for the template,
+    # slip_notification INSERT
+    CREATE_QUERIES = 10
+
+    def test_query_count_is_constant_in_item_count(self, graph_mock):
+        for slip_no, item_count in enumerate([1, 5, 25], start=1):
+            with self.subTest(item_count=item_count):
+                with self.assertNumQueries(self.CREATE_QUERIES):
+                    response = self.client.post(
+                        reverse('create-bill'), bill_payload(item_count, slip_no), content_type='application/json'
+                    )
+                self.assertEqual(response.status_code, 201)
+                self.assertTrue(response.json()['whatsapp_sent'])
+                self.assertEqual(items.objects.filter(slip__slip_no=response.json()['slip_no']).count(), item_count)
+        self.assertEqual(graph_mock.call_count, 3)
+
+    def test_invalid_bill_runs_no_queries(self, graph_mock):
+        payload = bill_payload()
+        del payload['phone']
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('create-bill'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        graph_mock.assert_not_called()
+
+    def test_graph_failure_still_creates_bill(self, graph_mock):
+        graph_mock.side_effect = None
+        graph_mock.return_value = graph_response(status_code=500)
+        with self.assertNumQueries(self.CREATE_QUERIES):
+            response = self.client.post(reverse('create-bill'), bill_payload(3), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.json()['whatsapp_sent'])
+        self.assertEqual(slip.objects.count(), 1)
+
+
+def status_webhook(*statuses):
+    value = {
+        'messaging_product': 'whatsapp',
+        'statuses': [
+            {'id': message_id, 'recipient_id': '919876543210', 'status': status, 'timestamp': str(1760000000 + offset)}
+            for message_id, status, offset in statuses
+        ],
+    }
+    return {'object': 'whatsapp_business_account', 'entry': [{'changes': [{'field': 'messages', 'value': value}]}]}
+
+
+@override_settings(RATELIMIT_ENABLE=False)
+@mock.patch.dict(os.environ, WHATSAPP_ENV)
+@mock.patch('bbdBackend.graph.requests.request', side_effect=graph_responses)
+class DeliveryTrackingTests(TestCase):
+
+    def create_bill(self, slip_no):
+        response = self.client.post(reverse('create-bill'), bill_payload(slip_no=slip_no), content_type='application/json')
+        return response.json()['slip_no']
+
+    def post_statuses(self, *statuses):
+        response = self.client.post(reverse('whatsapp-webhook'), status_webhook(*statuses), content_type='application/json')
+        self.assertEqual(response.json(), {'status': 'success'})
+
+    def test_webhook_statuses_update_the_slip(self, graph_mock):
+        slip_no = self.create_bill(1)
+        message_id = slip_notification.objects.get().message_id
+
+        # A late "delivered" must not undo "read"
+        self.post_statuses((message_id, 'sent', 0), (message_id, 'read', 60))
+        self.post_statuses((message_id, 'delivered', 30), ('wamid.unrelated', 'read', 30))
+
+        notification = slip_notification.objects.get()
+        self.assertEqual(notification.slip.slip_no, slip_no)
+        self.assertEqual(notification.status, 'read')
+        self.assertEqual(notification.status_at.timestamp(), 1760000060)
+
+    def test_bulk_delivery_lookup_is_one_query(self, graph_mock):
+        delivered = self.create_bill(1)
+        not_notified = slip.objects.create(
+            slip_no=90001, date=date(2025, 10, 1), due_date=date(2025, 10, 5), address='x', phone='9876543210', amount=1
+        ).slip_no
+        graph_mock.side_effect = None
+        graph_mock.return_value = graph_response(status_code=400)
+        rejected = self.create_bill(2)
+        self.post_statuses((slip_notification.objects.get(slip__slip_no=delivered).message_id, 'delivered', 0))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('slip-delivery'), {'slip_no': f'{delivered},{not_notified},{rejected},424242'}
+            )
+        slips = response.json()['slips']
+        self.assertEqual(set(slips), {str(delivered), str(not_notified), str(rejected)})
+        self.assertEqual(slips[str(delivered)]['status'], 'delivered')
+        self.assertIsNone(slips[str(not_notified)]['status'])
+        self.assertEqual(slips[str(rejected)]['status'], 'not_sent')
+        self.assertTrue(slips[str(rejected)]['error'].startswith('400'))
+
+    def test_queued_notification_is_completed_when_sent(self, graph_mock):
+        future = Future()
+        with mock.patch('bills.notifications.send_message', side_effect=MessageQueued(future)):
+            slip_no = self.create_bill(1)
+        self.assertEqual(slip_notification.objects.get().status, 'queued')
+
+        future.set_result(graph_response())
+        notification = slip_notification.objects.get()
+        self.assertEqual(notification.slip.slip_no, slip_no)
+        self.assertEqual(notification.status, 'sent')
+        self.assertTrue(notification.message_id.startswith('wamid.'))
+
+    def test_invalid_slip_numbers_are_400(self, graph_mock):
+        self.assertEqual(self.client.get(reverse('slip-delivery'), {'slip_no': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('slip-delivery')).status_code, 400)
+
+
+def summary_values(model, *fields):
+    return sorted(model.objects.values_list(*fields))
+
+
+@override_settings(RATELIMIT_ENABLE=False)
+@mock.patch('bbdBackend.graph.requests.request', return_value=graph_response())
+class BillSummaryTests(TestCase):
+    def create_bill(self, slip_no, bill_date, bill_items):
+        payload = bill_payload(slip_no=slip_no)
+        payload['date'] = bill_date
+        payload['items'] = [
+            {'item_name': name, 'service': service, 'quantity': quantity, 'price_per_unit': price}
+            for name, service, quantity, price in bill_items
+        ]
+        response = self.client.post(reverse('create-bill'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def setUp(self):
+        self.create_bill(1, '2025-10-01', [
+            ('Shirt', 'Dry Clean', 2, '150.00'),
+            ('Saree', 'Dry Clean', 1, '300.50'),
+            ('Shirt', 'Iron', 3, '20.00'),
+        ])
+        self.create_bill(2, '2025-10-01', [('Shirt', 'Iron', 1, '20.00')])
+        self.create_bill(3, '2025-10-02', [('Blanket', 'Wash', 1, '400.00')])
+
+    def test_bills_are_added_to_summaries(self, graph_mock):
+        self.assertEqual(summary_values(daily_summary, 'day', 'slip_count', 'item_quantity', 'revenue'), [
+            (date(2025, 10, 1), 2, 7, Decimal('680.50')),
+            (date(2025, 10, 2), 1, 1, Decimal('400.00')),
+        ])
+        self.assertEqual(summary_values(service_summary, 'day', 'service', 'quantity', 'revenue'), [
+            (date(2025, 10, 1), 'Dry Clean', 3, Decimal('600.50')),
+            (date(2025, 10, 1), 'Iron', 4, Decimal('80.00')),
+            (date(2025, 10, 2), 'Wash', 1, Decimal('400.00')),
+        ])
+        self.assertEqual(
+            item_summary.objects.get(day=date(2025, 10, 1), item_name='Shirt').revenue, Decimal('380.00')
+        )
+
+    def test_rebuild_matches_incremental_summaries(self, graph_mock):
+        tables = [
+            (daily_summary, ('day', 'slip_count', 'item_quantity', 'revenue')),
+            (service_summary, ('day', 'service', 'quantity', 'revenue')),
+            (item_summary, ('day', 'item_name', 'quantity', 'revenue')),
+        ]
+        incremental = [summary_values(model, *fields) for model, fields in tables]
+        daily_summary.objects.update(revenue=0)
+
+        call_command('rebuild_bill_summaries', chunk_size=2, stdout=StringIO())
+
+        self.assertEqual([summary_values(model, *fields) for model, fields in tables], incremental)
+
+    def test_bills_created_during_rebuild_are_counted_once(self, graph_mock):
+        from bills.management.commands.rebuild_bill_summaries import Command
+        rebuild_chunk = Command._rebuild_chunk
+
+        def rebuild_then_create_bills(command, after, through):
+            rebuild_chunk(command, after, through)
+            if after is None:
+                # One day already rebuilt and one still to come
+                self.create_bill(4, '2025-10-01', [('Shirt', 'Iron', 5, '20.00')])
+                self.create_bill(5, '2025-10-02', [('Blanket', 'Wash', 2, '400.00')])
+
+        with mock.patch.object(Command, '_rebuild_chunk', autospec=True, side_effect=rebuild_then_create_bills):
+            call_command('rebuild_bill_summaries', chunk_size=2, stdout=StringIO())
+
+        self.assertEqual(summary_values(daily_summary, 'day', 'slip_count', 'item_quantity', 'revenue'), [
+            (date(2025, 10, 1), 3, 12, Decimal('780.50')),
+            (date(2025, 10, 2), 2, 3, Decimal('1200.00')),
+        ])
+        self.assertEqual(
+            service_summary.objects.get(day=date(2025, 10, 1), service='Iron').quantity, 9
+        )
+
+    def test_reports_read_only_summaries(self, graph_mock):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('bill-report', args=['daily']), {'from': '2025-10-01', 'to': '2025-10-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['slip_count'] for row in response.json()['results']], [2, 1])
+        self.assertEqual(Decimal(response.json()['revenue']), Decimal('1080.50'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse('bill-report', args=['services']), {'from': '2025-10-01', 'to': '2025-10-31', 'limit': 2}
+            )
+        self.assertEqual([row['service'] for row in response.json()['results']], ['Dry Clean', 'Wash'])
+
+    def test_out_of_range_limits_are_clamped(self, graph_mock):
+        for limit, days in ((-1, -5), (0, 0), (10 ** 9, 10 ** 9)):
+            with self.subTest(limit=limit, days=days):
+                response = self.client.get(reverse('bill-report', args=['services']), {'limit': limit, 'days': days})
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('bill-report', args=['items']), {'limit': 'all'}).status_code, 400)
+
+    def test_unknown_report_is_404(self, graph_mock):
+        response = self.client.get(reverse('bill-report', args=['customers']))
+        self.assertEqual(response.status_code, 404)
+
+
+class SlipLookupTests(TestCase):
+    """
+    One query for the slips and one for their items, whatever the page size
+    """
+
+    LOOKUP_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        for slip_no in range(1, 8):
+            bill = slip.objects.create(
+                slip_no=slip_no,
+                date=date(2025, 10, slip_no),
+                due_date=date(2025, 10, 20 - slip_no),
+                address='12 Main Road',
+                phone='9876543210' if slip_no % 2 else '9123456780',
+                amount=300,
+            )
+            items.objects.bulk_create([
+                items(slip=bill, item_name=f'Shirt {i}', service='Iron', quantity=1, price_per_unit='150.00')
+                for i in range(2)
+            ])
+
+    def test_fetch_by_slip_no(self):
+        with self.assertNumQueries(self.LOOKUP_QUERIES):
+            response = self.client.get(reverse('slip-detail', args=[3]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['slip_no'], 3)
+        self.assertEqual(len(response.json()['items']), 2)
+
+    def test_unknown_slip_no_is_404(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('slip-detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_by_phone_is_newest_first(self):
+        with self.assertNumQueries(self.LOOKUP_QUERIES):
+            response = self.client.get(reverse('slip-list'), {'phone': '9876543210'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['slip_no'] for row in response.json()['results']], [7, 5, 3, 1])
+
+    def test_list_by_phone_before_backfill(self):
+        # Slips saved before phone_e164 existed
+        slip.objects.filter(slip_no__in=[1, 3]).update(phone_e164=None)
+        for phone in ('9876543210', '+91 98765 43210', '919876543210'):
+            with self.subTest(phone=phone):
+                response = self.client.get(reverse('slip-list'), {'phone': phone})
+                self.assertEqual([row['slip_no'] for row in response.json()['results']], [7, 5, 3, 1])
+
+    def test_list_by_date_range_pages_with_cursor(self):
+        params = {'date_from': '2025-10-02', 'date_to': '2025-10-06', 'page_size': 3}
+        with self.assertNumQueries(self.LOOKUP_QUERIES):
+            response = self.client.get(reverse('slip-list'), params)
+        first_page = response.json()
+        self.assertEqual([row['slip_no'] for row in first_page['results']], [6, 5, 4])
+
+        with self.assertNumQueries(self.LOOKUP_QUERIES):
+            response = self.client.get(first_page['next'])
+        self.assertEqual([row['slip_no'] for row in response.json()['results']], [3, 2])
+        self.assertIsNone(response.json()['next'])
+
+    def test_list_by_due_date_is_soonest_first(self):
+        with self.assertNumQueries(self.LOOKUP_QUERIES):
+            response = self.client.get(reverse('slip-list'), {'due_from': '2025-10-14', 'due_to': '2025-10-16'})
+        self.assertEqual([row['slip_no'] for row in response.json()['results']], [6, 5, 4])
+
+    def test_invalid_date_is_400(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('slip-list'), {'date_from': '01-10-2025'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(RATELIMIT_ENABLE=False, SLIP_NUMBER_BLOCK_SIZE=10)
+@mock.patch('bbdBackend.graph.requests.request', return_value=graph_response())
+class SlipNumberAllocationTests(TransactionTestCase):
+    """
+    Concurrent bill creations get distinct numbers from per-process blocks
+    """
+
+    BILLS = 60
+    THREADS = 8
+
+    def setUp(self):
+        slip_numbers.reset()
+        slip_counter.objects.update_or_create(id=slip_numbers.COUNTER_ID, defaults={'next_value': 5001})
+
+    def tearDown(self):
+        slip_numbers.reset()
+
+    def create_bill(self, _):
+        try:
+            response = self.client_class().post(
+                reverse('create-bill'), bill_payload(slip_no=1), content_type='application/json'
+            )
+            return response.status_code, response.json().get('slip_no')
+        finally:
+            connection.close()
+
+    def test_concurrent_bills_get_unique_numbers(self, graph_mock):
+        reserve = mock.Mock(wraps=slip_numbers._reserve)
+        with mock.patch.object(slip_numbers, '_reserve', reserve):
+            with ThreadPoolExecutor(self.THREADS) as pool:
+                results = list(pool.map(self.create_bill, range(self.BILLS)))
+
+        self.assertEqual({status_code for status_code, _ in results}, {201})
+        numbers = [slip_no for _, slip_no in results]
+        self.assertEqual(len(set(numbers)), self.BILLS)
+        self.assertEqual(sorted(numbers), list(range(5001, 5001 + self.BILLS)))
+        # One counter UPDATE per block of 10, not one per bill
+        self.assertEqual(reserve.call_count, self.BILLS // 10)
+        self.assertEqual(slip_counter.objects.get().next_value, 5001 + self.BILLS)
+
+    def test_numbers_increase_within_a_process(self, graph_mock):
+        numbers = [slip_numbers.allocate_slip_number() for _ in range(25)]
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertEqual(numbers[0], 5001)
+
+    def test_missing_counter_starts_after_existing_slips(self, graph_mock):
+        slip_counter.objects.all().delete()
+        slip.objects.create(
+            slip_no=7000, date=date(2025, 10, 1), due_date=date(2025, 10, 5), address='', phone='9876543210', amount=0
+        )
+        self.assertEqual(slip_numbers.allocate_slip_number(), 7001)
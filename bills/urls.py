@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.urls import path
-from .views import BillCreateView
+from .views import BillCreateView, AsyncBillCreateView, BillReportView, SlipDeliveryView, SlipDetailView, SlipListView
 from django.http import JsonResponse
 
 def test_endpoint(request):
@@ -7,5 +8,9 @@ def test_endpoint(request):
 
 urlpatterns = [
     path('', test_endpoint),  # handles /api/bills/
-    path('create/', BillCreateView.as_view(), name='create-bill'),
+    path('create/', (AsyncBillCreateView if settings.ASYNC_VIEWS else BillCreateView).as_view(), name='create-bill'),
+    path('slips/', SlipListView.as_view(), name='slip-list'),
+    path('slips/delivery/', SlipDeliveryView.as_view(), name='slip-delivery'),
+    path('slips/<int:slip_no>/', SlipDetailView.as_view(), name='slip-detail'),
+    path('reports/<str:report>/', BillReportView.as_view(), name='bill-report'),
 ]
@@ -1,17 +1,56 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.pagination import CursorPagination
+from .models import daily_summary, item_summary, service_summary, slip
 from .serializers import BillSerializer
+from .notifications import send_whatsapp_notification, asend_whatsapp_notification
+from .delivery import delivery_states
+from bbdBackend.phone import phone_q
+from bbdBackend.ratelimits import aratelimit
+from bbdBackend.replicas import reads_from_replica
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
-import logging
-import requests
-import os
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.http import Http404, JsonResponse
+from django.db.models import Sum
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from datetime import date, timedelta
 from decimal import Decimal
+import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+
+def _bill_created_response(bill, whatsapp_sent):
+    if whatsapp_sent:
+        logger.info(f"✅ ✅ ✅ WhatsApp sent successfully to {bill.phone} for slip {bill.slip_no}")
+    else:
+        logger.warning(f"⚠️ ⚠️ ⚠️ WhatsApp FAILED for {bill.phone}, but bill {bill.slip_no} was created")
+    
+    response_data = {
+        'message': 'Bill created successfully!',
+        'whatsapp_sent': whatsapp_sent,
+        'slip_no': bill.slip_no,
+        'customer_phone': bill.phone
+    }
+    
+    logger.info(f"📤 Sending response: {response_data}")
+    return response_data
+
+
+def _validation_failed(serializer):
+    # Log detailed validation errors for debugging
+    logger.error(f"Validation errors: {serializer.errors}")
+    return {
+        'error': 'Validation failed',
+        'details': serializer.errors
+    }
+
+
 @method_decorator(ratelimit(key='ip', rate='20/m', block=True), name='dispatch')
 class BillCreateView(APIView):
     def post(self, request):
@@ -26,159 +65,191 @@ class BillCreateView(APIView):
             logger.info(f"✅ Bill {bill.slip_no} saved to database")
             
             # Send WhatsApp notification to customer
-            whatsapp_sent = self.send_whatsapp_notification(bill)
+            whatsapp_sent = send_whatsapp_notification(bill)
             
-            if whatsapp_sent:
-                logger.info(f"✅ ✅ ✅ WhatsApp sent successfully to {bill.phone} for slip {bill.slip_no}")
+            return Response(_bill_created_response(bill, whatsapp_sent), status=status.HTTP_201_CREATED)
+        else:
+            return Response(_validation_failed(serializer), status=status.HTTP_400_BAD_REQUEST)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+@method_decorator(aratelimit(key='ip', rate='20/m', block=True), name='dispatch')
+class AsyncBillCreateView(View):
+    """
+    ASGI version of BillCreateView: the Graph API call doesn't hold a thread
+    """
+    async def post(self, request):
+        ip = request.META.get('REMOTE_ADDR')
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        logger.info(f"POST /api/bills/create/ from {ip} — Data: {data}")
+
+        serializer = BillSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(_validation_failed(serializer), status=400)
+
+        bill = await sync_to_async(serializer.save)()
+        logger.info(f"✅ Bill {bill.slip_no} saved to database")
+        
+        whatsapp_sent = await asend_whatsapp_notification(bill)
+        
+        return JsonResponse(_bill_created_response(bill, whatsapp_sent), status=201)
+
+
+class BillReportView(APIView):
+    """
+    Revenue reports served from the bill summary tables
+
+    Usage: /api/bills/reports/<daily|services|items>/
+
+    Query params:
+    - days: Window ending today (default 30, max 366), or
+    - from / to: Explicit date range (YYYY-MM-DD)
+    - limit: Max rows for services/items, by revenue (default 50, max 500)
+    """
+    REPORTS = {
+        'daily': (daily_summary, 'day', ['slip_count', 'item_quantity', 'revenue']),
+        'services': (service_summary, 'service', ['quantity', 'revenue']),
+        'items': (item_summary, 'item_name', ['quantity', 'revenue']),
+    }
+
+    @reads_from_replica
+    def get(self, request, report):
+        if report not in self.REPORTS:
+            return Response(
+                {'error': f"report must be one of {', '.join(self.REPORTS)}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        try:
+            end = date.fromisoformat(request.GET['to']) if 'to' in request.GET else timezone.localdate()
+            if 'from' in request.GET:
+                start = date.fromisoformat(request.GET['from'])
             else:
-                logger.warning(f"⚠️ ⚠️ ⚠️ WhatsApp FAILED for {bill.phone}, but bill {bill.slip_no} was created")
-            
-            response_data = {
-                'message': 'Bill created successfully!',
-                'whatsapp_sent': whatsapp_sent,
-                'slip_no': bill.slip_no,
-                'customer_phone': bill.phone
-            }
-            
-            logger.info(f"📤 Sending response: {response_data}")
-            
-            return Response(response_data, status=status.HTTP_201_CREATED)
+                start = end - timedelta(days=max(1, min(int(request.GET.get('days', 30)), 366)) - 1)
+            limit = max(1, min(int(request.GET.get('limit', 50)), 500))
+        except ValueError:
+            return Response({'error': 'Invalid date or number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        model, field, totals = self.REPORTS[report]
+        summaries = model.objects.filter(day__range=(start, end))
+        if report == 'daily':
+            results = summaries.order_by(field).values(field, *totals)
         else:
-            # Log detailed validation errors for debugging
-            logger.error(f"Validation errors: {serializer.errors}")
-            return Response({
-                'error': 'Validation failed',
-                'details': serializer.errors
-            }, status=status.HTTP_400_BAD_REQUEST)
-    
-    def send_whatsapp_notification(self, bill):
-        """
-        Send WhatsApp notification to customer when bill is created using template
-        """
+            results = summaries.values(field).annotate(
+                **{total: Sum(total) for total in totals}
+            ).order_by('-revenue', field)[:limit]
+        results = list(results)
+
+        return Response({
+            'from': start,
+            'to': end,
+            'report': report,
+            'revenue': sum((row['revenue'] for row in results), Decimal('0')),
+            'results': results,
+        })
+
+
+class SlipCursorPagination(CursorPagination):
+    """
+    Keyset pagination for slip lists, newest bill date first
+
+    Due-date lists are ordered by due date instead so the counter sees the
+    next pickups first.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if 'due_from' in request.GET or 'due_to' in request.GET:
+            return ('due_date', 'id')
+        return self.ordering
+
+
+class SlipListView(APIView):
+    """
+    List slips with their items
+
+    Usage: /api/bills/slips/
+
+    Query params (all optional, combinable):
+    - phone: Slips for one customer (any format, e.g. 9876543210 or +919876543210)
+    - date_from / date_to: Bill date range (YYYY-MM-DD)
+    - due_from / due_to: Due date range (YYYY-MM-DD)
+    - page_size: Slips per page (default 50, max 200); follow ``next`` for more
+    """
+    RANGE_FILTERS = {
+        'date_from': 'date__gte',
+        'date_to': 'date__lte',
+        'due_from': 'due_date__gte',
+        'due_to': 'due_date__lte',
+    }
+
+    @reads_from_replica
+    def get(self, request):
+        slips = slip.objects.prefetch_related('items')
+        if request.GET.get('phone'):
+            # Slips saved before phone_e164 existed match on the raw number
+            # until backfill_phone_e164 has run
+            match = phone_q(request.GET['phone'], raw_field='phone')
+            if match is None:
+                return Response({'error': 'Invalid phone'}, status=status.HTTP_400_BAD_REQUEST)
+            slips = slips.filter(match)
+
         try:
-            logger.info(f"🚀 Starting WhatsApp notification for bill {bill.slip_no}")
-            
-            # Get WhatsApp credentials
-            whatsapp_token = os.getenv('WHATSAPP_ACCESS_TOKEN')
-            phone_number_id = os.getenv('WHATSAPP_PHONE_NUMBER_ID')
-            template_name = os.getenv('WHATSAPP_TEMPLATE_NAME', 'order_slip')  # Using order_slip template with button
-            
-            logger.info(f"📋 Token present: {bool(whatsapp_token)}, Phone ID: {phone_number_id}, Template: {template_name}")
-            
-            if not all([whatsapp_token, phone_number_id]):
-                logger.error("❌ WhatsApp credentials not configured in .env")
-                return False
-            
-            # Calculate total amount
-            total_amount = bill.amount
-            logger.info(f"💰 Total amount calculated: ₹{total_amount}")
-            
-            # Format items list for template
-            items_text = self._format_items_list(bill)
-            logger.info(f"✉️ Items formatted")
-            
-            # Customer's phone number (from bill)
-            customer_phone = bill.phone
-            logger.info(f"📱 Original phone from bill: {customer_phone}")
-            
-            # Ensure phone is in international format (91 + 10 digits)
-            if not customer_phone.startswith('91'):
-                customer_phone = f'91{customer_phone}'
-            
-            # Remove any spaces, dashes, or special characters
-            customer_phone = customer_phone.replace('+', '').replace('-', '').replace(' ', '')
-            logger.info(f"📱 Formatted phone for WhatsApp: {customer_phone}")
-            
-            # WhatsApp API endpoint
-            url = f"https://graph.facebook.com/v22.0/{phone_number_id}/messages"
-            logger.info(f"🌐 API URL: {url}")
-            
-            headers = {
-                "Authorization": f"Bearer {whatsapp_token}",
-                "Content-Type": "application/json"
-            }
-            
-            # Build template payload with NAMED parameters
-            payload = {
-                "messaging_product": "whatsapp",
-                "to": customer_phone,
-                "type": "template",
-                "template": {
-                    "name": template_name,
-                    "language": {"code": "en"},
-                    "components": [
-                        {
-                            "type": "header",
-                            "parameters": [
-                                {
-                                    "type": "text",
-                                    "parameter_name": "order_id",
-                                    "text": str(bill.slip_no)
-                                }
-                            ]
-                        },
-                        {
-                            "type": "body",
-                            "parameters": [
-                                {
-                                    "type": "text",
-                                    "parameter_name": "order_date",
-                                    "text": bill.date.strftime('%d-%b-%Y')
-                                },
-                                {
-                                    "type": "text",
-                                    "parameter_name": "due_date",
-                                    "text": bill.due_date.strftime('%d-%b-%Y')
-                                },
-                                {
-                                    "type": "text",
-                                    "parameter_name": "address",
-                                    "text": str(bill.address) if bill.address else "N/A"
-                                },
-                                {
-                                    "type": "text",
-                                    "parameter_name": "order_items",
-                                    "text": items_text if items_text else "No items"
-                                },
-                                {
-                                    "type": "text",
-                                    "parameter_name": "amount",
-                                    "text": str(total_amount)
-                                }
-                            ]
-                        }
-                    ]
-                }
+            filters = {
+                lookup: date.fromisoformat(request.GET[param])
+                for param, lookup in self.RANGE_FILTERS.items()
+                if param in request.GET
             }
-            logger.info("📦 WhatsApp Payload: %s", json.dumps(payload, indent=2))
-            logger.info(f"📦 Payload ready. Sending template to: {customer_phone}")
-            
-            # Send request
-            logger.info("⏳ Calling WhatsApp API...")
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
-            
-            logger.info(f"📊 WhatsApp API Response Status: {response.status_code}")
-            logger.info(f"📊 WhatsApp API Response Body: {response.text}")
-            
-            if response.status_code == 200:
-                logger.info(f"✅ WhatsApp sent successfully: {response.json()}")
-                return True
-            else:
-                logger.error(f"❌ WhatsApp API error: {response.status_code} - {response.text}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"💥 Exception sending WhatsApp: {str(e)}")
-            import traceback
-            logger.error(f"Stack trace: {traceback.format_exc()}")
-            return False
-    
-    def _format_items_list(self, bill):
-        """
-        Format items list for WhatsApp template parameter
-        """
-        items_text = ""
-        for index, item in enumerate(bill.items.all(), start=1):
-            items_text += f"{index}. {item.item_name} ({item.service}) — {item.quantity} × ₹{item.price_per_unit}\n"
-        
-        return items_text.strip()
\ No newline at end of file
+        except ValueError:
+            return Response({'error': 'Invalid date'}, status=status.HTTP_400_BAD_REQUEST)
+        slips = slips.filter(**filters)
+
+        paginator = SlipCursorPagination()
+        page = paginator.paginate_queryset(slips, request, view=self)
+        return paginator.get_paginated_response(BillSerializer(page, many=True).data)
+
+
+class SlipDetailView(APIView):
+    """
+    Fetch one slip with its items by slip number
+
+    Usage: /api/bills/slips/<slip_no>/
+    """
+    def get(self, request, slip_no):
+        bill = slip.objects.prefetch_related('items').filter(slip_no=slip_no).first()
+        if bill is None:
+            raise Http404(f"Slip {slip_no} not found")
+        return Response(BillSerializer(bill).data)
+
+
+class SlipDeliveryView(APIView):
+    """
+    WhatsApp delivery state of many slips in one query
+
+    Usage: /api/bills/slips/delivery/?slip_no=1001,1002,1003
+
+    Returns the latest notification of each slip: status is not_sent, sent,
+    delivered, read or failed (None if no notification was attempted).
+    Unknown slip numbers are left out.
+    """
+    MAX_SLIPS = 500
+
+    def get(self, request):
+        try:
+            slip_numbers = {int(value) for value in request.GET.get('slip_no', '').split(',') if value.strip()}
+        except ValueError:
+            return Response({'error': 'slip_no must be a comma-separated list of numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not slip_numbers or len(slip_numbers) > self.MAX_SLIPS:
+            return Response(
+                {'error': f'Pass between 1 and {self.MAX_SLIPS} slip numbers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        states = delivery_states(slip_numbers)
+        return Response({'count': len(states), 'slips': {str(slip_no): state for slip_no, state in states.items()}})
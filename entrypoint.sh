@@ -1,18 +1,25 @@
 #!/bin/sh
 set -e
 
-echo "Waiting for database to be ready..."
-# Use Django's built-in check
-until python manage.py check --database default; do
-  echo "Database not ready, waiting..."
-  sleep 1
-done
+if [ "${FAST_BOOT:-1}" = "1" ]; then
+  # One Django process: waits for the database, then runs migrate and
+  # collectstatic only when migrations or static files changed
+  echo "Preparing app (fast boot)..."
+  python manage.py coldstart
+else
+  echo "Waiting for database to be ready..."
+  # Use Django's built-in check
+  until python manage.py check --database default; do
+    echo "Database not ready, waiting..."
+    sleep 1
+  done
 
-echo "Running migrations..."
-python manage.py migrate --noinput
+  echo "Running migrations..."
+  python manage.py migrate --noinput
 
-echo "Collecting static files..."
-python manage.py collectstatic --noinput
+  echo "Collecting static files..."
+  python manage.py collectstatic --noinput
+fi
 
 echo "Starting server..."
 exec "$@"
@@ -0,0 +1,39 @@
+"""
+Gunicorn configuration, picked up automatically from the working directory
+
+SERVER_PROFILE selects how requests are served:
+- sync (default): classic WSGI workers running bbdBackend.wsgi
+- asgi: uvicorn workers running bbdBackend.asgi, which serves the native
+  async views for the webhook, media proxy and notification senders
+- gthread: WSGI workers with GUNICORN_THREADS threads each; pair it with
+  DB_POOL_MODE=pool so the threads share a few database connections
+"""
+
+import os
+
+profile = os.environ.get('SERVER_PROFILE', 'sync')
+
+bind = f":{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+
+# Import Django once in the master and fork workers from it, so a cold
+# machine pays the import cost once instead of once per worker
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+if profile == 'asgi':
+    wsgi_app = 'bbdBackend.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+elif profile == 'gthread':
+    wsgi_app = 'bbdBackend.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+else:
+    wsgi_app = 'bbdBackend.wsgi:application'
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's metrics file, or /metrics keeps reporting it
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bbdBackend.settings')
+    from bbdBackend.metrics import remove_process_metrics
+
+    remove_process_metrics(worker.pid)
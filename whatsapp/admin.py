@@ -1,10 +1,21 @@
 from django.contrib import admin
+from django.urls import reverse
 from django.utils.html import format_html
-from .models import WhatsAppMessage, WhatsAppMessageStatus, WhatsAppConversation
+
+from bbdBackend.replicas import ReplicaChangeListMixin
+from .models import (
+    WhatsAppMessage,
+    WhatsAppMessageStatus,
+    WhatsAppConversation,
+    WhatsAppDailyRollup,
+    WhatsAppArchiveChunk,
+    BroadcastCampaign,
+    BroadcastRecipient,
+)
 
 
 @admin.register(WhatsAppMessage)
-class WhatsAppMessageAdmin(admin.ModelAdmin):
+class WhatsAppMessageAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = [
         'from_number', 
         'from_name', 
@@ -22,7 +33,9 @@ class WhatsAppMessageAdmin(admin.ModelAdmin):
         'from_number', 
         'timestamp', 
         'received_at',
-        'raw_payload'
+        'raw_payload',
+        'media_file',
+        'media_thumbnail'
     ]
     ordering = ['-timestamp']
     
@@ -31,7 +44,7 @@ class WhatsAppMessageAdmin(admin.ModelAdmin):
             'fields': ('message_id', 'wamid', 'from_number', 'from_name', 'message_type', 'status')
         }),
         ('Content', {
-            'fields': ('text_body', 'media_id', 'media_mime_type', 'media_url', 'media_caption')
+            'fields': ('text_body', 'media_id', 'media_mime_type', 'media_url', 'media_caption', 'media_file', 'media_thumbnail')
         }),
         ('Location', {
             'fields': ('latitude', 'longitude', 'location_name', 'location_address'),
@@ -59,12 +72,17 @@ class WhatsAppMessageAdmin(admin.ModelAdmin):
         """Display media preview with clickable link"""
         if obj.media_url:
             if obj.message_type == 'image':
+                # The prefetched thumbnail is a few KB; fall back to the full image
+                if obj.media_thumbnail:
+                    src = reverse('whatsapp-media-thumbnail', args=[obj.media_id])
+                else:
+                    src = obj.media_url
                 return format_html(
                     '<a href="{}" target="_blank">'
                     '<img src="{}" style="max-width:100px; max-height:100px; border-radius:5px;" />'
                     '</a>',
                     obj.media_url,
-                    obj.media_url
+                    src
                 )
             elif obj.message_type in ['video', 'audio', 'document']:
                 return format_html(
@@ -77,7 +95,7 @@ class WhatsAppMessageAdmin(admin.ModelAdmin):
 
 
 @admin.register(WhatsAppMessageStatus)
-class WhatsAppMessageStatusAdmin(admin.ModelAdmin):
+class WhatsAppMessageStatusAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ['message_id', 'recipient_number', 'status', 'timestamp', 'error_code']
     list_filter = ['status', 'timestamp']
     search_fields = ['message_id', 'recipient_number']
@@ -86,7 +104,7 @@ class WhatsAppMessageStatusAdmin(admin.ModelAdmin):
 
 
 @admin.register(WhatsAppConversation)
-class WhatsAppConversationAdmin(admin.ModelAdmin):
+class WhatsAppConversationAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = [
         'phone_number', 
         'contact_name', 
@@ -96,7 +114,10 @@ class WhatsAppConversationAdmin(admin.ModelAdmin):
     ]
     list_filter = ['last_message_at']
     search_fields = ['phone_number', 'contact_name', 'customer_email']
-    readonly_fields = ['phone_number', 'message_count', 'created_at', 'updated_at']
+    readonly_fields = [
+        'phone_number', 'message_count', 'last_message_id', 'last_message_type', 'last_message_preview',
+        'created_at', 'updated_at',
+    ]
     
     fieldsets = (
         ('Contact Info', {
@@ -105,6 +126,9 @@ class WhatsAppConversationAdmin(admin.ModelAdmin):
         ('Message Stats', {
             'fields': ('message_count', 'unread_count', 'last_message_at')
         }),
+        ('Last Message', {
+            'fields': ('last_message_id', 'last_message_type', 'last_message_preview'),
+        }),
         ('Notes', {
             'fields': ('notes',)
         }),
@@ -112,3 +136,42 @@ class WhatsAppConversationAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at'),
         }),
     )
+
+
+@admin.register(WhatsAppDailyRollup)
+class WhatsAppDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['day', 'phone_number', 'message_type', 'message_count', 'last_message_at']
+    list_filter = ['message_type', 'day']
+    search_fields = ['phone_number']
+    readonly_fields = ['day', 'phone_number', 'message_type', 'message_count', 'first_message_at', 'last_message_at']
+    ordering = ['-day']
+
+
+@admin.register(WhatsAppArchiveChunk)
+class WhatsAppArchiveChunkAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'phone_number', 'month', 'row_count', 'first_timestamp', 'last_timestamp', 'archived_at']
+    list_filter = ['kind', 'month']
+    search_fields = ['phone_number']
+    # The compressed payload isn't useful in the admin; read it via /api/whatsapp/messages/archive/
+    exclude = ['data']
+    readonly_fields = ['kind', 'phone_number', 'month', 'row_count', 'first_timestamp', 'last_timestamp', 'archived_at']
+    ordering = ['-last_timestamp']
+
+
+class BroadcastRecipientInline(admin.TabularInline):
+    model = BroadcastRecipient
+    fields = ['phone_number', 'status', 'message_id', 'sent_at', 'error']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    show_change_link = False
+
+
+@admin.register(BroadcastCampaign)
+class BroadcastCampaignAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'template_name', 'status', 'created_at', 'completed_at']
+    list_filter = ['status', 'template_name']
+    search_fields = ['name', 'template_name']
+    readonly_fields = ['status', 'created_at', 'started_at', 'completed_at']
+    ordering = ['-created_at']
+    inlines = [BroadcastRecipientInline]
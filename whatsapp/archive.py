@@ -0,0 +1,121 @@
+"""
+Archival of old WhatsApp messages and statuses
+
+Rows older than a cutoff are moved into ``WhatsAppArchiveChunk`` in bounded
+batches: each batch reads up to ``batch_size`` rows, writes one compressed
+chunk per phone number and month, and deletes the rows, all in one short
+transaction. Conversation counters and the daily rollups are maintained at
+ingestion time, so they are unaffected. Cached media files of archived
+messages are deleted once the batch commits.
+"""
+
+import json
+import zlib
+from datetime import date, datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .media_cache import discard_media
+from .models import WhatsAppArchiveChunk, WhatsAppMessage, WhatsAppMessageStatus
+
+# kind -> (model, field holding the customer's phone number)
+ARCHIVED_MODELS = {
+    'message': (WhatsAppMessage, 'from_number'),
+    'status': (WhatsAppMessageStatus, 'recipient_number'),
+}
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder truncates datetimes to milliseconds; keep them exact"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_rows(rows):
+    return json.dumps(rows, cls=ArchiveJSONEncoder, separators=(',', ':')).encode()
+
+
+def decompress_rows(data):
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def archive_batch(kind, cutoff, batch_size):
+    """
+    Move up to ``batch_size`` rows with a timestamp before ``cutoff`` into
+    archive chunks
+
+    Returns (rows archived, uncompressed bytes, compressed bytes).
+    """
+    model, phone_field = ARCHIVED_MODELS[kind]
+    with transaction.atomic():
+        rows = list(model.objects.filter(timestamp__lt=cutoff).order_by('id').values()[:batch_size])
+        if not rows:
+            return 0, 0, 0
+
+        groups = {}
+        for row in rows:
+            month = date(row['timestamp'].year, row['timestamp'].month, 1)
+            groups.setdefault((row[phone_field], month), []).append(row)
+
+        chunks = []
+        raw_bytes = 0
+        for (phone_number, month), group in groups.items():
+            encoded = encode_rows(group)
+            raw_bytes += len(encoded)
+            chunks.append(WhatsAppArchiveChunk(
+                kind=kind,
+                phone_number=phone_number,
+                month=month,
+                row_count=len(group),
+                first_timestamp=min(row['timestamp'] for row in group),
+                last_timestamp=max(row['timestamp'] for row in group),
+                data=zlib.compress(encoded),
+            ))
+        WhatsAppArchiveChunk.objects.bulk_create(chunks)
+        model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        if kind == 'message':
+            file_names = {field: [row[field] for row in rows] for field in ('media_file', 'media_thumbnail')}
+            transaction.on_commit(lambda: discard_media(file_names))
+
+    return len(rows), raw_bytes, sum(len(chunk.data) for chunk in chunks)
+
+
+def archived_rows(kind, phone_number, before=None, limit=100):
+    """
+    Return up to ``limit`` archived rows for a phone number as unsaved model
+    instances, newest first
+
+    Only the chunks needed to fill ``limit`` are read and decompressed.
+    """
+    model, _ = ARCHIVED_MODELS[kind]
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+
+    chunks = WhatsAppArchiveChunk.objects.filter(kind=kind, phone_number=phone_number)
+    if before is not None:
+        chunks = chunks.filter(first_timestamp__lt=before)
+
+    results = []
+    for chunk in chunks.order_by('-last_timestamp').only('data', 'last_timestamp').iterator(chunk_size=20):
+        # Chunks from different runs can overlap in time; stop once no
+        # remaining chunk can hold anything newer than the rows already kept
+        if len(results) >= limit:
+            results.sort(key=_newest_first)
+            del results[limit:]
+            if results[-1].timestamp >= chunk.last_timestamp:
+                break
+
+        for row in decompress_rows(chunk.data):
+            instance = model(**{name: fields[name].to_python(value) for name, value in row.items() if name in fields})
+            if before is None or instance.timestamp < before:
+                results.append(instance)
+
+    results.sort(key=_newest_first)
+    return results[:limit]
+
+
+def _newest_first(instance):
+    return (-instance.timestamp.timestamp(), -instance.id)
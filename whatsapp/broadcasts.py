@@ -0,0 +1,222 @@
+"""
+Broadcast campaigns: one template message to many customers
+
+``create_campaign`` stores the recipients and ``start_campaign`` sends them
+in the background once the transaction commits. Sends go through the bulk
+lane of ``bbdBackend.outbound``, so they stay under the phone number's rate
+and bill notifications overtake them. Recipients are submitted
+``BATCH_SIZE`` at a time and their outcome saved after each batch, so a
+restart loses at most one batch of results; ``manage.py send_broadcasts``
+resumes unfinished campaigns.
+
+Each batch is claimed (status ``sending``) before it is sent, so a campaign
+resumed while a worker is still sending it doesn't message anyone twice.
+A claim older than ``CLAIM_TIMEOUT`` belongs to a sender that died and is
+taken over.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from bbdBackend.graph import graph_url
+from bbdBackend.outbound import BULK, get_scheduler
+from bbdBackend.phone import to_e164, whatsapp_id
+
+from .models import BroadcastCampaign, BroadcastRecipient
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+# Far longer than a batch takes to send at the bulk rate
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def normalize_phone_number(phone_number):
+    """
+    Return the number as digits in international format, or None if it
+    isn't a plausible phone number
+    """
+    e164 = to_e164(phone_number)
+    return None if e164 is None else whatsapp_id(e164)
+
+
+def create_campaign(template_name, phone_numbers, language='en', components=None, name=''):
+    """
+    Create a campaign with one recipient per distinct phone number
+    """
+    campaign = BroadcastCampaign.objects.create(
+        name=name, template_name=template_name, language=language, components=components or [],
+    )
+    numbers = dict.fromkeys(phone_numbers)
+    BroadcastRecipient.objects.bulk_create(
+        [BroadcastRecipient(campaign=campaign, phone_number=number) for number in numbers],
+        batch_size=500,
+    )
+    return campaign
+
+
+def _get_executor():
+    # One campaign at a time per process; created on first use (gunicorn preload)
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='broadcast')
+        return _executor
+
+
+def start_campaign(campaign):
+    """
+    Send the campaign in the background after the current transaction commits
+    """
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_background, campaign.pk))
+
+
+def _run_in_background(campaign_id):
+    try:
+        run_campaign(campaign_id)
+    except Exception:
+        logger.exception(f'Broadcast campaign {campaign_id} failed')
+    finally:
+        # Connections are per thread; don't leave this one open
+        connections.close_all()
+
+
+def build_broadcast_request(campaign, phone_number):
+    """
+    Build the Graph API url, headers and template payload for one recipient
+
+    Returns None when WhatsApp credentials are not configured.
+    """
+    whatsapp_token = os.getenv('WHATSAPP_ACCESS_TOKEN')
+    phone_number_id = os.getenv('WHATSAPP_PHONE_NUMBER_ID')
+    if not all([whatsapp_token, phone_number_id]):
+        return None
+
+    template = {'name': campaign.template_name, 'language': {'code': campaign.language}}
+    if campaign.components:
+        template['components'] = campaign.components
+    return {
+        'url': graph_url(f'v22.0/{phone_number_id}/messages'),
+        'json': {
+            'messaging_product': 'whatsapp',
+            'to': phone_number,
+            'type': 'template',
+            'template': template,
+        },
+        'headers': {
+            'Authorization': f'Bearer {whatsapp_token}',
+            'Content-Type': 'application/json',
+        },
+        'phone_number_id': phone_number_id,
+    }
+
+
+def _record_result(recipient, future):
+    try:
+        response = future.result()
+    except Exception as e:
+        recipient.status = 'failed'
+        recipient.error = str(e)
+        return
+
+    if response.status_code == 200:
+        recipient.status = 'sent'
+        recipient.message_id = response.json()['messages'][0]['id']
+        recipient.sent_at = timezone.now()
+    else:
+        recipient.status = 'failed'
+        recipient.error = f'{response.status_code}: {response.text[:1000]}'
+
+
+def claim_batch(campaign, batch_size=BATCH_SIZE):
+    """
+    Mark up to ``batch_size`` unsent recipients of a campaign as being sent
+    by this caller and return them
+
+    Rows another sender holds locked are skipped, and once claimed they no
+    longer match, so concurrent senders get disjoint batches.
+    """
+    now = timezone.now()
+    unsent = Q(status='pending') | Q(status='sending', claimed_at__lt=now - CLAIM_TIMEOUT)
+    with transaction.atomic():
+        batch = list(
+            campaign.recipients.filter(unsent).order_by('id').select_for_update(skip_locked=True)[:batch_size]
+        )
+        BroadcastRecipient.objects.filter(pk__in=[recipient.pk for recipient in batch]).update(
+            status='sending', claimed_at=now,
+        )
+    return batch
+
+
+def run_campaign(campaign_id, batch_size=BATCH_SIZE):
+    """
+    Send every pending recipient of a campaign and return the number sent
+    """
+    campaign = BroadcastCampaign.objects.get(pk=campaign_id)
+    if build_broadcast_request(campaign, '') is None:
+        logger.error('WhatsApp credentials not configured; broadcast not sent')
+        return 0
+
+    BroadcastCampaign.objects.filter(pk=campaign.pk, started_at__isnull=True).update(started_at=timezone.now())
+    BroadcastCampaign.objects.filter(pk=campaign.pk).update(status='sending')
+
+    scheduler = get_scheduler()
+    sent = 0
+    while True:
+        batch = claim_batch(campaign, batch_size)
+        if not batch:
+            break
+
+        futures = [
+            scheduler.submit(build_broadcast_request(campaign, recipient.phone_number), app='whatsapp', priority=BULK)
+            for recipient in batch
+        ]
+        for recipient, future in zip(batch, futures):
+            _record_result(recipient, future)
+        BroadcastRecipient.objects.bulk_update(batch, ['status', 'message_id', 'error', 'sent_at'])
+        sent += sum(recipient.status == 'sent' for recipient in batch)
+        logger.info(f'Broadcast {campaign.pk}: {sent} sent so far')
+
+    # Another sender may still be finishing its batch; it completes the campaign then
+    if not campaign.recipients.filter(status__in=['pending', 'sending']).exists():
+        BroadcastCampaign.objects.filter(pk=campaign.pk).update(status='completed', completed_at=timezone.now())
+    return sent
+
+
+def campaigns_with_counts():
+    """
+    Campaigns annotated with their recipient counts by status
+    """
+    return BroadcastCampaign.objects.annotate(**{
+        f'{status}_count': Count('recipients', filter=Q(recipients__status=status))
+        for status, _ in BroadcastRecipient.STATUS_CHOICES
+    })
+
+
+def campaign_summary(campaign):
+    """
+    JSON-ready fields of a campaign from ``campaigns_with_counts``
+    """
+    return {
+        'id': campaign.pk,
+        'name': campaign.name,
+        'template_name': campaign.template_name,
+        'language': campaign.language,
+        'status': campaign.status,
+        'created_at': campaign.created_at,
+        'started_at': campaign.started_at,
+        'completed_at': campaign.completed_at,
+        'recipients': {
+            status: getattr(campaign, f'{status}_count') for status, _ in BroadcastRecipient.STATUS_CHOICES
+        },
+    }
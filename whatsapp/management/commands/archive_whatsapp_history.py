@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from whatsapp.archive import ARCHIVED_MODELS, archive_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Move WhatsApp messages and statuses older than --days into compressed "
+        "archive chunks, in short batches that can run while the webhook is live"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.WHATSAPP_ARCHIVE_AFTER_DAYS,
+            help='archive rows older than this many days (default: WHATSAPP_ARCHIVE_AFTER_DAYS)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='rows per batch')
+        parser.add_argument('--sleep', type=float, default=0.1, help='seconds to pause between batches')
+        parser.add_argument(
+            '--kind', choices=list(ARCHIVED_MODELS), action='append',
+            help='only archive this kind (repeatable; default: all)',
+        )
+
+    def handle(self, *args, **options):
+        # Cut at midnight UTC so each day is either fully archived or fully
+        # live, which backfill_message_rollups relies on
+        cutoff_day = timezone.now().date() - timedelta(days=options['days'])
+        cutoff = datetime.combine(cutoff_day, dt_time.min, tzinfo=dt_timezone.utc)
+        self.stdout.write(f"Archiving rows before {cutoff:%Y-%m-%d %H:%M} UTC")
+
+        for kind in options['kind'] or ARCHIVED_MODELS:
+            archived = raw_bytes = compressed_bytes = 0
+            started = time.perf_counter()
+            while True:
+                count, raw, compressed = archive_batch(kind, cutoff, options['batch_size'])
+                if not count:
+                    break
+                archived += count
+                raw_bytes += raw
+                compressed_bytes += compressed
+                self.stdout.write(f"  {kind}: {archived} rows archived")
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+
+            elapsed = time.perf_counter() - started
+            ratio = raw_bytes / compressed_bytes if compressed_bytes else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {archived} {kind} rows in {elapsed:.1f}s "
+                f"({raw_bytes} bytes of JSON stored in {compressed_bytes}, {ratio:.1f}x)"
+            ))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from whatsapp.models import WhatsAppConversation
+from whatsapp.serializers import latest_messages_by_phone
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the last-message snapshot of conversations created before the columns existed, "
+        "in bounded id-range batches. Conversations the webhook has updated since are skipped, "
+        "so it can run while serving."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='conversation ids per batch')
+        parser.add_argument('--sleep', type=float, default=0, help='seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = WhatsAppConversation.objects.filter(last_message_id='')
+        max_id = pending.aggregate(max_id=Max('id'))['max_id'] or 0
+
+        updated = empty = 0
+        started = time.perf_counter()
+        for low in range(0, max_id, batch_size):
+            high = min(low + batch_size, max_id)
+            phones = list(pending.filter(id__gt=low, id__lte=high).values_list('phone_number', flat=True))
+            latest = latest_messages_by_phone(phones, per_phone=1)
+            with transaction.atomic():
+                for phone, messages in latest.items():
+                    if not messages:
+                        # Everything was archived; nothing to show
+                        empty += 1
+                        continue
+                    message = messages[0]
+                    # Only while still empty, so a snapshot set by the webhook meanwhile wins
+                    updated += pending.filter(phone_number=phone).update(
+                        last_message_id=message.message_id,
+                        last_message_type=message.message_type,
+                        last_message_preview=message.preview(),
+                    )
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {updated} conversations ({empty} without messages) in {time.perf_counter() - started:.1f}s"
+        ))
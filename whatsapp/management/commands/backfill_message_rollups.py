@@ -0,0 +1,77 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from bbdBackend.upserts import day_batches, day_range_filter, lock_for_rebuild
+from whatsapp.models import WhatsAppDailyRollup, WhatsAppMessage
+from whatsapp.rollups import add_to_rollups
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild WhatsAppDailyRollup from WhatsAppMessage a range of days at a time. Each range is "
+        "replaced in one short transaction; messages ingested meanwhile are counted exactly once. "
+        "Rollups for days that have been archived are kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='messages per batch (whole days)')
+        parser.add_argument('--sleep', type=float, default=0, help='seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        day_counts = list(
+            WhatsAppMessage.objects.annotate(day=TruncDate('timestamp'))
+            .values_list('day').annotate(count=Count('id')).order_by('day')
+        )
+        # Days before the oldest remaining message were archived whole, so
+        # their rollups can't be rebuilt and are kept
+        oldest = day_counts[0][0] - timedelta(days=1) if day_counts else None
+
+        processed = 0
+        started = time.perf_counter()
+        for after, through in day_batches(day_counts, options['batch_size']):
+            after = after or oldest
+            # The webhook waits on the lock while this range is replaced and
+            # adds its messages afterwards, so none is lost or counted twice
+            with transaction.atomic():
+                lock_for_rebuild(WhatsAppDailyRollup)
+                processed += self._rebuild_days(after, through)
+            self.stdout.write(f"  days {after or 'start'} - {through or 'end'}: {processed} messages rolled up")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {processed} messages in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def _rebuild_days(self, after, through):
+        # Delete first: on SQLite that takes the write lock before reading
+        WhatsAppDailyRollup.objects.filter(**day_range_filter('day', after, through)).delete()
+
+        messages = WhatsAppMessage.objects.all()
+        if after is not None:
+            messages = messages.filter(timestamp__gte=start_of_day(after + timedelta(days=1)))
+        if through is not None:
+            messages = messages.filter(timestamp__lt=start_of_day(through + timedelta(days=1)))
+        rows = (
+            messages
+            .annotate(day=TruncDate('timestamp'))
+            .values('day', 'from_number', 'message_type')
+            .annotate(count=Count('id'), first_at=Min('timestamp'), last_at=Max('timestamp'))
+            .order_by()
+        )
+        rows = [
+            (row['day'], row['from_number'], row['message_type'], row['count'], row['first_at'], row['last_at'])
+            for row in rows
+        ]
+        add_to_rollups(rows)
+        return sum(row[3] for row in rows)
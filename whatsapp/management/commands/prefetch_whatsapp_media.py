@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from whatsapp.media_cache import PREFETCH_TYPES, prefetch_media
+from whatsapp.models import WhatsAppMessage
+
+
+class Command(BaseCommand):
+    help = (
+        "Download media that the background prefetch missed (e.g. queued when a worker restarted). "
+        "Graph API media URLs expire, so only recent messages are tried."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=25, help='only messages from the last N days')
+        parser.add_argument('--limit', type=int, default=500, help='max media files per run')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        media_ids = list(
+            WhatsAppMessage.objects
+            .filter(message_type__in=PREFETCH_TYPES, timestamp__gte=since, media_file='', media_id__isnull=False)
+            .order_by('-timestamp')
+            .values_list('media_id', flat=True)
+            .distinct()[:options['limit']]
+        )
+
+        cached = 0
+        for media_id in media_ids:
+            if prefetch_media(media_id):
+                cached += 1
+        self.stdout.write(self.style.SUCCESS(f"Cached {cached} of {len(media_ids)} missing media files"))
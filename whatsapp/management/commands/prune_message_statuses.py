@@ -0,0 +1,93 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Case, IntegerField, Max, OuterRef, Subquery, Sum, TextField, Value, When
+from django.db.models.functions import Cast, Coalesce, Length
+from django.utils import timezone
+
+from whatsapp.models import WhatsAppMessageStatus
+
+# Later stages win; failed and read are terminal
+STATUS_RANK = Case(
+    When(status='failed', then=Value(3)),
+    When(status='read', then=Value(2)),
+    When(status='delivered', then=Value(1)),
+    default=Value(0),
+    output_field=IntegerField(),
+)
+
+# Approximate on-disk size of the columns that vary per row
+ROW_BYTES = (
+    Coalesce(Length(Cast('raw_payload', TextField())), 0)
+    + Coalesce(Length('error_message'), 0)
+    + Length('message_id')
+    + Length('recipient_number')
+    + Length('status')
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete all but the terminal status of each message for statuses older than --days, "
+        "in throttled id-range batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.WHATSAPP_STATUS_RETENTION_DAYS,
+            help='prune statuses older than this many days (default: WHATSAPP_STATUS_RETENTION_DAYS)',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='status ids per batch')
+        parser.add_argument('--sleep', type=float, default=0.5, help='seconds to pause between batches')
+        parser.add_argument('--drop-payloads', action='store_true', help='also clear raw_payload on the kept statuses')
+        parser.add_argument('--vacuum', action='store_true', help='VACUUM ANALYZE the table afterwards (PostgreSQL)')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        max_id = WhatsAppMessageStatus.objects.filter(timestamp__lt=cutoff).aggregate(max_id=Max('id'))['max_id'] or 0
+        self.stdout.write(f"Pruning statuses before {cutoff:%Y-%m-%d %H:%M} up to id {max_id}")
+
+        # The most advanced (then latest) status of each message is kept
+        terminal_id = Subquery(
+            WhatsAppMessageStatus.objects
+            .filter(message_id=OuterRef('message_id'))
+            .annotate(rank=STATUS_RANK)
+            .order_by('-rank', '-timestamp', '-id')
+            .values('id')[:1]
+        )
+
+        deleted = cleared = reclaimed = 0
+        started = time.perf_counter()
+        for low in range(0, max_id, batch_size):
+            high = min(low + batch_size, max_id)
+            old = WhatsAppMessageStatus.objects.filter(id__gt=low, id__lte=high, timestamp__lt=cutoff)
+            prunable = old.exclude(id=terminal_id)
+
+            reclaimed += prunable.aggregate(size=Sum(ROW_BYTES))['size'] or 0
+            batch_deleted, _ = prunable.delete()
+            deleted += batch_deleted
+
+            if options['drop_payloads']:
+                kept = old.filter(raw_payload__isnull=False)
+                reclaimed += kept.aggregate(size=Sum(Length(Cast('raw_payload', TextField()))))['size'] or 0
+                cleared += kept.update(raw_payload=None)
+
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  ids {low + 1}-{high}: {deleted} deleted ({deleted / elapsed:.0f} rows/s)")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} statuses, cleared {cleared} payloads in {elapsed:.1f}s "
+            f"({deleted / elapsed if elapsed else 0:.0f} rows/s, ~{reclaimed / 1024:.0f} KiB reclaimed)"
+        ))
+
+        if options['vacuum'] and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'VACUUM ANALYZE {connection.ops.quote_name(WhatsAppMessageStatus._meta.db_table)}')
+            self.stdout.write("Vacuumed the status table")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from whatsapp.broadcasts import run_campaign
+from whatsapp.models import BroadcastCampaign
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the pending recipients of unfinished broadcast campaigns, e.g. after a restart "
+        "interrupted the background sender. Recipients a running sender has claimed are left to it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_ids', nargs='*', type=int, help='only these campaigns (default: all unfinished)')
+
+    def handle(self, *args, **options):
+        campaigns = BroadcastCampaign.objects.exclude(status='completed').order_by('created_at')
+        if options['campaign_ids']:
+            campaigns = campaigns.filter(pk__in=options['campaign_ids'])
+
+        for campaign_id in campaigns.values_list('pk', flat=True):
+            sent = run_campaign(campaign_id)
+            self.stdout.write(self.style.SUCCESS(f"Campaign {campaign_id}: sent {sent} messages"))
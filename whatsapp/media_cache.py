@@ -0,0 +1,330 @@
+"""
+Background prefetch of WhatsApp media into local storage
+
+Graph API media URLs expire, so the webhook hands new image, video and
+document ids to a small thread pool once the messages are committed. Each
+file is downloaded once into ``WhatsAppMessage.media_file``; images also get a
+JPEG thumbnail in ``media_thumbnail``, which the admin list shows instead of
+the full-size file. The media proxy serves cached files without calling the
+Graph API.
+
+Queued ids are lost if the worker restarts; ``manage.py prefetch_whatsapp_media``
+picks up anything that wasn't cached.
+
+Files of messages that are archived are deleted with them (``discard_media``).
+
+Proxy misses and prefetches go through ``fetch_media``/``afetch_media``, which
+coalesce concurrent requests for one media id into a single Graph API fetch.
+"""
+
+import io
+import logging
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+
+from bbdBackend.graph import agraph_request, graph_request, graph_url
+from bbdBackend.singleflight import AsyncSingleFlight, SingleFlight, afile_lock, file_lock
+
+from .models import WhatsAppMessage
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_TYPES = ('image', 'video', 'document')
+THUMBNAIL_SIZE = (200, 200)
+LOCK_STRIPES = 256
+
+MIME_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'video/mp4': '.mp4',
+    'audio/ogg': '.ogg',
+    'audio/mpeg': '.mp3',
+    'application/pdf': '.pdf',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_flights = SingleFlight()
+_aflights = AsyncSingleFlight()
+
+
+def extension_for(mime_type):
+    """Get file extension from MIME type"""
+    return MIME_EXTENSIONS.get(mime_type, '')
+
+
+def _get_executor():
+    # Created on first use rather than at import, so gunicorn's preloading
+    # master doesn't start threads that its forked workers wouldn't inherit
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.WHATSAPP_MEDIA_PREFETCH_WORKERS, thread_name_prefix='media-prefetch'
+            )
+        return _executor
+
+
+def enqueue_prefetch(messages):
+    """
+    Queue the media of newly saved messages for download after the
+    current transaction commits
+    """
+    media_ids = [
+        message.media_id for message in messages
+        if message.media_id and message.message_type in PREFETCH_TYPES
+    ]
+    if media_ids and settings.WHATSAPP_MEDIA_PREFETCH:
+        transaction.on_commit(lambda: _get_executor().submit(_prefetch_in_background, media_ids))
+
+
+def _prefetch_in_background(media_ids):
+    try:
+        for media_id in media_ids:
+            try:
+                prefetch_media(media_id)
+            except Exception:
+                logger.exception(f'Prefetching media {media_id} failed')
+    finally:
+        # Connections are per thread; don't leave this one open
+        connections.close_all()
+
+
+def _metadata_key(media_id):
+    return f'whatsapp-media-metadata:{media_id}'
+
+
+def _graph_headers():
+    return {'Authorization': f"Bearer {os.getenv('WHATSAPP_ACCESS_TOKEN')}"}
+
+
+def _parse_metadata(response):
+    if response.status_code != 200 or not response.json().get('url'):
+        return None
+    media_data = response.json()
+    return {'url': media_data['url'], 'mime_type': media_data.get('mime_type', 'application/octet-stream')}
+
+
+def download_media(media_id):
+    """
+    Fetch a media file from the Graph API
+
+    The resolved download URL is cached for ``WHATSAPP_MEDIA_URL_TTL``
+    seconds (Meta's URLs expire after five minutes); a stale URL is
+    resolved again once. Returns (content, mime_type), or None if the media
+    isn't available.
+    """
+    headers = _graph_headers()
+    metadata = cache.get(_metadata_key(media_id))
+    for attempt in ('cached', 'fresh') if metadata else ('fresh',):
+        if attempt == 'fresh':
+            metadata = _parse_metadata(graph_request(
+                'GET', graph_url(f'v21.0/{media_id}'), app='whatsapp', endpoint='media_metadata', headers=headers
+            ))
+            if metadata is None:
+                return None
+            cache.set(_metadata_key(media_id), metadata, settings.WHATSAPP_MEDIA_URL_TTL)
+
+        media_response = graph_request(
+            'GET', metadata['url'], app='whatsapp', endpoint='media_download', headers=headers
+        )
+        if media_response.status_code == 200:
+            return media_response.content, metadata['mime_type']
+        cache.delete(_metadata_key(media_id))
+    return None
+
+
+async def adownload_media(media_id):
+    """
+    Async version of ``download_media`` using the pooled client
+    """
+    headers = _graph_headers()
+    metadata = await cache.aget(_metadata_key(media_id))
+    for attempt in ('cached', 'fresh') if metadata else ('fresh',):
+        if attempt == 'fresh':
+            metadata = _parse_metadata(await agraph_request(
+                'GET', graph_url(f'v21.0/{media_id}'), app='whatsapp', endpoint='media_metadata', headers=headers
+            ))
+            if metadata is None:
+                return None
+            await cache.aset(_metadata_key(media_id), metadata, settings.WHATSAPP_MEDIA_URL_TTL)
+
+        media_response = await agraph_request(
+            'GET', metadata['url'], app='whatsapp', endpoint='media_download', headers=headers
+        )
+        if media_response.status_code == 200:
+            return media_response.content, metadata['mime_type']
+        await cache.adelete(_metadata_key(media_id))
+    return None
+
+
+def _lock_name(media_id):
+    # A fixed set of lock files rather than one per media id, so they don't pile up
+    return f'media-{zlib.crc32(media_id.encode()) % LOCK_STRIPES}'
+
+
+def fetch_media(media_id):
+    """
+    Return (content, mime_type, shared) for a media file, or None
+
+    Concurrent calls for one id share a single upstream fetch: threads in
+    this process wait on the leader (``shared`` is True for them), and other
+    workers wait on the lock file and then find the file in storage.
+    """
+    result, shared = _flights.do(media_id, lambda: _fetch_media_locked(media_id))
+    return None if result is None else (*result, shared)
+
+
+def _fetch_media_locked(media_id):
+    with file_lock(settings.WHATSAPP_MEDIA_LOCK_DIR, _lock_name(media_id)):
+        stored = read_stored(media_id)
+        if stored is not None:
+            return stored
+        result = download_media(media_id)
+        if result is not None:
+            store_media(media_id, *result)
+        return result
+
+
+async def afetch_media(media_id):
+    """
+    Async version of ``fetch_media`` for the ASGI views
+    """
+    result, shared = await _aflights.do(media_id, lambda: _afetch_media_locked(media_id))
+    return None if result is None else (*result, shared)
+
+
+async def _afetch_media_locked(media_id):
+    async with afile_lock(settings.WHATSAPP_MEDIA_LOCK_DIR, _lock_name(media_id)):
+        stored = await sync_to_async(read_stored)(media_id)
+        if stored is not None:
+            return stored
+        result = await adownload_media(media_id)
+        if result is not None:
+            await sync_to_async(store_media)(media_id, *result)
+        return result
+
+
+def make_thumbnail(content):
+    """
+    Return JPEG bytes of an image scaled to fit ``THUMBNAIL_SIZE``, or None
+    if Pillow is missing or the image can't be decoded
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            output = io.BytesIO()
+            image.convert('RGB').save(output, format='JPEG', quality=80, optimize=True)
+    except Exception as e:
+        logger.warning(f'Could not create thumbnail: {e}')
+        return None
+    return output.getvalue()
+
+
+def store_media(media_id, content, mime_type):
+    """
+    Save a downloaded file (and a thumbnail for images) on every message
+    carrying this media id
+
+    Nothing is stored for ids no message refers to.
+    """
+    if not WhatsAppMessage.objects.filter(media_id=media_id).exists():
+        return
+
+    media_field = WhatsAppMessage._meta.get_field('media_file')
+    thumbnail_field = WhatsAppMessage._meta.get_field('media_thumbnail')
+    updates = {
+        'media_file': media_field.storage.save(
+            media_field.generate_filename(None, f'{media_id}{extension_for(mime_type)}'), ContentFile(content)
+        ),
+    }
+    if mime_type.startswith('image/'):
+        thumbnail = make_thumbnail(content)
+        if thumbnail is not None:
+            updates['media_thumbnail'] = thumbnail_field.storage.save(
+                thumbnail_field.generate_filename(None, f'{media_id}.jpg'), ContentFile(thumbnail)
+            )
+
+    WhatsAppMessage.objects.filter(media_id=media_id).update(**updates)
+    logger.info(f'Stored media {media_id} ({len(content)} bytes)')
+
+
+def prefetch_media(media_id):
+    """
+    Download a media file (and thumbnail for images) into storage
+
+    Returns True if the file is cached afterwards.
+    """
+    if WhatsAppMessage.objects.filter(media_id=media_id).exclude(media_file='').exists():
+        return True
+    if fetch_media(media_id) is None:
+        logger.warning(f'Media {media_id} is no longer available for prefetch')
+        return False
+    return True
+
+
+def discard_media(file_names):
+    """
+    Delete stored media files and thumbnails (names as stored in
+    ``media_file``/``media_thumbnail``) that no message refers to any more
+    """
+    for field_name in ('media_file', 'media_thumbnail'):
+        names = {name for name in file_names.get(field_name, ()) if name}
+        if not names:
+            continue
+        # Messages sharing a media id share its files
+        names -= set(WhatsAppMessage.objects.filter(**{f'{field_name}__in': names}).values_list(field_name, flat=True))
+        storage = WhatsAppMessage._meta.get_field(field_name).storage
+        for name in names:
+            try:
+                storage.delete(name)
+            except OSError as e:
+                logger.warning(f'Could not delete cached media {name}: {e}')
+
+
+def read_stored(media_id):
+    """
+    Return (content, mime_type) of a stored file, or None
+    """
+    cached = open_cached(media_id)
+    if cached is None:
+        return None
+    fh, mime_type = cached
+    with fh:
+        return fh.read(), mime_type
+
+
+def open_cached(media_id, thumbnail=False):
+    """
+    Return (file, mime_type) for cached media, or None if not cached
+    """
+    field = 'media_thumbnail' if thumbnail else 'media_file'
+    cached = (
+        WhatsAppMessage.objects.filter(media_id=media_id).exclude(**{field: ''})
+        .values_list(field, 'media_mime_type').first()
+    )
+    if cached is None:
+        return None
+
+    name, mime_type = cached
+    storage = WhatsAppMessage._meta.get_field(field).storage
+    try:
+        fh = storage.open(name, 'rb')
+    except FileNotFoundError:
+        return None
+    return fh, 'image/jpeg' if thumbnail else (mime_type or 'application/octet-stream')
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('phone_number', models.CharField(max_length=20)),
+                ('message_type', models.CharField(max_length=20)),
+                ('message_count', models.IntegerField(default=0)),
+                ('first_message_at', models.DateTimeField()),
+                ('last_message_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['phone_number', 'day'], name='whatsapp_wh_phone_n_2b93b4_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'phone_number', 'message_type'), name='unique_whatsapp_daily_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0002_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppArchiveChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('message', 'Message'), ('status', 'Status')], max_length=10)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('month', models.DateField()),
+                ('row_count', models.IntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('data', models.BinaryField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-last_timestamp'],
+                'indexes': [models.Index(fields=['kind', 'phone_number', '-last_timestamp'], name='whatsapp_wh_kind_001899_idx')],
+            },
+        ),
+    ]
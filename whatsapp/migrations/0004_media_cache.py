@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0003_archive_chunks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='whatsappmessage',
+            name='media_file',
+            field=models.FileField(blank=True, upload_to='whatsapp-media/'),
+        ),
+        migrations.AddField(
+            model_name='whatsappmessage',
+            name='media_thumbnail',
+            field=models.FileField(blank=True, upload_to='whatsapp-media/thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='whatsappmessage',
+            name='media_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('whatsapp', '0006_phone_e164'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='whatsappmessage',
+            name='message_type',
+            field=models.CharField(choices=[('text', 'Text'), ('image', 'Image'), ('audio', 'Audio'), ('video', 'Video'), ('document', 'Document'), ('location', 'Location'), ('contacts', 'Contacts'), ('interactive', 'Interactive'), ('button', 'Button'), ('reaction', 'Reaction'), ('sticker', 'Sticker'), ('order', 'Order'), ('unknown', 'Unknown')], default='text', max_length=20),
+        ),
+    ]
@@ -1,6 +1,12 @@
 from django.db import models
 from django.utils import timezone
 
+from bbdBackend.phone import to_e164
+
+
+# Length of the last-message preview kept on WhatsAppConversation
+PREVIEW_LENGTH = 200
+
 
 class WhatsAppMessage(models.Model):
     """
@@ -15,6 +21,10 @@ class WhatsAppMessage(models.Model):
         ('location', 'Location'),
         ('contacts', 'Contacts'),
         ('interactive', 'Interactive'),
+        ('button', 'Button'),
+        ('reaction', 'Reaction'),
+        ('sticker', 'Sticker'),
+        ('order', 'Order'),
         ('unknown', 'Unknown'),
     ]
     
@@ -30,6 +40,8 @@ class WhatsAppMessage(models.Model):
     
     # Sender information
     from_number = models.CharField(max_length=20, db_index=True)
+    # Canonical form of ``from_number``, shared with bills (see bbdBackend/phone.py)
+    phone_e164 = models.CharField(max_length=16, blank=True, null=True)
     from_name = models.CharField(max_length=255, blank=True, null=True)
     
     # Message content
@@ -37,10 +49,13 @@ class WhatsAppMessage(models.Model):
     text_body = models.TextField(blank=True, null=True)
     
     # Media fields (for images, videos, audio, documents)
-    media_id = models.CharField(max_length=255, blank=True, null=True)
+    media_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     media_mime_type = models.CharField(max_length=100, blank=True, null=True)
     media_url = models.URLField(blank=True, null=True)
     media_caption = models.TextField(blank=True, null=True)
+    # Local copies downloaded in the background (see whatsapp/media_cache.py)
+    media_file = models.FileField(upload_to='whatsapp-media/', blank=True)
+    media_thumbnail = models.FileField(upload_to='whatsapp-media/thumbnails/', blank=True)
     
     # Location fields
     latitude = models.FloatField(blank=True, null=True)
@@ -64,8 +79,21 @@ class WhatsAppMessage(models.Model):
         indexes = [
             models.Index(fields=['-timestamp']),
             models.Index(fields=['from_number', '-timestamp']),
+            models.Index(fields=['phone_e164', '-timestamp']),
         ]
     
+    def save(self, *args, **kwargs):
+        # The webhook bulk-creates messages and sets this itself
+        self.phone_e164 = to_e164(self.from_number, international=True)
+        super().save(*args, **kwargs)
+    
+    def preview(self):
+        """
+        Short text shown for this message in the inbox list
+        """
+        text = self.text_body or self.media_caption or self.location_name or self.location_address or ''
+        return text[:PREVIEW_LENGTH]
+    
     def __str__(self):
         return f"{self.from_number} - {self.message_type} - {self.timestamp}"
 
@@ -107,11 +135,18 @@ class WhatsAppConversation(models.Model):
     Group messages by phone number for easier conversation tracking
     """
     phone_number = models.CharField(max_length=20, unique=True, db_index=True)
+    phone_e164 = models.CharField(max_length=16, blank=True, null=True, db_index=True)
     contact_name = models.CharField(max_length=255, blank=True, null=True)
     last_message_at = models.DateTimeField(default=timezone.now)
     message_count = models.IntegerField(default=0)
     unread_count = models.IntegerField(default=0)
     
+    # Snapshot of the latest message, kept by the webhook so the inbox list
+    # doesn't have to read WhatsAppMessage
+    last_message_id = models.CharField(max_length=255, blank=True, default='')
+    last_message_type = models.CharField(max_length=20, blank=True, default='')
+    last_message_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, default='')
+    
     # Customer info (can be linked to your customer database)
     customer_email = models.EmailField(blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
@@ -121,6 +156,136 @@ class WhatsAppConversation(models.Model):
     
     class Meta:
         ordering = ['-last_message_at']
+        indexes = [
+            models.Index(fields=['-last_message_at']),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.phone_e164 = to_e164(self.phone_number, international=True)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.contact_name or self.phone_number} - {self.message_count} messages"
+
+
+class WhatsAppDailyRollup(models.Model):
+    """
+    Message counts per day, sender and message type
+
+    Maintained incrementally during webhook ingestion so analytics never
+    scan WhatsAppMessage. Rebuild with ``manage.py backfill_message_rollups``.
+    """
+    day = models.DateField()
+    phone_number = models.CharField(max_length=20)
+    message_type = models.CharField(max_length=20)
+    message_count = models.IntegerField(default=0)
+    first_message_at = models.DateTimeField()
+    last_message_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'phone_number', 'message_type'],
+                name='unique_whatsapp_daily_rollup',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['phone_number', 'day']),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} - {self.phone_number} - {self.message_type}: {self.message_count}"
+
+
+class WhatsAppArchiveChunk(models.Model):
+    """
+    zlib-compressed JSON of archived messages or statuses for one phone
+    number and month
+
+    Written by ``manage.py archive_whatsapp_history``; each run adds one chunk
+    per phone and month it touched. Read back with ``whatsapp.archive``.
+    """
+    KINDS = [
+        ('message', 'Message'),
+        ('status', 'Status'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KINDS)
+    phone_number = models.CharField(max_length=20)
+    month = models.DateField()
+    row_count = models.IntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-last_timestamp']
+        indexes = [
+            models.Index(fields=['kind', 'phone_number', '-last_timestamp']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} archive - {self.phone_number} - {self.month:%Y-%m}: {self.row_count} rows"
+
+
+class BroadcastCampaign(models.Model):
+    """
+    A template message sent to many customers through the bulk lane of the
+    outbound scheduler (see ``whatsapp.broadcasts``)
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('completed', 'Completed'),
+    ]
+    
+    name = models.CharField(max_length=255, blank=True)
+    template_name = models.CharField(max_length=512)
+    language = models.CharField(max_length=20, default='en')
+    # Template components sent unchanged to every recipient
+    components = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.name or self.template_name} - {self.status}"
+
+
+class BroadcastRecipient(models.Model):
+    """
+    One customer of a broadcast campaign and the outcome of their send
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    campaign = models.ForeignKey(BroadcastCampaign, on_delete=models.CASCADE, related_name='recipients')
+    phone_number = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # wamid of the sent message; delivery updates arrive as WhatsAppMessageStatus
+    message_id = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+    # When a sender claimed the recipient (status 'sending'), so one that died can be taken over
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'phone_number'], name='unique_broadcast_recipient'),
+        ]
+        indexes = [
+            models.Index(fields=['campaign', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"{self.campaign_id} - {self.phone_number} - {self.status}"
@@ -0,0 +1,243 @@
+"""
+Webhook payload parsing
+
+``parse_change`` turns the ``value`` of one webhook change into compact
+records: ``ParsedMessage`` and ``ParsedStatus`` are ``__slots__``
+dataclasses, so a burst of messages doesn't carry a ``__dict__`` per row
+before it is written. Message content is extracted by the parser
+registered for the message's ``type`` in ``MESSAGE_PARSERS``; a new type
+plugs in with ``@message_parser('<type>')`` without touching the views.
+Types without a parser are still stored (type and raw payload only) and
+logged.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+
+from bbdBackend.phone import to_e164
+
+from .models import WhatsAppMessage, WhatsAppMessageStatus
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_PARSERS = {}
+
+
+def message_parser(*message_types):
+    """
+    Register a function extracting content fields from the type-specific
+    part of a message (``message[type]``) for these message types
+    """
+    def register(parse):
+        for message_type in message_types:
+            MESSAGE_PARSERS[message_type] = parse
+        return parse
+    return register
+
+
+@dataclass(slots=True)
+class ParsedMessage:
+    message_id: str
+    from_number: str
+    timestamp: datetime
+    message_type: str
+    raw: dict = field(repr=False)
+    from_name: str | None = None
+    text_body: str | None = None
+    media_id: str | None = None
+    media_mime_type: str | None = None
+    media_caption: str | None = None
+    latitude: float | None = None
+    longitude: float | None = None
+    location_name: str | None = None
+    location_address: str | None = None
+    context_message_id: str | None = None
+
+    def to_model(self):
+        return WhatsAppMessage(
+            message_id=self.message_id,
+            wamid=f'wamid.{self.message_id}',
+            from_number=self.from_number,
+            phone_e164=to_e164(self.from_number, international=True),
+            from_name=self.from_name,
+            message_type=self.message_type,
+            text_body=self.text_body,
+            media_id=self.media_id,
+            media_mime_type=self.media_mime_type,
+            # Media is proxied on demand, so we only store the proxy URL
+            media_url=f'/api/whatsapp/media/{self.media_id}/' if self.media_id else None,
+            media_caption=self.media_caption,
+            latitude=self.latitude,
+            longitude=self.longitude,
+            location_name=self.location_name,
+            location_address=self.location_address,
+            timestamp=self.timestamp,
+            context_message_id=self.context_message_id,
+            raw_payload=self.raw,
+        )
+
+
+@dataclass(slots=True)
+class ParsedStatus:
+    message_id: str
+    recipient_id: str
+    status: str
+    timestamp: datetime
+    raw: dict = field(repr=False)
+    error_code: int | None = None
+    error_message: str | None = None
+
+    def to_model(self):
+        return WhatsAppMessageStatus(
+            message_id=self.message_id,
+            recipient_number=self.recipient_id,
+            status=self.status,
+            timestamp=self.timestamp,
+            error_code=self.error_code,
+            error_message=self.error_message,
+            raw_payload=self.raw,
+        )
+
+
+@dataclass(slots=True)
+class ParsedChange:
+    messages: list
+    statuses: list
+    # wa_id -> profile name of the senders in this change
+    contact_names: dict
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(int(value), tz=dt_timezone.utc)
+
+
+@message_parser('text')
+def _text(content):
+    return {'text_body': content.get('body')}
+
+
+@message_parser('image', 'video', 'audio', 'document', 'sticker')
+def _media(content):
+    return {
+        'media_id': content.get('id'),
+        'media_mime_type': content.get('mime_type'),
+        'media_caption': content.get('caption', ''),
+    }
+
+
+@message_parser('location')
+def _location(content):
+    return {
+        'latitude': content.get('latitude'),
+        'longitude': content.get('longitude'),
+        'location_name': content.get('name'),
+        'location_address': content.get('address'),
+    }
+
+
+@message_parser('interactive')
+def _interactive(content):
+    reply_type = content.get('type')
+    if reply_type not in ('button_reply', 'list_reply'):
+        return {}
+    return {'text_body': content.get(reply_type, {}).get('title')}
+
+
+@message_parser('button')
+def _button(content):
+    # Quick-reply button of a template message
+    return {'text_body': content.get('text')}
+
+
+@message_parser('reaction')
+def _reaction(content):
+    # An empty emoji removes the reaction
+    return {'text_body': content.get('emoji') or None, 'context_message_id': content.get('message_id')}
+
+
+@message_parser('contacts')
+def _contacts(content):
+    shared = []
+    for contact in content:
+        name = contact.get('name', {}).get('formatted_name', '')
+        phones = ', '.join(phone.get('phone', '') for phone in contact.get('phones', []))
+        shared.append(f'{name} ({phones})' if phones else name)
+    return {'text_body': '; '.join(shared)}
+
+
+@message_parser('order')
+def _order(content):
+    items = content.get('product_items', [])
+    text = f"Order of {sum(int(item.get('quantity', 1)) for item in items)} items"
+    if content.get('text'):
+        text += f": {content['text']}"
+    return {'text_body': text}
+
+
+def parse_message(message, contact_names):
+    """
+    ``ParsedMessage`` for one webhook message; raises on malformed messages
+    """
+    message_type = message.get('type')
+    from_number = message.get('from')
+    record = ParsedMessage(
+        message_id=message.get('id'),
+        from_number=from_number,
+        timestamp=_timestamp(message.get('timestamp')),
+        message_type=message_type,
+        raw=message,
+        from_name=contact_names.get(from_number),
+        context_message_id=message.get('context', {}).get('id'),
+    )
+    parse = MESSAGE_PARSERS.get(message_type)
+    if parse is None:
+        logger.warning(f'No parser for message type {message_type!r}; storing the raw payload only')
+        return record
+    for name, value in parse(message.get(message_type) or {}).items():
+        setattr(record, name, value)
+    return record
+
+
+def parse_status(status_update):
+    """
+    ``ParsedStatus`` for one status update; raises on malformed updates
+    """
+    record = ParsedStatus(
+        message_id=status_update.get('id'),
+        recipient_id=status_update.get('recipient_id'),
+        status=status_update.get('status'),
+        timestamp=_timestamp(status_update.get('timestamp')),
+        raw=status_update,
+    )
+    errors = status_update.get('errors', []) if record.status == 'failed' else []
+    if errors:
+        record.error_code = errors[0].get('code')
+        record.error_message = errors[0].get('title')
+    return record
+
+
+def parse_change(value):
+    """
+    Parse the ``value`` of one webhook change
+
+    Malformed messages and statuses are logged and left out, so one bad
+    entry doesn't drop the rest of the batch.
+    """
+    contact_names = {
+        contact.get('wa_id'): contact.get('profile', {}).get('name')
+        for contact in value.get('contacts', [])
+    }
+    messages = []
+    for message in value.get('messages', []):
+        try:
+            messages.append(parse_message(message, contact_names))
+        except Exception as e:
+            logger.error(f'Error processing message: {str(e)}', exc_info=True)
+    statuses = []
+    for status_update in value.get('statuses', []):
+        try:
+            statuses.append(parse_status(status_update))
+        except Exception as e:
+            logger.error(f'Error processing status: {str(e)}', exc_info=True)
+    return ParsedChange(messages=messages, statuses=statuses, contact_names=contact_names)
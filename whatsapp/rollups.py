@@ -0,0 +1,47 @@
+"""
+Incremental maintenance of WhatsAppDailyRollup
+"""
+
+from django.utils import timezone
+
+from bbdBackend.upserts import upsert_increment
+
+from .models import WhatsAppDailyRollup
+
+
+def rollup_rows(messages):
+    """
+    Aggregate WhatsAppMessage instances into
+    (day, phone_number, message_type, count, first_at, last_at) rows
+    """
+    buckets = {}
+    for message in messages:
+        key = (timezone.localtime(message.timestamp).date(), message.from_number, message.message_type)
+        count, first_at, last_at = buckets.get(key, (0, message.timestamp, message.timestamp))
+        buckets[key] = (count + 1, min(first_at, message.timestamp), max(last_at, message.timestamp))
+    return [key + value for key, value in buckets.items()]
+
+
+def add_to_rollups(rows):
+    """
+    Add (day, phone_number, message_type, count, first_at, last_at) rows to
+    the rollup table in one statement
+    """
+    upsert_increment(
+        WhatsAppDailyRollup,
+        [
+            {
+                'day': day,
+                'phone_number': phone_number,
+                'message_type': message_type,
+                'message_count': count,
+                'first_message_at': first_at,
+                'last_message_at': last_at,
+            }
+            for day, phone_number, message_type, count, first_at, last_at in rows
+        ],
+        unique_fields=['day', 'phone_number', 'message_type'],
+        add_fields=['message_count'],
+        min_fields=['first_message_at'],
+        max_fields=['last_message_at'],
+    )
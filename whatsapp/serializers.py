@@ -1,6 +1,28 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
 from .models import WhatsAppMessage, WhatsAppMessageStatus, WhatsAppConversation
 
+LATEST_MESSAGES_PER_CONVERSATION = 10
+
+
+def latest_messages_by_phone(phone_numbers, per_phone=LATEST_MESSAGES_PER_CONVERSATION):
+    """
+    Return {phone_number: [latest messages]} for many conversations in one query
+    """
+    messages = WhatsAppMessage.objects.filter(from_number__in=phone_numbers).annotate(
+        row_number=Window(
+            RowNumber(),
+            partition_by=[F('from_number')],
+            order_by=[F('timestamp').desc(), F('id').desc()],
+        )
+    ).filter(row_number__lte=per_phone).order_by('from_number', '-timestamp', '-id')
+    
+    grouped = {phone: [] for phone in phone_numbers}
+    for message in messages:
+        grouped[message.from_number].append(message)
+    return grouped
+
 
 class WhatsAppMessageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,7 +44,12 @@ class WhatsAppConversationSerializer(serializers.ModelSerializer):
         fields = '__all__'
     
     def get_latest_messages(self, obj):
-        messages = WhatsAppMessage.objects.filter(
-            from_number=obj.phone_number
-        ).order_by('-timestamp')[:10]
+        # Views listing many conversations pass the messages in via context
+        latest_messages = self.context.get('latest_messages')
+        if latest_messages is not None:
+            messages = latest_messages.get(obj.phone_number, [])
+        else:
+            messages = WhatsAppMessage.objects.filter(
+                from_number=obj.phone_number
+            ).order_by('-timestamp')[:LATEST_MESSAGES_PER_CONVERSATION]
         return WhatsAppMessageSerializer(messages, many=True).data
@@ -0,0 +1,10 @@
+"""
+Signals other apps use to react to webhook events without the webhook
+importing them
+"""
+
+from django.dispatch import Signal
+
+# Sent by the webhook with ``statuses``, the WhatsAppMessageStatus rows just
+# saved, inside the same transaction as the INSERT
+statuses_received = Signal()
@@ -0,0 +1,887 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connections
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    BroadcastCampaign,
+    BroadcastRecipient,
+    WhatsAppArchiveChunk,
+    WhatsAppConversation,
+    WhatsAppDailyRollup,
+    WhatsAppMessage,
+    WhatsAppMessageStatus,
+)
+from . import broadcasts, media_cache, parsers
+from .admin import WhatsAppMessageAdmin
+from .management.commands.backfill_message_rollups import Command as BackfillRollupsCommand
+from .rollups import add_to_rollups
+from .serializers import WhatsAppMessageSerializer
+from .views import AsyncWhatsAppMediaProxyView, AsyncWhatsAppWebhookView
+
+BASE_TIMESTAMP = 1760000000
+
+
+def text_message(message_id, from_number='919876543210', offset=0, body='Hello'):
+    return {
+        'id': message_id,
+        'from': from_number,
+        'timestamp': str(BASE_TIMESTAMP + offset),
+        'type': 'text',
+        'text': {'body': body},
+    }
+
+
+def status_update(message_id, status='delivered', offset=0):
+    return {
+        'id': message_id,
+        'recipient_id': '919876543210',
+        'status': status,
+        'timestamp': str(BASE_TIMESTAMP + offset),
+    }
+
+
+def webhook_payload(messages=(), statuses=(), contacts=None):
+    value = {'messaging_product': 'whatsapp', 'metadata': {'phone_number_id': '123456'}}
+    if messages:
+        value['messages'] = list(messages)
+        value['contacts'] = contacts if contacts is not None else [
+            {'wa_id': '919876543210', 'profile': {'name': 'Asha'}}
+        ]
+    if statuses:
+        value['statuses'] = list(statuses)
+    return {
+        'object': 'whatsapp_business_account',
+        'entry': [{'id': 'WABA', 'changes': [{'field': 'messages', 'value': value}]}],
+    }
+
+
+class WebhookTestMixin:
+    def post_webhook(self, payload):
+        response = self.client.post(reverse('whatsapp-webhook'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'success'})
+        return response
+
+
+@mock.patch('bbdBackend.graph.requests.request')
+class WebhookQueryCountTests(WebhookTestMixin, TestCase):
+    """
+    Ingestion must cost the same number of queries however many messages a payload carries
+    """
+
+    # savepoint, duplicate lookup, message INSERT, conversation lookup,
+    # conversation INSERT, conversation UPDATE, rollup upsert, release savepoint
+    NEW_SENDER_QUERIES = 8
+    # as above without the conversation INSERT
+    KNOWN_SENDER_QUERIES = 7
+    # savepoint, duplicate lookup, release savepoint
+    DUPLICATE_QUERIES = 3
+    # savepoint, status INSERT, bill notification lookup, release savepoint
+    STATUS_QUERIES = 4
+    # Largest payload whose message INSERT fits SQLite's 999 query parameters
+    # in one statement; Django splits bigger batches on SQLite only
+    BATCH_SIZES = (1, 10, 40)
+
+    def test_new_sender(self, graph_mock):
+        for count in self.BATCH_SIZES:
+            WhatsAppConversation.objects.all().delete()
+            with self.subTest(messages=count):
+                messages = [text_message(f'new-{count}-{i}', offset=i) for i in range(count)]
+                with self.assertNumQueries(self.NEW_SENDER_QUERIES):
+                    self.post_webhook(webhook_payload(messages))
+
+                conversation = WhatsAppConversation.objects.get(phone_number='919876543210')
+                self.assertEqual(conversation.message_count, count)
+                self.assertEqual(conversation.unread_count, count)
+                self.assertEqual(conversation.contact_name, 'Asha')
+                self.assertEqual(conversation.phone_e164, '+919876543210')
+        self.assertEqual(set(WhatsAppMessage.objects.values_list('phone_e164', flat=True)), {'+919876543210'})
+        graph_mock.assert_not_called()
+
+    def test_known_sender(self, graph_mock):
+        self.post_webhook(webhook_payload([text_message('first')]))
+        for count in self.BATCH_SIZES:
+            with self.subTest(messages=count):
+                messages = [text_message(f'known-{count}-{i}', offset=i + 1) for i in range(count)]
+                with self.assertNumQueries(self.KNOWN_SENDER_QUERIES):
+                    self.post_webhook(webhook_payload(messages))
+
+        conversation = WhatsAppConversation.objects.get(phone_number='919876543210')
+        self.assertEqual(conversation.message_count, 52)
+        self.assertEqual(conversation.last_message_at.timestamp(), BASE_TIMESTAMP + 40)
+
+    def test_duplicates_are_skipped(self, graph_mock):
+        messages = [text_message(f'dup-{i}', offset=i) for i in range(10)]
+        self.post_webhook(webhook_payload(messages))
+
+        with self.assertNumQueries(self.DUPLICATE_QUERIES):
+            self.post_webhook(webhook_payload(messages))
+
+        self.assertEqual(WhatsAppMessage.objects.count(), 10)
+        self.assertEqual(WhatsAppConversation.objects.get().message_count, 10)
+
+    def test_duplicates_within_payload(self, graph_mock):
+        messages = [text_message('same'), text_message('same')]
+        with self.assertNumQueries(self.NEW_SENDER_QUERIES):
+            self.post_webhook(webhook_payload(messages))
+        self.assertEqual(WhatsAppMessage.objects.count(), 1)
+
+    def test_statuses(self, graph_mock):
+        for count in (1, 10, 50):
+            with self.subTest(statuses=count):
+                statuses = [status_update(f'wamid.out-{i}', offset=i) for i in range(count)]
+                with self.assertNumQueries(self.STATUS_QUERIES):
+                    self.post_webhook(webhook_payload(statuses=statuses))
+        self.assertEqual(WhatsAppMessageStatus.objects.count(), 61)
+
+    def test_media_message_stores_proxy_url(self, graph_mock):
+        message = {
+            'id': 'img-1',
+            'from': '919876543210',
+            'timestamp': str(BASE_TIMESTAMP),
+            'type': 'image',
+            'image': {'id': 'MEDIA1', 'mime_type': 'image/jpeg', 'caption': 'Stain'},
+        }
+        with self.assertNumQueries(self.NEW_SENDER_QUERIES):
+            self.post_webhook(webhook_payload([message]))
+        self.assertEqual(WhatsAppMessage.objects.get().media_url, '/api/whatsapp/media/MEDIA1/')
+        graph_mock.assert_not_called()
+
+
+class WebhookParserTests(SimpleTestCase):
+
+    def parse(self, message_type, content, **extra):
+        message = {'id': 'm1', 'from': '919876543210', 'timestamp': str(BASE_TIMESTAMP), 'type': message_type,
+                   message_type: content, **extra}
+        [record] = parsers.parse_change(webhook_payload([message])['entry'][0]['changes'][0]['value']).messages
+        return record
+
+    def test_message_types(self):
+        self.assertEqual(self.parse('reaction', {'message_id': 'wamid.X', 'emoji': '👍'}).context_message_id, 'wamid.X')
+        self.assertEqual(self.parse('sticker', {'id': 'STICKER1', 'mime_type': 'image/webp'}).media_id, 'STICKER1')
+        self.assertEqual(self.parse('button', {'text': 'Yes', 'payload': 'confirm'}).text_body, 'Yes')
+        contacts = [{'name': {'formatted_name': 'Ravi'}, 'phones': [{'phone': '+91 98765 11111'}]}]
+        self.assertEqual(self.parse('contacts', contacts).text_body, 'Ravi (+91 98765 11111)')
+        order = {'product_items': [{'quantity': 2}, {'quantity': '1'}], 'text': 'Before Friday'}
+        self.assertEqual(self.parse('order', order).text_body, 'Order of 3 items: Before Friday')
+        record = self.parse('interactive', {'type': 'list_reply', 'list_reply': {'title': 'Dry clean'}},
+                            context={'id': 'wamid.menu'})
+        self.assertEqual((record.text_body, record.context_message_id), ('Dry clean', 'wamid.menu'))
+        self.assertEqual(record.from_name, 'Asha')
+
+    def test_unknown_types_are_kept(self):
+        record = self.parse('poll', {'question': '?'})
+        self.assertEqual((record.message_type, record.text_body), ('poll', None))
+        self.assertEqual(record.to_model().raw_payload['poll'], {'question': '?'})
+
+    def test_new_types_plug_in(self):
+        with mock.patch.dict(parsers.MESSAGE_PARSERS):
+            parsers.message_parser('poll')(lambda content: {'text_body': content['question']})
+            self.assertEqual(self.parse('poll', {'question': 'Pickup today?'}).text_body, 'Pickup today?')
+
+    def test_malformed_entries_are_skipped(self):
+        value = webhook_payload(
+            [text_message('ok'), dict(text_message('bad'), timestamp='soon')],
+            statuses=[status_update('wamid.1', 'failed') | {'errors': [{'code': 131026, 'title': 'Undeliverable'}]}],
+        )['entry'][0]['changes'][0]['value']
+        with self.assertLogs('whatsapp.parsers', 'ERROR'):
+            change = parsers.parse_change(value)
+        self.assertEqual([message.message_id for message in change.messages], ['ok'])
+        self.assertEqual((change.statuses[0].error_code, change.statuses[0].error_message), (131026, 'Undeliverable'))
+
+    def test_records_have_no_instance_dict(self):
+        self.assertFalse(hasattr(self.parse('text', {'body': 'Hi'}), '__dict__'))
+
+
+def graph_media_responses(content, mime_type='image/png'):
+    metadata = mock.Mock(status_code=200)
+    metadata.json.return_value = {'url': 'https://cdn.example/MEDIA1', 'mime_type': mime_type}
+    return [metadata, mock.Mock(status_code=200, content=content)]
+
+
+def png_bytes(size=(1200, 900)):
+    from PIL import Image
+    output = io.BytesIO()
+    Image.new('RGB', size, color=(200, 30, 30)).save(output, format='PNG')
+    return output.getvalue()
+
+
+class SynchronousExecutor:
+    def submit(self, fn, media_ids):
+        # Skip _prefetch_in_background: it closes the test's connection
+        for media_id in media_ids:
+            media_cache.prefetch_media(media_id)
+
+
+@mock.patch.object(media_cache, '_get_executor', SynchronousExecutor)
+@mock.patch('bbdBackend.graph.requests.request')
+class MediaPrefetchTests(WebhookTestMixin, TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        cache.clear()
+
+    def media_message(self, message_type='image', media_id='MEDIA1'):
+        return {
+            'id': f'{message_type}-{media_id}',
+            'from': '919876543210',
+            'timestamp': str(int(timezone.now().timestamp())),
+            'type': message_type,
+            message_type: {'id': media_id, 'mime_type': 'image/png'},
+        }
+
+    def test_image_is_prefetched_with_thumbnail(self, graph_mock):
+        original = png_bytes()
+        graph_mock.side_effect = graph_media_responses(original)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_webhook(webhook_payload([self.media_message()]))
+
+        message = WhatsAppMessage.objects.get()
+        self.assertEqual(message.media_file.read(), original)
+        from PIL import Image
+        with Image.open(message.media_thumbnail) as thumbnail:
+            self.assertLessEqual(max(thumbnail.size), 200)
+        self.assertLess(message.media_thumbnail.size, len(original) / 5)
+
+        graph_mock.reset_mock()
+        response = self.client.get(reverse('whatsapp-media', args=['MEDIA1']))
+        self.assertEqual(b''.join(response.streaming_content), original)
+        thumbnail = self.client.get(reverse('whatsapp-media-thumbnail', args=['MEDIA1']))
+        self.assertEqual(thumbnail['Content-Type'], 'image/jpeg')
+        graph_mock.assert_not_called()
+
+        preview = WhatsAppMessageAdmin(WhatsAppMessage, None).media_preview(message)
+        self.assertIn(reverse('whatsapp-media-thumbnail', args=['MEDIA1']), preview)
+
+    def test_audio_is_not_prefetched(self, graph_mock):
+        with mock.patch.object(media_cache, '_get_executor') as executor_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post_webhook(webhook_payload([self.media_message('audio')]))
+        executor_mock.assert_not_called()
+        graph_mock.assert_not_called()
+
+    def test_command_fetches_missed_media(self, graph_mock):
+        self.post_webhook(webhook_payload([self.media_message('document', 'DOC1')]))
+        self.assertEqual(WhatsAppMessage.objects.get().media_file, '')
+
+        graph_mock.side_effect = graph_media_responses(b'%PDF-1.4', 'application/pdf')
+        call_command('prefetch_whatsapp_media', stdout=StringIO())
+
+        message = WhatsAppMessage.objects.get()
+        self.assertTrue(message.media_file.name.endswith('DOC1.pdf'))
+        self.assertEqual(message.media_thumbnail, '')
+
+
+class MediaCoalescingTests(TransactionTestCase):
+    """
+    Concurrent proxy misses for one media id share one Graph API fetch
+    """
+
+    def setUp(self):
+        cache.clear()
+        lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(lock_dir.cleanup)
+        self.enterContext(override_settings(WHATSAPP_MEDIA_LOCK_DIR=lock_dir.name))
+
+    def test_concurrent_fetches_share_one_download(self):
+        def slow_graph(method, url, **kwargs):
+            time.sleep(0.2)
+            return graph_media_responses(b'jpeg-bytes', 'image/jpeg')[0 if 'graph.facebook.com' in url else 1]
+
+        def fetch():
+            try:
+                return media_cache.fetch_media('MEDIA1')
+            finally:
+                connections.close_all()
+
+        with mock.patch('bbdBackend.graph.requests.request', side_effect=slow_graph) as graph_mock:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(lambda _: fetch(), range(8)))
+
+        self.assertEqual(graph_mock.call_count, 2)
+        self.assertEqual({result[:2] for result in results}, {(b'jpeg-bytes', 'image/jpeg')})
+        self.assertEqual(sum(not shared for _, _, shared in results), 1)
+
+    @mock.patch('bbdBackend.graph.requests.request')
+    def test_media_url_is_reused_until_it_fails(self, graph_mock):
+        metadata, download = graph_media_responses(b'png-bytes')
+        graph_mock.side_effect = [metadata, download, download]
+        self.assertEqual(media_cache.download_media('MEDIA1'), (b'png-bytes', 'image/png'))
+        self.assertEqual(media_cache.download_media('MEDIA1'), (b'png-bytes', 'image/png'))
+        self.assertEqual(graph_mock.call_count, 3)
+
+        # An expired URL is resolved again once
+        graph_mock.reset_mock()
+        graph_mock.side_effect = [mock.Mock(status_code=403), metadata, download]
+        self.assertEqual(media_cache.download_media('MEDIA1'), (b'png-bytes', 'image/png'))
+        self.assertEqual(graph_mock.call_count, 3)
+
+    def test_async_fetches_share_one_download(self):
+        calls = []
+
+        async def upstream(request):
+            calls.append(request.url.host)
+            await asyncio.sleep(0.1)
+            if request.url.host == 'graph.facebook.com':
+                return httpx.Response(200, json={'url': 'https://cdn.example/MEDIA2', 'mime_type': 'image/png'})
+            return httpx.Response(200, content=b'png-bytes')
+
+        async def fetch_all():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+            with mock.patch('bbdBackend.graph.get_async_client', return_value=client):
+                results = await asyncio.gather(*(media_cache.afetch_media('MEDIA2') for _ in range(5)))
+            await client.aclose()
+            return results
+
+        results = async_to_sync(fetch_all)()
+        self.assertEqual(calls, ['graph.facebook.com', 'cdn.example'])
+        self.assertEqual([shared for _, _, shared in results].count(False), 1)
+
+
+class SynchronousCampaignExecutor:
+    def submit(self, fn, campaign_id):
+        # Skip _run_in_background: it closes the test's connection
+        broadcasts.run_campaign(campaign_id)
+
+
+@mock.patch.dict(os.environ, {'WHATSAPP_ACCESS_TOKEN': 'token', 'WHATSAPP_PHONE_NUMBER_ID': 'PHONE'})
+@mock.patch.object(broadcasts, '_get_executor', SynchronousCampaignExecutor)
+@mock.patch('bbdBackend.graph.requests.request')
+@override_settings(BROADCAST_TOKEN='secret')
+class BroadcastTests(TestCase):
+    AUTH = {'Authorization': 'Bearer secret'}
+
+    def graph_replies(self, *failed_numbers):
+        def reply(method, url, json, **kwargs):
+            if json['to'] in failed_numbers:
+                return mock.Mock(status_code=400, text='{"error": {"code": 131026}}')
+            response = mock.Mock(status_code=200)
+            response.json.return_value = {'messages': [{'id': f"wamid.{json['to']}"}]}
+            return response
+        return reply
+
+    def test_campaign_is_sent_to_every_recipient(self, graph_mock):
+        graph_mock.side_effect = self.graph_replies('919800000002')
+        numbers = ['+91 98000 00001', '919800000002', '91-9800000003', '919800000001']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('broadcasts'), {'template': 'diwali_offer', 'phone_numbers': numbers},
+                content_type='application/json', headers=self.AUTH,
+            )
+        self.assertEqual(response.status_code, 202)
+
+        self.assertEqual(graph_mock.call_count, 3)
+        payload = graph_mock.call_args.kwargs['json']
+        self.assertEqual(payload['template'], {'name': 'diwali_offer', 'language': {'code': 'en'}})
+        recipient = BroadcastRecipient.objects.get(phone_number='919800000001')
+        self.assertEqual(recipient.message_id, 'wamid.919800000001')
+
+        detail = self.client.get(reverse('broadcast-detail', args=[response.json()['id']]), headers=self.AUTH).json()
+        self.assertEqual(detail['status'], 'completed')
+        self.assertEqual(detail['recipients'], {'pending': 0, 'sending': 0, 'sent': 2, 'failed': 1})
+
+    def test_invalid_numbers_are_rejected(self, graph_mock):
+        response = self.client.post(
+            reverse('broadcasts'), {'template': 'offer', 'phone_numbers': ['919800000001', 'call me']},
+            content_type='application/json', headers=self.AUTH,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['invalid'], ['call me'])
+        self.assertFalse(BroadcastCampaign.objects.exists())
+
+    def test_command_resumes_pending_recipients(self, graph_mock):
+        graph_mock.side_effect = self.graph_replies()
+        campaign = broadcasts.create_campaign('offer', ['919800000001', '919800000002'])
+        call_command('send_broadcasts', stdout=StringIO())
+        self.assertEqual(campaign.recipients.filter(status='sent').count(), 2)
+
+    def test_command_skips_recipients_claimed_by_another_sender(self, graph_mock):
+        graph_mock.side_effect = self.graph_replies()
+        campaign = broadcasts.create_campaign('offer', ['919800000001', '919800000002', '919800000003'])
+        # A worker is still sending the first one; the third was claimed by one that died
+        claimed = broadcasts.claim_batch(campaign, batch_size=1)
+        self.assertEqual([recipient.phone_number for recipient in claimed], ['919800000001'])
+        campaign.recipients.filter(phone_number='919800000003').update(
+            status='sending', claimed_at=timezone.now() - broadcasts.CLAIM_TIMEOUT - timedelta(seconds=1),
+        )
+
+        call_command('send_broadcasts', stdout=StringIO())
+
+        self.assertEqual([call.kwargs['json']['to'] for call in graph_mock.call_args_list], ['919800000002', '919800000003'])
+        self.assertEqual(campaign.recipients.get(phone_number='919800000001').status, 'sending')
+        campaign.refresh_from_db()
+        self.assertNotEqual(campaign.status, 'completed')
+
+    def test_token_required(self, graph_mock):
+        self.assertEqual(self.client.get(reverse('broadcasts')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('broadcasts'), headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+        self.assertEqual(self.client.get(reverse('broadcasts'), headers=self.AUTH).status_code, 200)
+
+    @override_settings(BROADCAST_TOKEN='')
+    def test_unset_token_rejects_requests(self, graph_mock):
+        response = self.client.post(
+            reverse('broadcasts'), {'template': 'offer', 'phone_numbers': ['919800000001']},
+            content_type='application/json', headers={'Authorization': 'Bearer '},
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(BroadcastCampaign.objects.exists())
+        graph_mock.assert_not_called()
+
+        staff = User.objects.create_user('staff', password='x', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('broadcasts')).status_code, 200)
+
+
+class RollupTests(WebhookTestMixin, TestCase):
+
+    def test_ingestion_maintains_rollups(self):
+        messages = [text_message(f'r-{i}', offset=i * 60) for i in range(4)]
+        messages.append(dict(text_message('r-img', offset=30), type='image', image={'id': 'M1'}))
+        self.post_webhook(webhook_payload(messages[:2]))
+        self.post_webhook(webhook_payload(messages[2:]))
+
+        text = WhatsAppDailyRollup.objects.get(message_type='text')
+        self.assertEqual(text.message_count, 4)
+        self.assertEqual(text.first_message_at.timestamp(), BASE_TIMESTAMP)
+        self.assertEqual(text.last_message_at.timestamp(), BASE_TIMESTAMP + 180)
+        self.assertEqual(WhatsAppDailyRollup.objects.get(message_type='image').message_count, 1)
+
+    def test_backfill_matches_incremental(self):
+        self.post_webhook(webhook_payload([text_message(f'b-{i}', offset=i * 3600) for i in range(30)]))
+        incremental = list(WhatsAppDailyRollup.objects.order_by('day').values_list('day', 'message_count'))
+
+        call_command('backfill_message_rollups', batch_size=7, stdout=StringIO())
+
+        rebuilt = list(WhatsAppDailyRollup.objects.order_by('day').values_list('day', 'message_count'))
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(sum(count for _, count in rebuilt), 30)
+
+    def test_backfill_failure_leaves_every_day_correct(self):
+        self.post_webhook(webhook_payload([text_message(f'b-{i}', offset=i * 3600) for i in range(30)]))
+        incremental = list(WhatsAppDailyRollup.objects.order_by('day').values_list('day', 'message_count'))
+
+        # Each range is replaced atomically: rebuilt before the failure, untouched after it
+        calls = []
+
+        def add_then_fail(rows):
+            if calls:
+                raise RuntimeError('connection lost')
+            calls.append(rows)
+            add_to_rollups(rows)
+
+        with mock.patch(
+            'whatsapp.management.commands.backfill_message_rollups.add_to_rollups', side_effect=add_then_fail,
+        ):
+            with self.assertRaises(RuntimeError):
+                call_command('backfill_message_rollups', batch_size=7, stdout=StringIO())
+
+        rollups = list(WhatsAppDailyRollup.objects.order_by('day').values_list('day', 'message_count'))
+        self.assertEqual(rollups, incremental)
+
+    def test_messages_ingested_during_backfill_are_counted_once(self):
+        self.post_webhook(webhook_payload([text_message(f'b-{i}', offset=i * 3600) for i in range(30)]))
+        rebuild_days = BackfillRollupsCommand._rebuild_days
+        batches = []
+
+        def rebuild_then_ingest(command, after, through):
+            batches.append(through)
+            rebuilt = rebuild_days(command, after, through)
+            if len(batches) == 1:
+                # One message on the day just rebuilt, one on a day still to come
+                self.post_webhook(webhook_payload([text_message('late-1', offset=0), text_message('late-2', offset=29 * 3600)]))
+            return rebuilt
+
+        with mock.patch.object(
+            BackfillRollupsCommand, '_rebuild_days', autospec=True, side_effect=rebuild_then_ingest,
+        ):
+            call_command('backfill_message_rollups', batch_size=7, stdout=StringIO())
+
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(sum(WhatsAppDailyRollup.objects.values_list('message_count', flat=True)), 32)
+        self.assertEqual(
+            list(WhatsAppDailyRollup.objects.order_by('day').values_list('day', 'message_count')),
+            [
+                (day, count) for day, count in WhatsAppMessage.objects.annotate(day=TruncDate('timestamp'))
+                .values_list('day').annotate(count=Count('id')).order_by('day')
+            ],
+        )
+
+    def test_analytics_reads_only_rollups(self):
+        self.post_webhook(webhook_payload([text_message(f'a-{i}', offset=i * 3600) for i in range(30)]))
+        day = WhatsAppDailyRollup.objects.earliest('day').day
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('message-analytics'), {'from': day, 'to': day.replace(year=day.year + 1)})
+        data = response.json()
+        self.assertEqual(data['total'], 30)
+        self.assertEqual(len(data['results']), 2)
+
+        by_phone = self.client.get(reverse('message-analytics'), {'group_by': 'phone', 'from': day}).json()
+        self.assertEqual(by_phone['results'][0]['phone_number'], '919876543210')
+        for phone in ('9876543210', '+91 98765 43210', '919876543210'):
+            with self.subTest(phone=phone):
+                one = self.client.get(reverse('message-analytics'), {'group_by': 'type', 'from': day, 'phone': phone})
+                self.assertEqual(one.json()['total'], 30)
+        self.assertEqual(self.client.get(reverse('message-analytics'), {'phone': '12'}).status_code, 400)
+
+        invalid = self.client.get(reverse('message-analytics'), {'group_by': 'month'})
+        self.assertEqual(invalid.status_code, 400)
+
+
+class ArchiveTests(WebhookTestMixin, TestCase):
+    """
+    BASE_TIMESTAMP is months in the past; "recent" rows are stamped now
+    """
+
+    def setUp(self):
+        self.recent_offset = int(timezone.now().timestamp()) - BASE_TIMESTAMP
+        old = [text_message(f'old-{i}', offset=i * 3600) for i in range(30)]
+        recent = [text_message(f'new-{i}', offset=self.recent_offset - 60 + i) for i in range(3)]
+        self.post_webhook(webhook_payload(old + recent))
+        self.post_webhook(webhook_payload(statuses=[
+            status_update('out-1', 'sent'),
+            status_update('out-1', 'read', offset=60),
+            status_update('out-2', 'sent', offset=self.recent_offset - 5),
+        ]))
+        self.old_serialized = WhatsAppMessageSerializer(
+            WhatsAppMessage.objects.filter(message_id__startswith='old-'), many=True
+        ).data
+
+    def archive(self, **options):
+        call_command('archive_whatsapp_history', days=30, batch_size=7, sleep=0, stdout=StringIO(), **options)
+
+    def test_old_rows_move_to_chunks(self):
+        conversation = WhatsAppConversation.objects.values('message_count', 'unread_count', 'last_message_at').get()
+
+        self.archive()
+
+        self.assertEqual(
+            sorted(WhatsAppMessage.objects.values_list('message_id', flat=True)), ['new-0', 'new-1', 'new-2']
+        )
+        self.assertEqual(list(WhatsAppMessageStatus.objects.values_list('message_id', flat=True)), ['out-2'])
+        self.assertEqual(
+            sum(WhatsAppArchiveChunk.objects.filter(kind='message').values_list('row_count', flat=True)), 30
+        )
+        self.assertEqual(
+            WhatsAppConversation.objects.values('message_count', 'unread_count', 'last_message_at').get(), conversation
+        )
+
+    def test_archive_read_path_matches_original_rows(self):
+        self.archive()
+        url = reverse('archived-messages')
+
+        response = self.client.get(url, {'phone': '919876543210', 'limit': 500})
+        self.assertEqual(response.json()['count'], 30)
+        self.assertEqual(response.json()['messages'], json.loads(json.dumps(self.old_serialized)))
+
+        page = self.client.get(url, {'phone': '919876543210', 'limit': 5}).json()['messages']
+        self.assertEqual([row['message_id'] for row in page], [f'old-{i}' for i in range(29, 24, -1)])
+        older = self.client.get(url, {'phone': '919876543210', 'limit': 5, 'before': page[-1]['timestamp']})
+        self.assertEqual(older.json()['messages'][0]['message_id'], 'old-24')
+
+        statuses = self.client.get(url, {'phone': '919876543210', 'kind': 'status'}).json()['statuses']
+        self.assertEqual([row['status'] for row in statuses], ['read', 'sent'])
+
+    def test_archive_accepts_any_phone_format(self):
+        self.archive()
+        for phone in ('9876543210', '+91 98765 43210', '919876543210'):
+            with self.subTest(phone=phone):
+                response = self.client.get(reverse('archived-messages'), {'phone': phone, 'limit': 500})
+                self.assertEqual(response.json()['count'], 30)
+        response = self.client.get(reverse('archived-messages'), {'phone': 'call me'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cached_media_of_archived_messages_is_deleted(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        storage = WhatsAppMessage._meta.get_field('media_file').storage
+        archived = storage.save('whatsapp-media/ARCHIVED.png', ContentFile(b'old'))
+        thumbnail = storage.save('whatsapp-media/thumbnails/ARCHIVED.jpg', ContentFile(b'thumb'))
+        # Also carried by a recent message, so it stays
+        shared = storage.save('whatsapp-media/SHARED.png', ContentFile(b'shared'))
+        WhatsAppMessage.objects.filter(message_id='old-0').update(media_file=archived, media_thumbnail=thumbnail)
+        WhatsAppMessage.objects.filter(message_id__in=['old-1', 'new-0']).update(media_file=shared)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.archive(kind=['message'])
+
+        self.assertFalse(storage.exists(archived))
+        self.assertFalse(storage.exists(thumbnail))
+        self.assertTrue(storage.exists(shared))
+
+    def test_backfill_keeps_rollups_of_archived_days(self):
+        before = sum(WhatsAppDailyRollup.objects.values_list('message_count', flat=True))
+        self.archive(kind=['message'])
+
+        call_command('backfill_message_rollups', stdout=StringIO())
+
+        self.assertEqual(sum(WhatsAppDailyRollup.objects.values_list('message_count', flat=True)), before)
+
+
+class StatusPruningTests(WebhookTestMixin, TestCase):
+
+    def setUp(self):
+        recent_offset = int(timezone.now().timestamp()) - BASE_TIMESTAMP
+        self.post_webhook(webhook_payload(statuses=[
+            status_update('out-1', 'sent'),
+            status_update('out-1', 'delivered', offset=5),
+            status_update('out-1', 'read', offset=60),
+            # Same timestamp, delivered recorded after read: read still wins
+            status_update('out-2', 'sent', offset=100),
+            status_update('out-2', 'read', offset=200),
+            status_update('out-2', 'delivered', offset=200),
+            status_update('out-3', 'sent', offset=300),
+            status_update('out-3', 'failed', offset=310),
+            # Still in the retention window
+            status_update('out-4', 'sent', offset=recent_offset - 60),
+            status_update('out-4', 'delivered', offset=recent_offset - 30),
+        ]))
+
+    def prune(self, **options):
+        out = StringIO()
+        call_command('prune_message_statuses', days=30, batch_size=3, sleep=0, stdout=out, **options)
+        return out.getvalue()
+
+    def test_keeps_terminal_status_per_message(self):
+        output = self.prune()
+
+        self.assertEqual(
+            sorted(WhatsAppMessageStatus.objects.values_list('message_id', 'status')),
+            [('out-1', 'read'), ('out-2', 'read'), ('out-3', 'failed'), ('out-4', 'delivered'), ('out-4', 'sent')],
+        )
+        self.assertIn('Deleted 5 statuses', output)
+        self.assertIn('rows/s', output)
+
+    def test_drop_payloads(self):
+        self.prune(drop_payloads=True)
+
+        self.assertFalse(WhatsAppMessageStatus.objects.filter(message_id='out-1', raw_payload__isnull=False).exists())
+        self.assertEqual(WhatsAppMessageStatus.objects.filter(message_id='out-4', raw_payload__isnull=False).count(), 2)
+
+
+class InboxQueryCountTests(TestCase):
+    """
+    List endpoints must not issue per-row queries
+    """
+
+    def create_conversations(self, count, messages_each=3):
+        now = timezone.now()
+        WhatsAppConversation.objects.bulk_create([
+            WhatsAppConversation(phone_number=f'9190000000{i:02d}', last_message_at=now - timedelta(minutes=i))
+            for i in range(count)
+        ])
+        WhatsAppMessage.objects.bulk_create([
+            WhatsAppMessage(
+                message_id=f'm-{i}-{j}',
+                from_number=f'9190000000{i:02d}',
+                phone_e164=f'+9190000000{i:02d}',
+                message_type='text',
+                text_body=f'message {j}',
+                timestamp=now - timedelta(minutes=i, seconds=j),
+            )
+            for i in range(count)
+            for j in range(messages_each)
+        ])
+
+    def test_messages_list(self):
+        self.create_conversations(5, messages_each=10)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('messages-list'), {'limit': 20})
+        self.assertEqual(response.json()['count'], 20)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('messages-list'), {'phone': '919000000001', 'type': 'text'})
+        self.assertEqual(response.json()['count'], 10)
+
+    def test_out_of_range_limits_are_clamped(self):
+        self.create_conversations(2)
+        self.assertEqual(self.client.get(reverse('messages-list'), {'limit': -1}).json()['count'], 1)
+        self.assertEqual(self.client.get(reverse('messages-list'), {'limit': 10 ** 9}).json()['count'], 6)
+        self.assertEqual(self.client.get(reverse('messages-list'), {'limit': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('inbox'), {'limit': -3}).json()['count'], 1)
+        for params in ({'limit': -1, 'group_by': 'phone'}, {'days': -10}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(reverse('message-analytics'), params).status_code, 200)
+        response = self.client.get(reverse('archived-messages'), {'phone': '919000000000', 'limit': -1})
+        self.assertEqual(response.status_code, 200)
+
+    def test_conversations_list_is_constant(self):
+        for count in (1, 10, 30):
+            WhatsAppMessage.objects.all().delete()
+            WhatsAppConversation.objects.all().delete()
+            self.create_conversations(count, messages_each=12)
+            with self.subTest(conversations=count):
+                with self.assertNumQueries(2):
+                    response = self.client.get(reverse('conversations-list'))
+                data = response.json()
+                self.assertEqual(data['count'], count)
+                self.assertTrue(all(len(c['latest_messages']) == 10 for c in data['conversations']))
+
+    def test_latest_messages_are_newest_first(self):
+        self.create_conversations(1, messages_each=12)
+        conversation = self.client.get(reverse('conversations-list')).json()['conversations'][0]
+        bodies = [m['text_body'] for m in conversation['latest_messages']]
+        self.assertEqual(bodies, [f'message {j}' for j in range(10)])
+
+    def test_mark_read(self):
+        self.create_conversations(1, messages_each=20)
+        WhatsAppConversation.objects.update(unread_count=20)
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                reverse('mark-read'), {'phone_number': '919000000000'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(WhatsAppConversation.objects.get().unread_count, 0)
+        self.assertFalse(WhatsAppMessage.objects.filter(status='received').exists())
+
+    def test_mark_read_accepts_any_format(self):
+        self.create_conversations(1, messages_each=2)
+        WhatsAppConversation.objects.update(unread_count=2, phone_e164='+919000000000')
+        response = self.client.post(reverse('mark-read'), {'phone_number': '+91 90000 00000'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(WhatsAppConversation.objects.get().unread_count, 0)
+        self.assertEqual(WhatsAppMessage.objects.filter(status='read').count(), 2)
+
+        response = self.client.post(reverse('mark-read'), {'phone_number': 'unknown'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_mark_read_unknown_conversation(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                reverse('mark-read'), {'phone_number': '910000000000'}, content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 404)
+
+
+class InboxSnapshotTests(WebhookTestMixin, TestCase):
+    """
+    The last-message snapshot on WhatsAppConversation and the inbox endpoint reading it
+    """
+
+    def test_ingestion_keeps_latest_message(self):
+        self.post_webhook(webhook_payload([text_message('s-1', offset=10, body='Is it ready?')]))
+        image = dict(text_message('s-2', offset=20), type='image', image={'id': 'M1', 'caption': 'This stain'})
+        self.post_webhook(webhook_payload([text_message('s-0', offset=15), image]))
+
+        conversation = WhatsAppConversation.objects.get()
+        self.assertEqual(conversation.last_message_id, 's-2')
+        self.assertEqual(conversation.last_message_type, 'image')
+        self.assertEqual(conversation.last_message_preview, 'This stain')
+
+        # A delayed older message is counted but doesn't replace the snapshot
+        self.post_webhook(webhook_payload([text_message('s-late', offset=5)]))
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.message_count, 4)
+        self.assertEqual(conversation.last_message_id, 's-2')
+        self.assertEqual(conversation.last_message_at.timestamp(), BASE_TIMESTAMP + 20)
+
+    def test_preview_is_truncated(self):
+        self.post_webhook(webhook_payload([text_message('long', body='x' * 500)]))
+        self.assertEqual(len(WhatsAppConversation.objects.get().last_message_preview), 200)
+
+    def test_inbox_is_one_query(self):
+        self.post_webhook(webhook_payload([
+            text_message(f'i-{i}', from_number=f'9190000000{i:02d}', offset=i, body=f'hi {i}') for i in range(60)
+        ], contacts=[]))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('inbox'))
+        data = response.json()
+        self.assertEqual(data['count'], 50)
+        first = data['conversations'][0]
+        self.assertEqual(first['phone_number'], '919000000059')
+        self.assertEqual(first['last_message_preview'], 'hi 59')
+        self.assertEqual(first['last_message_type'], 'text')
+
+        older = self.client.get(reverse('inbox'), {'before': data['conversations'][-1]['last_message_at']}).json()
+        self.assertEqual([c['phone_number'] for c in older['conversations']], [f'9190000000{i:02d}' for i in range(9, -1, -1)])
+        self.assertEqual(self.client.get(reverse('inbox'), {'before': 'yesterday'}).status_code, 400)
+
+    def test_backfill(self):
+        self.post_webhook(webhook_payload([
+            text_message(f'f-{i}-{j}', from_number=f'9190000000{i:02d}', offset=j, body=f'{i}.{j}')
+            for i in range(5) for j in range(3)
+        ], contacts=[]))
+        WhatsAppConversation.objects.create(phone_number='919000000099')
+        WhatsAppConversation.objects.update(last_message_id='', last_message_type='', last_message_preview='')
+
+        call_command('backfill_inbox_snapshot', batch_size=2, stdout=StringIO())
+
+        snapshots = dict(WhatsAppConversation.objects.values_list('phone_number', 'last_message_preview'))
+        self.assertEqual(snapshots, {**{f'9190000000{i:02d}': f'{i}.2' for i in range(5)}, '919000000099': ''})
+        self.assertEqual(set(WhatsAppConversation.objects.exclude(last_message_id='').values_list('last_message_type', flat=True)), {'text'})
+
+
+class AsyncViewTests(TestCase):
+    """
+    The ASGI views must behave like their sync counterparts
+    """
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    async def test_webhook_ingests_messages(self):
+        payload = webhook_payload([text_message(f'async-{i}', offset=i) for i in range(3)])
+        request = self.factory.post('/api/whatsapp/webhook/', json.dumps(payload), content_type='application/json')
+
+        response = await AsyncWhatsAppWebhookView.as_view()(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await WhatsAppMessage.objects.acount(), 3)
+        conversation = await WhatsAppConversation.objects.aget(phone_number='919876543210')
+        self.assertEqual(conversation.unread_count, 3)
+
+    async def test_webhook_verification(self):
+        request = self.factory.get('/api/whatsapp/webhook/', {
+            'hub.mode': 'subscribe', 'hub.verify_token': 'your_verify_token_here', 'hub.challenge': '1234',
+        })
+        response = await AsyncWhatsAppWebhookView.as_view()(request)
+        self.assertEqual(response.content, b'1234')
+
+    async def test_media_proxy(self):
+        await cache.aclear()
+
+        def upstream(request):
+            if request.url.host == 'graph.facebook.com':
+                return httpx.Response(200, json={'url': 'https://cdn.example/MEDIA1', 'mime_type': 'image/png'})
+            return httpx.Response(200, content=b'png-bytes')
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        with mock.patch('bbdBackend.graph.get_async_client', return_value=client):
+            response = await AsyncWhatsAppMediaProxyView.as_view()(
+                self.factory.get('/api/whatsapp/media/MEDIA1/'), media_id='MEDIA1'
+            )
+        await client.aclose()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'png-bytes')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response['ETag'], '"MEDIA1"')
+
+        cached = await AsyncWhatsAppMediaProxyView.as_view()(
+            self.factory.get('/api/whatsapp/media/MEDIA1/', headers={'If-None-Match': '"MEDIA1"'}), media_id='MEDIA1'
+        )
+        self.assertEqual(cached.status_code, 304)
@@ -1,21 +1,44 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     WhatsAppWebhookView,
     MessagesListView,
+    ArchivedMessagesView,
     ConversationsListView,
+    InboxView,
     MarkAsReadView,
-    WhatsAppMediaProxyView
+    MessageAnalyticsView,
+    BroadcastCampaignsView,
+    BroadcastCampaignDetailView,
+    WhatsAppMediaProxyView,
+    AsyncWhatsAppWebhookView,
+    AsyncWhatsAppMediaProxyView,
+    media_thumbnail_view,
 )
 
 urlpatterns = [
     # Webhook endpoint - this is where Facebook will send messages
-    path('webhook/', WhatsAppWebhookView.as_view(), name='whatsapp-webhook'),
+    path(
+        'webhook/', (AsyncWhatsAppWebhookView if settings.ASYNC_VIEWS else WhatsAppWebhookView).as_view(),
+        name='whatsapp-webhook',
+    ),
     
     # API endpoints to view messages
     path('messages/', MessagesListView.as_view(), name='messages-list'),
+    path('messages/archive/', ArchivedMessagesView.as_view(), name='archived-messages'),
     path('conversations/', ConversationsListView.as_view(), name='conversations-list'),
+    path('inbox/', InboxView.as_view(), name='inbox'),
     path('mark-read/', MarkAsReadView.as_view(), name='mark-read'),
+    path('analytics/', MessageAnalyticsView.as_view(), name='message-analytics'),
+    
+    # Broadcast campaigns - sent through the rate-limited outbound scheduler
+    path('broadcasts/', BroadcastCampaignsView.as_view(), name='broadcasts'),
+    path('broadcasts/<int:campaign_id>/', BroadcastCampaignDetailView.as_view(), name='broadcast-detail'),
     
     # Media proxy - serves WhatsApp media with authentication
-    path('media/<str:media_id>/', WhatsAppMediaProxyView.as_view(), name='whatsapp-media'),
+    path(
+        'media/<str:media_id>/', (AsyncWhatsAppMediaProxyView if settings.ASYNC_VIEWS else WhatsAppMediaProxyView).as_view(),
+        name='whatsapp-media',
+    ),
+    path('media/<str:media_id>/thumbnail/', media_thumbnail_view, name='whatsapp-media-thumbnail'),
 ]
@@ -1,40 +1,55 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.db import transaction
-from datetime import datetime
+from django.db.models import Case, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Greatest
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.views import View
+from django.utils import timezone
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+import json
 import logging
 import os
 import hmac
 import hashlib
-import requests
+import math
 
-from .models import WhatsAppMessage, WhatsAppMessageStatus, WhatsAppConversation
-from .serializers import WhatsAppMessageSerializer, WhatsAppConversationSerializer
+from bbdBackend.auth import token_denial
+from bbdBackend.customers import invalidate_customers
+from bbdBackend.graph import GraphUnavailable
+from bbdBackend.metrics import WEBHOOK_EVENTS, MEDIA_PROXY_REQUESTS
+from bbdBackend.phone import phone_q, to_e164, whatsapp_id
+from bbdBackend.replicas import reads_from_replica
+from .models import WhatsAppMessage, WhatsAppMessageStatus, WhatsAppConversation, WhatsAppDailyRollup
+from .serializers import (
+    WhatsAppMessageSerializer,
+    WhatsAppMessageStatusSerializer,
+    WhatsAppConversationSerializer,
+    latest_messages_by_phone,
+)
+from .archive import archived_rows
+from .parsers import parse_change
+from .broadcasts import campaign_summary, campaigns_with_counts, create_campaign, normalize_phone_number, start_campaign
+from .media_cache import afetch_media, enqueue_prefetch, extension_for, fetch_media, open_cached
+from .rollups import add_to_rollups, rollup_rows
+from .signals import statuses_received
 
 logger = logging.getLogger(__name__)
 
 
-@method_decorator(csrf_exempt, name='dispatch')
-class WhatsAppWebhookView(APIView):
+class WebhookProcessingMixin:
     """
-    Main webhook endpoint for receiving WhatsApp messages and status updates
-    
-    Facebook will send:
-    - GET request for verification (one-time setup)
-    - POST requests for incoming messages and status updates
+    Signature verification and payload processing shared by the sync and async webhook views
     """
     
-    def get(self, request):
+    def _verification_challenge(self, request):
         """
-        Webhook verification - Facebook sends this during setup
-        
-        You'll receive:
-        - hub.mode: 'subscribe'
-        - hub.verify_token: The token you set in Meta Developer Console
-        - hub.challenge: A random string to echo back
+        Return hub.challenge if the verification request is valid, else None
         """
         mode = request.GET.get('hub.mode')
         token = request.GET.get('hub.verify_token')
@@ -45,45 +60,27 @@ class WhatsAppWebhookView(APIView):
         
         if mode == 'subscribe' and token == verify_token:
             logger.info('Webhook verified successfully!')
-            return Response(int(challenge), status=status.HTTP_200_OK)
-        else:
-            logger.error(f'Webhook verification failed. Mode: {mode}, Token match: {token == verify_token}')
-            return Response({'error': 'Verification failed'}, status=status.HTTP_403_FORBIDDEN)
+            return challenge
+        logger.error(f'Webhook verification failed. Mode: {mode}, Token match: {token == verify_token}')
+        return None
     
-    def post(self, request):
+    def _process_payload(self, data):
         """
-        Handle incoming webhook events (messages, status updates)
+        Dispatch every change in a webhook payload to the message/status handlers
         """
-        try:
-            # Verify webhook signature (optional but recommended for security)
-            if not self._verify_signature(request):
-                logger.warning('Invalid webhook signature')
-                return Response({'error': 'Invalid signature'}, status=status.HTTP_403_FORBIDDEN)
-            
-            data = request.data
-            logger.info(f'Received webhook: {data}')
-            
-            # WhatsApp sends data in this structure
-            if data.get('object') == 'whatsapp_business_account':
-                for entry in data.get('entry', []):
-                    for change in entry.get('changes', []):
-                        value = change.get('value', {})
-                        
-                        # Handle incoming messages
-                        if 'messages' in value:
-                            self._handle_messages(value)
-                        
-                        # Handle status updates (sent, delivered, read, failed)
-                        if 'statuses' in value:
-                            self._handle_statuses(value)
-            
-            # Always return 200 OK to acknowledge receipt
-            return Response({'status': 'success'}, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            logger.error(f'Error processing webhook: {str(e)}', exc_info=True)
-            # Still return 200 to prevent Facebook from retrying
-            return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_200_OK)
+        # WhatsApp sends data in this structure
+        if data.get('object') == 'whatsapp_business_account':
+            for entry in data.get('entry', []):
+                for change in entry.get('changes', []):
+                    parsed = parse_change(change.get('value', {}))
+                    
+                    # Handle incoming messages
+                    if parsed.messages:
+                        self._handle_messages(parsed)
+                    
+                    # Handle status updates (sent, delivered, read, failed)
+                    if parsed.statuses:
+                        self._handle_statuses(parsed)
     
     def _verify_signature(self, request):
         """
@@ -111,170 +108,107 @@ class WhatsAppWebhookView(APIView):
             return False
     
     @transaction.atomic
-    def _handle_messages(self, value):
+    def _handle_messages(self, change):
         """
-        Process incoming messages
+        Save the parsed messages of one webhook change
+
+        The whole batch is written with a fixed number of queries: one lookup
+        for already-processed ids, one bulk INSERT, one conversation UPDATE
+        per sender and one rollup upsert.
         """
-        messages = value.get('messages', [])
-        metadata = value.get('metadata', {})
-        contacts = value.get('contacts', [])
-        
-        for message in messages:
-            try:
-                # Extract message data
-                message_id = message.get('id')
-                from_number = message.get('from')
-                timestamp = datetime.fromtimestamp(int(message.get('timestamp')))
-                message_type = message.get('type')
-                
-                # Check if message already exists
-                if WhatsAppMessage.objects.filter(message_id=message_id).exists():
-                    logger.info(f'Message {message_id} already processed')
-                    continue
-                
-                # Get contact name if available
-                contact_name = None
-                for contact in contacts:
-                    if contact.get('wa_id') == from_number:
-                        contact_name = contact.get('profile', {}).get('name')
-                        break
-                
-                # Extract message content based on type
-                text_body = None
-                media_id = None
-                media_mime_type = None
-                media_caption = None
-                latitude = None
-                longitude = None
-                location_name = None
-                location_address = None
-                context_message_id = None
-                
-                if message_type == 'text':
-                    text_body = message.get('text', {}).get('body')
-                
-                elif message_type in ['image', 'video', 'audio', 'document']:
-                    media_data = message.get(message_type, {})
-                    media_id = media_data.get('id')
-                    media_mime_type = media_data.get('mime_type')
-                    media_caption = media_data.get('caption', '')
-                
-                elif message_type == 'location':
-                    location = message.get('location', {})
-                    latitude = location.get('latitude')
-                    longitude = location.get('longitude')
-                    location_name = location.get('name')
-                    location_address = location.get('address')
-                
-                elif message_type == 'interactive':
-                    interactive = message.get('interactive', {})
-                    if interactive.get('type') == 'button_reply':
-                        text_body = interactive.get('button_reply', {}).get('title')
-                    elif interactive.get('type') == 'list_reply':
-                        text_body = interactive.get('list_reply', {}).get('title')
-                
-                # Check for context (reply to message)
-                if 'context' in message:
-                    context_message_id = message.get('context', {}).get('id')
-                
-                # Save message to database
-                whatsapp_message = WhatsAppMessage.objects.create(
-                    message_id=message_id,
-                    wamid=f"wamid.{message_id}",
-                    from_number=from_number,
-                    from_name=contact_name,
-                    message_type=message_type,
-                    text_body=text_body,
-                    media_id=media_id,
-                    media_mime_type=media_mime_type,
-                    media_caption=media_caption,
-                    latitude=latitude,
-                    longitude=longitude,
-                    location_name=location_name,
-                    location_address=location_address,
-                    timestamp=timestamp,
-                    context_message_id=context_message_id,
-                    raw_payload=message
-                )
-                
-                # Update or create conversation
-                conversation, created = WhatsAppConversation.objects.get_or_create(
-                    phone_number=from_number,
-                    defaults={'contact_name': contact_name}
-                )
-                conversation.last_message_at = timestamp
-                conversation.message_count += 1
-                conversation.unread_count += 1
-                if contact_name and not conversation.contact_name:
-                    conversation.contact_name = contact_name
-                conversation.save()
-                
-                logger.info(f'Saved message {message_id} from {from_number}')
-                
-                # Download media if present
-                if media_id:
-                    self._download_media(media_id, whatsapp_message)
-                
-                # You can add auto-reply logic here
-                # self._send_auto_reply(from_number, message_type)
-                
-            except Exception as e:
-                logger.error(f'Error processing message: {str(e)}', exc_info=True)
+        seen_ids = set(
+            WhatsAppMessage.objects.filter(
+                message_id__in=[message.message_id for message in change.messages]
+            ).values_list('message_id', flat=True)
+        )
+        
+        new_messages = []
+        for message in change.messages:
+            if message.message_id in seen_ids:
+                logger.info(f'Message {message.message_id} already processed')
+                continue
+            seen_ids.add(message.message_id)
+            new_messages.append(message.to_model())
+        
+        if not new_messages:
+            return
+        
+        # Save messages to database
+        WhatsAppMessage.objects.bulk_create(new_messages)
+        self._update_conversations(new_messages, change.contact_names)
+        add_to_rollups(rollup_rows(new_messages))
+        enqueue_prefetch(new_messages)
+        invalidate_customers([whatsapp_message.phone_e164 for whatsapp_message in new_messages])
+        
+        for whatsapp_message in new_messages:
+            logger.info(f'Saved message {whatsapp_message.message_id} from {whatsapp_message.from_number}')
+            WEBHOOK_EVENTS.inc(kind='message', type=whatsapp_message.message_type)
     
-    def _handle_statuses(self, value):
+    def _update_conversations(self, new_messages, contact_names):
         """
-        Process message status updates (sent, delivered, read, failed)
+        Create missing conversations and bump counters with one UPDATE per sender
+
+        The last-message snapshot only moves forward: a message older than
+        the conversation's latest (e.g. a delayed webhook retry) keeps it.
         """
-        statuses = value.get('statuses', [])
-        
-        for status_update in statuses:
-            try:
-                message_id = status_update.get('id')
-                recipient_id = status_update.get('recipient_id')
-                status_type = status_update.get('status')
-                timestamp = datetime.fromtimestamp(int(status_update.get('timestamp')))
-                
-                # Extract error info if status is failed
-                error_code = None
-                error_message = None
-                if status_type == 'failed':
-                    errors = status_update.get('errors', [])
-                    if errors:
-                        error_code = errors[0].get('code')
-                        error_message = errors[0].get('title')
-                
-                # Save status update
-                WhatsAppMessageStatus.objects.create(
-                    message_id=message_id,
-                    recipient_number=recipient_id,
-                    status=status_type,
-                    timestamp=timestamp,
-                    error_code=error_code,
-                    error_message=error_message,
-                    raw_payload=status_update
-                )
-                
-                logger.info(f'Status update: {message_id} -> {status_type}')
-                
-            except Exception as e:
-                logger.error(f'Error processing status: {str(e)}', exc_info=True)
+        per_phone = {}
+        for whatsapp_message in new_messages:
+            count, newest = per_phone.get(whatsapp_message.from_number, (0, whatsapp_message))
+            if whatsapp_message.timestamp >= newest.timestamp:
+                newest = whatsapp_message
+            per_phone[whatsapp_message.from_number] = (count + 1, newest)
+        
+        existing = dict(
+            WhatsAppConversation.objects.filter(phone_number__in=per_phone).values_list('phone_number', 'contact_name')
+        )
+        missing = [phone for phone in per_phone if phone not in existing]
+        if missing:
+            WhatsAppConversation.objects.bulk_create(
+                [
+                    WhatsAppConversation(
+                        phone_number=phone, phone_e164=to_e164(phone, international=True),
+                        contact_name=contact_names.get(phone), last_message_at=per_phone[phone][1].timestamp,
+                    )
+                    for phone in missing
+                ],
+                ignore_conflicts=True,
+            )
+        
+        now = timezone.now()
+        for phone, (count, newest) in per_phone.items():
+            # SET expressions see the row before the update, so this compares
+            # with the previous last_message_at
+            is_newest = Q(last_message_at__lte=newest.timestamp)
+            updates = {
+                'last_message_at': Greatest(F('last_message_at'), Value(newest.timestamp)),
+                'last_message_id': Case(When(is_newest, then=Value(newest.message_id)), default=F('last_message_id')),
+                'last_message_type': Case(When(is_newest, then=Value(newest.message_type)), default=F('last_message_type')),
+                'last_message_preview': Case(When(is_newest, then=Value(newest.preview())), default=F('last_message_preview')),
+                'message_count': F('message_count') + count,
+                'unread_count': F('unread_count') + count,
+                'updated_at': now,
+            }
+            if contact_names.get(phone) and phone in existing and not existing[phone]:
+                updates['contact_name'] = contact_names[phone]
+            WhatsAppConversation.objects.filter(phone_number=phone).update(**updates)
     
-    def _download_media(self, media_id, message_obj):
+    @transaction.atomic
+    def _handle_statuses(self, change):
         """
-        Store media_id and create proxy URL for viewing
-        No need to download - we'll proxy it on-demand
+        Save message status updates (sent, delivered, read, failed)
+
+        Receivers of ``statuses_received`` (e.g. bill delivery tracking)
+        update their rows in the same transaction.
         """
-        try:
-            # Just save a proxy URL that will fetch media when accessed
-            # This works for both local and production!
-            message_obj.media_url = f'/api/whatsapp/media/{media_id}/'
-            message_obj.save()
-            logger.info(f'Saved media proxy URL for {media_id}')
-            return True
-            
-        except Exception as e:
-            logger.error(f'Error saving media URL: {str(e)}')
-            return False
+        status_rows = [status_update.to_model() for status_update in change.statuses]
+        
+        # Save all status updates in one INSERT
+        WhatsAppMessageStatus.objects.bulk_create(status_rows)
+        statuses_received.send(sender=WhatsAppMessageStatus, statuses=status_rows)
+        
+        for status_row in status_rows:
+            logger.info(f'Status update: {status_row.message_id} -> {status_row.status}')
+            WEBHOOK_EVENTS.inc(kind='status', type=status_row.status)
     
     def _get_file_extension(self, mime_type):
         """
@@ -308,10 +242,60 @@ class WhatsAppWebhookView(APIView):
         pass
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class WhatsAppWebhookView(WebhookProcessingMixin, APIView):
+    """
+    Main webhook endpoint for receiving WhatsApp messages and status updates
+    
+    Facebook will send:
+    - GET request for verification (one-time setup)
+    - POST requests for incoming messages and status updates
+    """
+    
+    def get(self, request):
+        """
+        Webhook verification - Facebook sends this during setup
+        
+        You'll receive:
+        - hub.mode: 'subscribe'
+        - hub.verify_token: The token you set in Meta Developer Console
+        - hub.challenge: A random string to echo back
+        """
+        challenge = self._verification_challenge(request)
+        
+        if challenge is not None:
+            return Response(int(challenge), status=status.HTTP_200_OK)
+        else:
+            return Response({'error': 'Verification failed'}, status=status.HTTP_403_FORBIDDEN)
+    
+    def post(self, request):
+        """
+        Handle incoming webhook events (messages, status updates)
+        """
+        try:
+            # Verify webhook signature (optional but recommended for security)
+            if not self._verify_signature(request):
+                logger.warning('Invalid webhook signature')
+                return Response({'error': 'Invalid signature'}, status=status.HTTP_403_FORBIDDEN)
+            
+            data = request.data
+            logger.info(f'Received webhook: {data}')
+            self._process_payload(data)
+            
+            # Always return 200 OK to acknowledge receipt
+            return Response({'status': 'success'}, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f'Error processing webhook: {str(e)}', exc_info=True)
+            # Still return 200 to prevent Facebook from retrying
+            return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_200_OK)
+
+
 class MessagesListView(APIView):
     """
     API to view all received messages
     """
+    @reads_from_replica
     def get(self, request):
         """
         Get all messages with optional filters
@@ -319,25 +303,80 @@ class MessagesListView(APIView):
         Query params:
         - phone: Filter by phone number
         - type: Filter by message type
-        - limit: Number of messages to return
+        - limit: Number of messages to return (default 100, max 500)
         """
         phone = request.GET.get('phone')
         msg_type = request.GET.get('type')
-        limit = int(request.GET.get('limit', 100))
+        try:
+            limit = max(1, min(int(request.GET.get('limit', 100)), 500))
+        except ValueError:
+            return Response({'error': 'Invalid number'}, status=status.HTTP_400_BAD_REQUEST)
         
         messages = WhatsAppMessage.objects.all()
         
         if phone:
-            messages = messages.filter(from_number=phone)
+            phone_e164 = to_e164(phone)
+            if phone_e164 is None:
+                return Response({'error': 'Invalid phone'}, status=status.HTTP_400_BAD_REQUEST)
+            messages = messages.filter(phone_e164=phone_e164)
         if msg_type:
             messages = messages.filter(message_type=msg_type)
         
         messages = messages[:limit]
         serializer = WhatsAppMessageSerializer(messages, many=True)
+        data = serializer.data
         
         return Response({
-            'count': messages.count(),
-            'messages': serializer.data
+            'count': len(data),
+            'messages': data
+        })
+
+
+class ArchivedMessagesView(APIView):
+    """
+    Serve archived messages (or statuses) of one conversation on demand
+
+    Query params:
+    - phone: Phone number in any format (required)
+    - kind: message (default) or status
+    - before: Only rows older than this ISO timestamp, to page backwards
+    - limit: Number of rows to return (default 100, max 500)
+    """
+    SERIALIZERS = {
+        'message': ('messages', WhatsAppMessageSerializer),
+        'status': ('statuses', WhatsAppMessageStatusSerializer),
+    }
+    
+    @reads_from_replica
+    def get(self, request):
+        phone = request.GET.get('phone')
+        kind = request.GET.get('kind', 'message')
+        if not phone or kind not in self.SERIALIZERS:
+            return Response(
+                {'error': 'phone is required and kind must be message or status'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            before = datetime.fromisoformat(request.GET['before']) if 'before' in request.GET else None
+            limit = max(1, min(int(request.GET.get('limit', 100)), 500))
+        except ValueError:
+            return Response({'error': 'Invalid timestamp or number'}, status=status.HTTP_400_BAD_REQUEST)
+        if before is not None and timezone.is_naive(before):
+            before = timezone.make_aware(before, dt_timezone.utc)
+        e164 = to_e164(phone)
+        if e164 is None:
+            return Response({'error': 'Invalid phone'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Chunks are keyed by the number as WhatsApp sends it
+        key, serializer_class = self.SERIALIZERS[kind]
+        rows = archived_rows(kind, whatsapp_id(e164), before=before, limit=limit)
+        data = serializer_class(rows, many=True).data
+        
+        return Response({
+            'count': len(data),
+            'kind': kind,
+            key: data,
         })
 
 
@@ -345,16 +384,61 @@ class ConversationsListView(APIView):
     """
     API to view all conversations grouped by phone number
     """
+    @reads_from_replica
     def get(self, request):
-        conversations = WhatsAppConversation.objects.all()[:50]
-        serializer = WhatsAppConversationSerializer(conversations, many=True)
+        conversations = list(WhatsAppConversation.objects.all()[:50])
+        
+        # Fetch the latest messages of every conversation in a single query
+        latest_messages = latest_messages_by_phone(
+            [conversation.phone_number for conversation in conversations]
+        )
+        serializer = WhatsAppConversationSerializer(
+            conversations, many=True, context={'latest_messages': latest_messages}
+        )
         
         return Response({
-            'count': conversations.count(),
+            'count': len(conversations),
             'conversations': serializer.data
         })
 
 
+class InboxView(APIView):
+    """
+    The inbox list: latest conversations with their last message, read
+    from the snapshot columns of WhatsAppConversation only
+
+    Query params:
+    - before: Only conversations whose last message is older than this ISO
+      timestamp, to page backwards
+    - limit: Number of conversations to return (default 50, max 200)
+    """
+    FIELDS = [
+        'phone_number', 'contact_name', 'unread_count', 'message_count', 'last_message_at',
+        'last_message_id', 'last_message_type', 'last_message_preview',
+    ]
+    
+    @reads_from_replica
+    def get(self, request):
+        try:
+            before = datetime.fromisoformat(request.GET['before']) if 'before' in request.GET else None
+            limit = max(1, min(int(request.GET.get('limit', 50)), 200))
+        except ValueError:
+            return Response({'error': 'Invalid timestamp or number'}, status=status.HTTP_400_BAD_REQUEST)
+        if before is not None and timezone.is_naive(before):
+            before = timezone.make_aware(before, dt_timezone.utc)
+        
+        # One range scan of the -last_message_at index
+        conversations = WhatsAppConversation.objects.order_by('-last_message_at')
+        if before is not None:
+            conversations = conversations.filter(last_message_at__lt=before)
+        conversations = list(conversations.values(*self.FIELDS)[:limit])
+        
+        return Response({
+            'count': len(conversations),
+            'conversations': conversations,
+        })
+
+
 class MarkAsReadView(APIView):
     """
     Mark messages from a conversation as read
@@ -367,23 +451,173 @@ class MarkAsReadView(APIView):
                 {'error': 'phone_number is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        # Any format: 919876543210 (WhatsApp id), 9876543210, +91 98765 43210
+        phone_e164 = to_e164(phone_number)
+        if phone_e164 is None:
+            return Response({'error': 'Invalid phone'}, status=status.HTTP_400_BAD_REQUEST)
         
-        try:
-            conversation = WhatsAppConversation.objects.get(phone_number=phone_number)
-            conversation.unread_count = 0
-            conversation.save()
-            
-            WhatsAppMessage.objects.filter(
-                from_number=phone_number,
-                status='received'
-            ).update(status='read')
-            
-            return Response({'status': 'success'})
-        except WhatsAppConversation.DoesNotExist:
+        updated = WhatsAppConversation.objects.filter(
+            phone_q(phone_number, raw_field='phone_number')
+        ).update(unread_count=0, updated_at=timezone.now())
+        
+        if not updated:
             return Response(
                 {'error': 'Conversation not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        WhatsAppMessage.objects.filter(
+            phone_q(phone_number, raw_field='from_number'),
+            status='received'
+        ).update(status='read')
+        invalidate_customers([phone_e164])
+        
+        return Response({'status': 'success'})
+
+
+class MessageAnalyticsView(APIView):
+    """
+    Message analytics served from WhatsAppDailyRollup
+
+    Query params:
+    - days: Window ending today (default 90, max 366), or
+    - from / to: Explicit date range (YYYY-MM-DD)
+    - group_by: day (default), type or phone
+    - phone: Only count one sender, in any format (9876543210, +919876543210)
+    - limit: Max rows for group_by=phone (default 50, max 500)
+    """
+    GROUP_FIELDS = {'day': 'day', 'type': 'message_type', 'phone': 'phone_number'}
+    
+    @reads_from_replica
+    def get(self, request):
+        group_by = request.GET.get('group_by', 'day')
+        if group_by not in self.GROUP_FIELDS:
+            return Response(
+                {'error': f"group_by must be one of {', '.join(self.GROUP_FIELDS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            end = date.fromisoformat(request.GET['to']) if 'to' in request.GET else timezone.localdate()
+            if 'from' in request.GET:
+                start = date.fromisoformat(request.GET['from'])
+            else:
+                start = end - timedelta(days=max(1, min(int(request.GET.get('days', 90)), 366)) - 1)
+            limit = max(1, min(int(request.GET.get('limit', 50)), 500))
+        except ValueError:
+            return Response({'error': 'Invalid date or number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        rollups = WhatsAppDailyRollup.objects.filter(day__range=(start, end))
+        if request.GET.get('phone'):
+            phone_e164 = to_e164(request.GET['phone'])
+            if phone_e164 is None:
+                return Response({'error': 'Invalid phone'}, status=status.HTTP_400_BAD_REQUEST)
+            # Rollups are keyed by WhatsApp id, the E.164 number without +
+            rollups = rollups.filter(phone_number=whatsapp_id(phone_e164))
+        
+        field = self.GROUP_FIELDS[group_by]
+        results = rollups.values(field).annotate(
+            message_count=Sum('message_count'),
+            first_message_at=Min('first_message_at'),
+            last_message_at=Max('last_message_at'),
+        )
+        if group_by == 'phone':
+            results = results.order_by('-message_count', field)[:limit]
+        else:
+            results = results.order_by(field)
+        results = list(results)
+        
+        return Response({
+            'from': start,
+            'to': end,
+            'group_by': group_by,
+            'total': sum(row['message_count'] for row in results),
+            'results': results,
+        })
+
+
+def _broadcast_denial(request):
+    code = token_denial(request, settings.BROADCAST_TOKEN)
+    if code is None:
+        return None
+    error = 'Unauthorized' if code == 401 else 'Broadcasts are disabled until BROADCAST_TOKEN is set'
+    return Response({'error': error}, status=code)
+
+
+class BroadcastCampaignsView(APIView):
+    """
+    Send a template message to many customers, staying under the Graph API
+    rate limit
+    Usage: /api/whatsapp/broadcasts/
+
+    POST body:
+    - template: Approved template name (required)
+    - phone_numbers: List of numbers in international format (required)
+    - language: Template language code (default en)
+    - components: Template components sent to every recipient
+    - name: Label for the campaign
+
+    GET lists the latest campaigns with recipient counts. The client must
+    send ``BROADCAST_TOKEN`` as a bearer token or be logged in as staff; with
+    no token configured only staff can use it.
+    """
+    
+    def get(self, request):
+        denied = _broadcast_denial(request)
+        if denied:
+            return denied
+        campaigns = campaigns_with_counts()[:50]
+        return Response({'campaigns': [campaign_summary(campaign) for campaign in campaigns]})
+    
+    def post(self, request):
+        denied = _broadcast_denial(request)
+        if denied:
+            return denied
+        
+        template = request.data.get('template')
+        phone_numbers = request.data.get('phone_numbers')
+        components = request.data.get('components') or []
+        if not template or not isinstance(phone_numbers, list) or not phone_numbers or not isinstance(components, list):
+            return Response(
+                {'error': 'template and a non-empty phone_numbers list are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        normalized = [normalize_phone_number(number) for number in phone_numbers]
+        invalid = [number for number, digits in zip(phone_numbers, normalized) if digits is None]
+        if invalid:
+            return Response(
+                {'error': 'Invalid phone numbers', 'invalid': invalid[:100]},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        with transaction.atomic():
+            campaign = create_campaign(
+                template, normalized,
+                language=request.data.get('language') or 'en',
+                components=components,
+                name=request.data.get('name') or '',
+            )
+            start_campaign(campaign)
+        
+        campaign = campaigns_with_counts().get(pk=campaign.pk)
+        return Response(campaign_summary(campaign), status=status.HTTP_202_ACCEPTED)
+
+
+class BroadcastCampaignDetailView(APIView):
+    """
+    Progress of one broadcast campaign
+    Usage: /api/whatsapp/broadcasts/<id>/
+    """
+    
+    def get(self, request, campaign_id):
+        denied = _broadcast_denial(request)
+        if denied:
+            return denied
+        campaign = campaigns_with_counts().filter(pk=campaign_id).first()
+        if campaign is None:
+            return Response({'error': 'Campaign not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(campaign_summary(campaign))
 
 
 class WhatsAppMediaProxyView(APIView):
@@ -398,68 +632,149 @@ class WhatsAppMediaProxyView(APIView):
         """
         Fetch media from WhatsApp and serve it with proper authentication
         """
+        # Media ids are immutable, so a browser holding the ETag already has the file
+        etag = f'"{media_id}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            MEDIA_PROXY_REQUESTS.inc(result='hit')
+            return HttpResponseNotModified()
+
+        cached = open_cached(media_id)
+        if cached is not None:
+            MEDIA_PROXY_REQUESTS.inc(result='cached')
+            return _cached_media_response(media_id, *cached)
+        
         try:
-            access_token = os.getenv('WHATSAPP_ACCESS_TOKEN')
-            
-            # Step 1: Get the media URL from WhatsApp
-            url = f'https://graph.facebook.com/v21.0/{media_id}'
-            headers = {'Authorization': f'Bearer {access_token}'}
-            
-            response = requests.get(url, headers=headers)
-            
-            if response.status_code != 200:
-                return Response(
-                    {'error': 'Media not found'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            media_data = response.json()
-            media_url = media_data.get('url')
-            mime_type = media_data.get('mime_type', 'application/octet-stream')
-            
-            if not media_url:
-                return Response(
-                    {'error': 'Media URL not available'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            # Step 2: Download the actual media file with authentication
-            media_response = requests.get(media_url, headers=headers)
-            
-            if media_response.status_code != 200:
-                return Response(
-                    {'error': 'Failed to download media'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-            
-            # Step 3: Serve the file directly to the browser
-            from django.http import HttpResponse
-            
-            response = HttpResponse(media_response.content, content_type=mime_type)
-            
-            # Set filename for download
-            filename = f"{media_id}{self._get_extension(mime_type)}"
-            response['Content-Disposition'] = f'inline; filename="{filename}"'
-            
-            return response
-            
+            # Concurrent requests for one id share a single Graph API fetch
+            fetched = fetch_media(media_id)
+        except GraphUnavailable as e:
+            MEDIA_PROXY_REQUESTS.inc(result='unavailable')
+            return _unavailable_response(e)
         except Exception as e:
             logger.error(f'Error serving media: {str(e)}')
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+        if fetched is None:
+            MEDIA_PROXY_REQUESTS.inc(result='miss')
+            return Response(
+                {'error': 'Media not available'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        content, mime_type, shared = fetched
+        MEDIA_PROXY_REQUESTS.inc(result='coalesced' if shared else 'miss')
+        return _media_response(media_id, content, mime_type)
     
     def _get_extension(self, mime_type):
         """Get file extension from MIME type"""
-        mime_map = {
-            'image/jpeg': '.jpg',
-            'image/png': '.png',
-            'image/gif': '.gif',
-            'image/webp': '.webp',
-            'video/mp4': '.mp4',
-            'audio/ogg': '.ogg',
-            'audio/mpeg': '.mp3',
-            'application/pdf': '.pdf',
-        }
-        return mime_map.get(mime_type, '')
+        return extension_for(mime_type)
+
+
+def _media_response(media_id, content, mime_type):
+    response = HttpResponse(content, content_type=mime_type)
+    response['Content-Disposition'] = f'inline; filename="{media_id}{extension_for(mime_type)}"'
+    response['ETag'] = f'"{media_id}"'
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+def _unavailable_response(error):
+    # The circuit breaker is open; tell the client when to try again
+    response = JsonResponse({'error': 'WhatsApp API temporarily unavailable'}, status=503)
+    response['Retry-After'] = str(max(1, math.ceil(error.retry_in)))
+    return response
+
+
+def _cached_media_response(media_id, fh, mime_type, thumbnail=False):
+    response = FileResponse(fh, content_type=mime_type)
+    suffix = '-thumbnail.jpg' if thumbnail else extension_for(mime_type)
+    response['Content-Disposition'] = f'inline; filename="{media_id}{suffix}"'
+    response['ETag'] = f'"{media_id}-thumbnail"' if thumbnail else f'"{media_id}"'
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+def media_thumbnail_view(request, media_id):
+    """
+    Serve the thumbnail generated for an image at prefetch time
+    Usage: /api/whatsapp/media/<media_id>/thumbnail/
+    """
+    if request.META.get('HTTP_IF_NONE_MATCH') == f'"{media_id}-thumbnail"':
+        return HttpResponseNotModified()
+    cached = open_cached(media_id, thumbnail=True)
+    if cached is None:
+        return JsonResponse({'error': 'Thumbnail not available'}, status=404)
+    return _cached_media_response(media_id, *cached, thumbnail=True)
+
+
+# ASGI views
+#
+# Served instead of the views above when settings.ASYNC_VIEWS is on (the
+# default under bbdBackend.asgi). Outbound calls use the pooled async client,
+# so a slow Graph API no longer ties up a worker thread.
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncWhatsAppWebhookView(WebhookProcessingMixin, View):
+    """
+    Async version of WhatsAppWebhookView
+    """
+    
+    async def get(self, request):
+        challenge = self._verification_challenge(request)
+        if challenge is not None:
+            return HttpResponse(challenge, content_type='text/plain')
+        return JsonResponse({'error': 'Verification failed'}, status=403)
+    
+    async def post(self, request):
+        try:
+            if not self._verify_signature(request):
+                logger.warning('Invalid webhook signature')
+                return JsonResponse({'error': 'Invalid signature'}, status=403)
+            
+            data = json.loads(request.body)
+            logger.info(f'Received webhook: {data}')
+            # The ORM work runs in Django's sync thread, off the event loop
+            await sync_to_async(self._process_payload)(data)
+            
+            return JsonResponse({'status': 'success'})
+            
+        except Exception as e:
+            logger.error(f'Error processing webhook: {str(e)}', exc_info=True)
+            # Still return 200 to prevent Facebook from retrying
+            return JsonResponse({'status': 'error', 'message': str(e)})
+
+
+class AsyncWhatsAppMediaProxyView(View):
+    """
+    Async version of WhatsAppMediaProxyView
+    """
+    _get_extension = WhatsAppMediaProxyView._get_extension
+    
+    async def get(self, request, media_id):
+        etag = f'"{media_id}"'
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            MEDIA_PROXY_REQUESTS.inc(result='hit')
+            return HttpResponseNotModified()
+        
+        cached = await sync_to_async(open_cached)(media_id)
+        if cached is not None:
+            MEDIA_PROXY_REQUESTS.inc(result='cached')
+            return _cached_media_response(media_id, *cached)
+        
+        try:
+            fetched = await afetch_media(media_id)
+        except GraphUnavailable as e:
+            MEDIA_PROXY_REQUESTS.inc(result='unavailable')
+            return _unavailable_response(e)
+        except Exception as e:
+            logger.error(f'Error serving media: {str(e)}')
+            return JsonResponse({'error': str(e)}, status=500)
+
+        if fetched is None:
+            MEDIA_PROXY_REQUESTS.inc(result='miss')
+            return JsonResponse({'error': 'Media not available'}, status=404)
+        content, mime_type, shared = fetched
+        MEDIA_PROXY_REQUESTS.inc(result='coalesced' if shared else 'miss')
+        return _media_response(media_id, content, mime_type)